@@ -0,0 +1,245 @@
+"""
+Import a legacy monitoring_results.json into the SQLite results store, and compact the store
+
+The legacy file is one JSON object keyed by sweep timestamp. It is read in
+fixed-size chunks and decoded one sweep at a time, so memory stays bounded
+by --chunk-size and --batch-size however large the file is. Sweeps inside
+the raw retention window become samples; every sweep is folded into the
+per-minute, per-hour and per-day rollups, which are what keeps years of
+history queryable without keeping every probe. Progress is recorded in the
+database, so an interrupted import can simply be run again.
+
+    python backfill.py import monitoring_results.json --db monitoring_results.db
+    python backfill.py compact --db monitoring_results.db
+
+Stop the monitor (or the dashboard running it) before importing.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+from results_store import SQLiteResultsStore
+
+WHITESPACE = ' \t\n\r'
+# Characters a JSON number can continue with; a number followed only by these may be cut short
+NUMBER_CHARACTERS = '0123456789+-.eE'
+
+
+def iter_object_items(f, chunk_size=1 << 20):
+    """
+    Stream the members of a top-level JSON object without loading the whole document
+
+    Args:
+        f: Text file positioned at the start of the document
+        chunk_size (int): Characters read at a time
+
+    Yields:
+        tuple: (key, decoded value) for each member, in file order
+
+    Raises:
+        ValueError: If the document is not a JSON object or is malformed
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    eof = False
+
+    def fill():
+        nonlocal buffer, pos, eof
+        chunk = f.read(chunk_size)
+        if not chunk:
+            eof = True
+        # Drop what has been consumed only when reading, not after every member
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+    def skip_whitespace():
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in WHITESPACE:
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            fill()
+
+    def decode():
+        """Decode the value at pos, reading more until it is complete"""
+        nonlocal pos
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # Give up on a value that is still not complete after many chunks rather than read the whole file
+                if eof or len(buffer) - pos > max(64 * chunk_size, 1 << 20):
+                    raise
+                fill()
+                continue
+            # A number or literal ending at the buffer's end may continue in the next chunk,
+            # and so may a number the decoder stopped short of (e.g. "1." or "1.5e")
+            if not eof and len(buffer) - end < 64 and not buffer[end:].strip(NUMBER_CHARACTERS):
+                fill()
+                continue
+            pos = end
+            return value
+
+    def expect(character):
+        nonlocal pos
+        skip_whitespace()
+        if pos >= len(buffer) or buffer[pos] != character:
+            found = buffer[pos] if pos < len(buffer) else 'end of file'
+            raise ValueError(f"Expected '{character}' but found {found!r}")
+        pos += 1
+
+    expect('{')
+    skip_whitespace()
+    if pos < len(buffer) and buffer[pos] == '}':
+        return
+    while True:
+        skip_whitespace()
+        key = decode()
+        if not isinstance(key, str):
+            raise ValueError(f'Object keys must be strings, found {key!r}')
+        expect(':')
+        skip_whitespace()
+        yield key, decode()
+        skip_whitespace()
+        if pos < len(buffer) and buffer[pos] == '}':
+            return
+        expect(',')
+
+
+def legacy_sweep(key, value):
+    """
+    Convert one legacy entry into the (results, timestamp) form the store takes
+
+    Args:
+        key (str): ISO sweep timestamp in local time, as the json backend writes it
+        value (dict): URL -> result dict, or None for a failed probe
+
+    Returns:
+        tuple: (results, epoch timestamp), or None if the entry cannot be read
+    """
+    try:
+        timestamp = datetime.fromisoformat(key).timestamp()
+    except ValueError:
+        return None
+    if not isinstance(value, dict):
+        return None
+    results = {}
+    for url, result in value.items():
+        if result is None:
+            results[url] = None
+        elif isinstance(result, dict) and 'status_code' in result and 'response_time' in result:
+            results[url] = result
+    return (results, timestamp) if results else None
+
+
+def import_file(store, path, source=None, batch_size=500, chunk_size=1 << 20, progress=None):
+    """
+    Stream a legacy results file into the store
+
+    Sweeps at or before what a previous run recorded for the same source
+    are skipped, so the file must be in time order, which is how the json
+    backend writes it.
+
+    Args:
+        store (SQLiteResultsStore): Destination
+        path (str): Legacy monitoring_results.json
+        source (str): Name progress is recorded under (default: the file's name)
+        batch_size (int): Sweeps written per transaction
+        chunk_size (int): Characters read from the file at a time
+        progress (callable): Called with the running totals after each batch
+
+    Returns:
+        dict: Counts of sweeps imported, skipped as already imported and unreadable, and samples loaded
+    """
+    source = source or os.path.basename(path)
+    imported_until = store.imported_until(source)
+    totals = {'sweeps': 0, 'already_imported': 0, 'unreadable': 0, 'samples': 0}
+    batch = []
+
+    def flush():
+        totals['samples'] += store.backfill(batch, source)
+        totals['sweeps'] += len(batch)
+        batch.clear()
+        if progress:
+            progress(totals)
+
+    with open(path, 'r') as f:
+        for key, value in iter_object_items(f, chunk_size):
+            sweep = legacy_sweep(key, value)
+            if sweep is None:
+                totals['unreadable'] += 1
+            elif imported_until is not None and sweep[1] <= imported_until:
+                totals['already_imported'] += 1
+            else:
+                batch.append(sweep)
+                if len(batch) >= batch_size:
+                    flush()
+    if batch:
+        flush()
+    return totals
+
+
+def parse_args(argv=None):
+    store_options = argparse.ArgumentParser(add_help=False)
+    store_options.add_argument('--db', default=os.environ.get('RESULTS_PATH') or 'monitoring_results.db',
+                               help='SQLite results database (default: RESULTS_PATH or monitoring_results.db)')
+    store_options.add_argument('--retention-hours', type=int,
+                               default=int(os.environ.get('RESULTS_RETENTION_HOURS', 168)),
+                               help='Raw sample retention, as the monitor is configured (default: RESULTS_RETENTION_HOURS)')
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = commands.add_parser('import', parents=[store_options], help='Import a legacy monitoring_results.json')
+    import_parser.add_argument('file', help='Legacy results file')
+    import_parser.add_argument('--source', help="Name to record progress under (default: the file's name)")
+    import_parser.add_argument('--batch-size', type=int, default=500, help='Sweeps written per transaction')
+    import_parser.add_argument('--chunk-size', type=int, default=1 << 20, help='Characters read at a time')
+    import_parser.add_argument('--compact', action='store_true', help='Compact the database afterwards')
+
+    compact_parser = commands.add_parser('compact', parents=[store_options],
+                                         help='Drop expired samples and rollups and shrink the file')
+    compact_parser.add_argument('--no-vacuum', action='store_true',
+                                help='Only prune and checkpoint, without rewriting the file (safe while the monitor runs)')
+    return parser.parse_args(argv)
+
+
+def print_progress(totals):
+    print(f"{totals['sweeps']} sweeps, {totals['samples']} samples imported", file=sys.stderr, flush=True)
+
+
+def compact(store, vacuum=True):
+    sizes = store.compact(vacuum=vacuum)
+    print(f"Compacted {store.path}: {sizes['bytes_before']} -> {sizes['bytes_after']} bytes", file=sys.stderr)
+    return sizes
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    store = SQLiteResultsStore(options.db, retention_hours=options.retention_hours)
+    try:
+        if options.command == 'import':
+            started = time.monotonic()
+            totals = import_file(store, options.file, options.source, options.batch_size, options.chunk_size,
+                                 progress=print_progress)
+            totals['seconds'] = round(time.monotonic() - started, 1)
+            print(json.dumps(totals))
+            if options.compact:
+                compact(store)
+        else:
+            compact(store, vacuum=not options.no_vacuum)
+    except (OSError, ValueError) as e:
+        print(f'Error: {e}', file=sys.stderr)
+        return 1
+    finally:
+        store.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
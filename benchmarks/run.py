@@ -0,0 +1,287 @@
+"""
+Benchmark the probe engine and dashboard API against the local stand-in server
+
+For each URL count it preloads a results history, then times full sweeps
+(check_all_urls, which includes save_results), save_results on its own,
+get_recent_results and the dashboard's /api routes, and records RSS and file
+I/O. The report is printed (or written with --output) as JSON so runs can be
+compared before a deploy.
+
+    python benchmarks/run.py --sizes 10,100,1000,10000 --history 120 --output bench.json
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'target_server.py')
+
+ROUTES = (
+    '/api/status',
+    '/api/current_status',
+    '/api/results?hours=24',
+    '/api/uptime',
+    '/api/logs',
+)
+
+
+def percentile(values, percent):
+    """
+    Nearest-rank percentile of a list of numbers, or None if it is empty
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(ordered)) - 1, 0)
+    return round(ordered[rank], 3)
+
+
+def summarise(values):
+    return {'p50': percentile(values, 50), 'p99': percentile(values, 99), 'max': round(max(values), 3) if values else None}
+
+
+def time_calls(function, repeat):
+    """
+    Call a function repeatedly
+
+    Returns:
+        list: Milliseconds taken by each call
+    """
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def rss_bytes():
+    """
+    Current resident set size, or the peak where the current size is not available
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return peak_rss_bytes()
+
+
+def peak_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def io_counters():
+    """
+    Bytes this process has read and written: storage I/O from /proc where available,
+    otherwise block counts from getrusage
+    """
+    try:
+        with open('/proc/self/io') as f:
+            fields = dict(line.split(': ') for line in f.read().splitlines())
+        return {'read_bytes': int(fields['read_bytes']), 'write_bytes': int(fields['write_bytes']),
+                'read_chars': int(fields['rchar']), 'write_chars': int(fields['wchar'])}
+    except (OSError, KeyError, ValueError):
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        return {'read_bytes': usage.ru_inblock * 512, 'write_bytes': usage.ru_oublock * 512}
+
+
+def start_server(options):
+    """
+    Start the stand-in server in its own process so it does not compete with the bot for the GIL
+
+    Returns:
+        tuple: (process, port, certificate path or None)
+    """
+    command = [sys.executable, SERVER, '--port', '0', '--latency-ms', str(options.latency_ms),
+               '--jitter-ms', str(options.jitter_ms), '--error-rate', str(options.error_rate),
+               '--body-bytes', str(options.body_bytes), '--hosts', str(options.hosts)]
+    if options.tls:
+        command += ['--tls', '--tls-delay-ms', str(options.tls_delay_ms)]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    certfile = None
+    for line in process.stdout:
+        if line.startswith('CERTFILE '):
+            certfile = line.split(' ', 1)[1].strip()
+        elif line.startswith('LISTENING '):
+            return process, int(line.split()[1]), certfile
+    raise RuntimeError('Stand-in server did not start')
+
+
+def preload_history(store, urls, samples, interval, latency_ms):
+    """
+    Write samples sweeps per URL, spaced interval seconds apart and ending now
+    """
+    now = time.time()
+    for index in range(samples):
+        timestamp = now - (samples - index) * interval
+        result = {'status_code': 200, 'response_time': latency_ms + 1.0,
+                  'timings': {'dns': 0.0, 'connect': 0.0, 'tls': 0.0, 'ttfb': latency_ms + 0.9, 'transfer': 0.1}}
+        store.append({url: result for url in urls}, timestamp)
+
+
+def bench_size(count, options, port, certfile, workdir):
+    from config import save_config
+    from ping_bot import MultiURLPingBot
+    from results_store import SQLiteResultsStore
+    from transport import ProbeTransport
+    import dashboard
+
+    scheme = 'https' if options.tls else 'http'
+    urls = [f'{scheme}://127.0.0.{index % options.hosts + 1}:{port}/target/{index}' for index in range(count)]
+    io_before = io_counters()
+
+    store_path = os.path.join(workdir, f'results-{count}.db')
+    store = SQLiteResultsStore(store_path)
+    started = time.perf_counter()
+    preload_history(store, urls, options.history, options.interval, options.latency_ms)
+    history_seconds = time.perf_counter() - started
+    store.close()
+
+    started = time.perf_counter()
+    transport = ProbeTransport(max_hosts=options.hosts * 2, per_host_connections=options.per_host_limit)
+    if certfile:
+        transport.session.verify = certfile
+    multi_bot = MultiURLPingBot(max_workers=options.max_workers, per_host_limit=options.per_host_limit,
+                                results_store=SQLiteResultsStore(store_path), transport=transport,
+                                cache_capacity=max(options.history + options.sweeps + options.save_repeat, 1))
+    for url in urls:
+        multi_bot.add_url(url, options.interval)
+    startup_seconds = time.perf_counter() - started
+
+    sweep_seconds = []
+    overheads = []
+    errors = 0
+    results = {}
+    for _ in range(options.sweeps):
+        started = time.perf_counter()
+        results = multi_bot.check_all_urls()
+        sweep_seconds.append(time.perf_counter() - started)
+        for result in results.values():
+            if result is None or result['status_code'] >= 400:
+                errors += 1
+            if result is not None:
+                overheads.append(result['response_time'] - options.latency_ms)
+
+    save_ms = time_calls(lambda: multi_bot.save_results(results), options.save_repeat)
+    recent_ms = time_calls(lambda: multi_bot.get_recent_results(hours=24), options.route_repeat)
+
+    # Point the dashboard at this run's bot and URLs
+    dashboard.multi_bot = multi_bot
+    save_config({'enabled': False, 'urls': [{'url': url, 'interval': options.interval, 'enabled': True} for url in urls]})
+    client = dashboard.app.test_client()
+    routes = {}
+    for route in ROUTES:
+        def request_route():
+            # Measure building the response, not the dashboard's short-lived response cache
+            dashboard.response_cache.clear()
+            response = client.get(route)
+            response.get_data()
+            if response.status_code >= 400:
+                raise RuntimeError(f'{route} returned {response.status_code}')
+        routes[route] = summarise(time_calls(request_route, options.route_repeat))
+
+    io_after = io_counters()
+    report = {
+        'urls': count,
+        'history_samples_per_url': options.history,
+        'history_load_seconds': round(history_seconds, 3),
+        'startup_seconds': round(startup_seconds, 3),
+        'sweep_seconds': summarise(sweep_seconds),
+        'probes_per_second': round(count * len(sweep_seconds) / sum(sweep_seconds), 1) if sweep_seconds else None,
+        'probe_overhead_ms': summarise(overheads),
+        'probe_errors': errors,
+        'save_results_ms': summarise(save_ms),
+        'get_recent_results_ms': summarise(recent_ms),
+        'routes_ms': routes,
+        'rss_bytes': rss_bytes(),
+        'peak_rss_bytes': peak_rss_bytes(),
+        'io': {key: io_after[key] - io_before[key] for key in io_after},
+    }
+
+    multi_bot.shutdown()
+    transport.close()
+    multi_bot.results_store.close()
+    return report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='10,100,1000', help='Comma-separated URL counts (e.g. 10,100,1000,10000)')
+    parser.add_argument('--history', type=int, default=120, help='Samples per URL preloaded into the store')
+    parser.add_argument('--interval', type=int, default=30, help='Seconds between preloaded samples')
+    parser.add_argument('--sweeps', type=int, default=3, help='check_all_urls sweeps per size')
+    parser.add_argument('--save-repeat', type=int, default=5, help='Extra save_results calls timed per size')
+    parser.add_argument('--route-repeat', type=int, default=5, help='Requests per API route per size')
+    parser.add_argument('--max-workers', type=int, default=32)
+    parser.add_argument('--per-host-limit', type=int, default=4)
+    parser.add_argument('--hosts', type=int, default=64 if sys.platform.startswith('linux') else 1,
+                        help='Loopback addresses to spread URLs over (only 127.0.0.1 exists outside Linux)')
+    parser.add_argument('--latency-ms', type=float, default=5)
+    parser.add_argument('--jitter-ms', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0)
+    parser.add_argument('--body-bytes', type=int, default=512)
+    parser.add_argument('--tls', action='store_true', help='Probe over HTTPS with a self-signed certificate')
+    parser.add_argument('--tls-delay-ms', type=float, default=0)
+    parser.add_argument('--output', help='Write the JSON report here instead of stdout')
+    parser.add_argument('--verbose', action='store_true', help="Keep the bot's INFO logging")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    output = os.path.abspath(options.output) if options.output else None
+    sizes = [int(size) for size in options.sizes.split(',') if size.strip()]
+
+    # Work in a scratch directory: the bot writes its log, config and results to the working directory
+    workdir = tempfile.mkdtemp(prefix='ping-bot-bench-')
+    os.chdir(workdir)
+    sys.path.insert(0, ROOT)
+    if options.tls:
+        # These would override the session's trust of the stand-in certificate
+        for name in ('REQUESTS_CA_BUNDLE', 'CURL_CA_BUNDLE'):
+            os.environ.pop(name, None)
+    if not options.verbose:
+        # Configured before ping_bot is imported, so its own INFO-level setup does nothing
+        logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    server, port, certfile = start_server(options)
+    try:
+        runs = []
+        for size in sizes:
+            print(f'Benchmarking {size} URLs...', file=sys.stderr, flush=True)
+            runs.append(bench_size(size, options, port, certfile, workdir))
+    finally:
+        server.terminate()
+        server.wait()
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'options': vars(options),
+        },
+        'runs': runs,
+    }
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""
+Local stand-in for monitored targets, used by the benchmarks
+
+Serves every path with a configurable latency, error rate and body size, over
+HTTP or HTTPS with an optionally slow TLS handshake. Listening on all loopback
+addresses lets a benchmark spread URLs over many "hosts" (127.0.0.1,
+127.0.0.2, ...) on Linux.
+
+    python benchmarks/target_server.py --port 8800 --latency-ms 20 --error-rate 0.01
+"""
+import argparse
+import os
+import random
+import shutil
+import ssl
+import subprocess
+import sys
+import tempfile
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Set by main()
+    options = None
+
+    def _respond(self, send_body):
+        options = self.options
+        delay = options.latency_ms + random.uniform(-options.jitter_ms, options.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+        status = 503 if random.random() < options.error_rate else 200
+        body = b'x' * options.body_bytes
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def do_GET(self):
+        self._respond(True)
+
+    def do_HEAD(self):
+        self._respond(False)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class SlowTLSServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+    context = None
+    tls_delay_ms = 0
+
+    def finish_request(self, request, client_address):
+        # Handshake on the handler thread, after the configured delay, so a slow
+        # handshake does not hold up accepting other connections
+        if self.context is not None:
+            if self.tls_delay_ms:
+                time.sleep(self.tls_delay_ms / 1000)
+            try:
+                request = self.context.wrap_socket(request, server_side=True)
+            except (ssl.SSLError, OSError):
+                return
+        super().finish_request(request, client_address)
+
+
+def generate_certificate(directory, hosts):
+    """
+    Create a self-signed certificate for the loopback addresses the benchmark uses
+
+    Args:
+        directory (str): Where to write cert.pem and key.pem
+        hosts (int): Number of 127.0.0.x addresses to cover
+
+    Returns:
+        tuple: (certificate path, key path)
+    """
+    if shutil.which('openssl') is None:
+        sys.exit('--tls needs the openssl command line tool, or --certfile and --keyfile')
+    certfile = os.path.join(directory, 'cert.pem')
+    keyfile = os.path.join(directory, 'key.pem')
+    names = ','.join(['DNS:localhost'] + [f'IP:127.0.0.{index}' for index in range(1, hosts + 1)])
+    subprocess.run([
+        'openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+        '-keyout', keyfile, '-out', certfile, '-subj', '/CN=127.0.0.1',
+        '-addext', f'subjectAltName={names}'
+    ], check=True, capture_output=True)
+    return certfile, keyfile
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='', help="Address to listen on (default: all, so every 127.0.0.x works)")
+    parser.add_argument('--port', type=int, default=8800, help='Port to listen on (0 picks a free one)')
+    parser.add_argument('--latency-ms', type=float, default=0, help='Delay before each response')
+    parser.add_argument('--jitter-ms', type=float, default=0, help='Random +/- variation of the delay')
+    parser.add_argument('--error-rate', type=float, default=0, help='Fraction of responses that are 503')
+    parser.add_argument('--body-bytes', type=int, default=512, help='Response body size')
+    parser.add_argument('--tls', action='store_true', help='Serve HTTPS')
+    parser.add_argument('--tls-delay-ms', type=float, default=0, help='Delay before each TLS handshake')
+    parser.add_argument('--hosts', type=int, default=1, help='Loopback addresses the generated certificate covers')
+    parser.add_argument('--certfile', help='Certificate to serve (default: generate a self-signed one)')
+    parser.add_argument('--keyfile', help='Key for --certfile')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    StandInHandler.options = options
+    server = SlowTLSServer((options.host, options.port), StandInHandler)
+    if options.tls:
+        certfile, keyfile = options.certfile, options.keyfile
+        if not certfile:
+            certfile, keyfile = generate_certificate(tempfile.mkdtemp(prefix='standin-'), options.hosts)
+        server.context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        server.context.load_cert_chain(certfile, keyfile)
+        server.tls_delay_ms = options.tls_delay_ms
+        # The benchmark runner reads this line to trust the certificate
+        print(f'CERTFILE {certfile}', flush=True)
+    print(f'LISTENING {server.server_address[1]}', flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
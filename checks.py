@@ -0,0 +1,537 @@
+import codecs
+import json
+import logging
+import re
+import time
+from datetime import datetime
+from string import Template
+
+import requests
+from requests.cookies import RequestsCookieJar
+from urllib3.exceptions import HTTPError
+
+from stats import PHASES, is_error
+
+# Body bytes each step reads at most, unless the check sets max_bytes
+CHECK_MAX_BYTES = 1024 * 1024
+CHECK_MAX_STEPS = 10
+CHECK_METHODS = ('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS')
+# Text carried over between body chunks for regex matching, so a match of up to this many
+# characters is found even when it straddles two chunks
+REGEX_OVERLAP = 4096
+READ_CHUNK_SIZE = 8192
+
+_PATH_TOKEN = re.compile(r'\.?([^.\[\]]+)|\[(-?\d+)\]')
+# Captured values are used as ${name} in later steps
+_VARIABLE_NAME = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+def _as_list(value):
+    return value if isinstance(value, list) else [value]
+
+
+def parse_json_path(path):
+    """
+    Split a path such as "data.items[0].id" (optionally starting with "$.") into keys and indexes
+
+    Args:
+        path (str): Dotted path with [n] list indexes
+
+    Returns:
+        list: str keys and int indexes
+
+    Raises:
+        ValueError: If the path is empty or malformed
+    """
+    if not isinstance(path, str):
+        raise ValueError(f'JSON path must be a string, not {path!r}')
+    text = path[1:] if path.startswith('$') else path
+    tokens = []
+    position = 0
+    while position < len(text):
+        match = _PATH_TOKEN.match(text, position)
+        if match is None:
+            raise ValueError(f"Invalid JSON path '{path}'")
+        tokens.append(match.group(1) if match.group(1) is not None else int(match.group(2)))
+        position = match.end()
+    if not tokens:
+        raise ValueError(f"Invalid JSON path '{path}'")
+    return tokens
+
+
+def resolve_json_path(document, tokens):
+    """
+    Look up a parsed path in a decoded JSON document
+
+    Raises:
+        LookupError: If the path does not exist in the document
+    """
+    value = document
+    for token in tokens:
+        if isinstance(token, int):
+            if not isinstance(value, list):
+                raise LookupError(token)
+            value = value[token]
+        else:
+            if not isinstance(value, dict):
+                raise LookupError(token)
+            value = value[token]
+    return value
+
+
+def _text_decoder(response):
+    """
+    Incremental decoder for a response body: the charset the server declared, otherwise UTF-8
+    """
+    content_type = response.headers.get('Content-Type', '').lower()
+    encoding = response.encoding if 'charset=' in content_type and response.encoding else 'utf-8'
+    try:
+        return codecs.getincrementaldecoder(encoding)(errors='replace')
+    except LookupError:
+        return codecs.getincrementaldecoder('utf-8')(errors='replace')
+
+
+def _body_chunks(response):
+    """
+    Yield decoded body chunks as they arrive
+
+    iter_content() waits until a whole chunk has arrived, so a body
+    trickled a few bytes at a time could hold a check past its deadline;
+    read1() returns whatever is available (urllib3 2.x).
+    """
+    read1 = getattr(response.raw, 'read1', None)
+    if read1 is None:
+        yield from response.iter_content(READ_CHUNK_SIZE)
+        return
+    while True:
+        chunk = read1(READ_CHUNK_SIZE, decode_content=True)
+        if not chunk:
+            return
+        yield chunk
+
+
+class KeywordMatcher:
+    def __init__(self, keyword, negate=False):
+        """
+        Look for a literal string in a streamed body
+
+        Only the last len(keyword) - 1 characters are kept between chunks.
+
+        Args:
+            keyword (str): Text to find
+            negate (bool): Fail if the text is found instead of if it is missing
+        """
+        self.keyword = keyword
+        self.negate = negate
+        self.found = False
+        self._tail = ''
+
+    @property
+    def done(self):
+        # A negated keyword has to see the whole body before it can pass
+        return self.found
+
+    def feed(self, text):
+        window = self._tail + text
+        if self.keyword in window:
+            self.found = True
+        self._tail = window[-(len(self.keyword) - 1):] if len(self.keyword) > 1 else ''
+
+    def finish(self, truncated):
+        if self.negate and self.found:
+            return f"body contains '{self.keyword}'"
+        if not self.negate and not self.found:
+            return f"'{self.keyword}' not found" + (' in the bytes read' if truncated else '')
+        return None
+
+
+class RegexMatcher:
+    def __init__(self, pattern, variable=None):
+        """
+        Search a streamed body for a regular expression
+
+        Each chunk is searched together with the last REGEX_OVERLAP characters
+        before it, so memory stays bounded; a longer match can be missed.
+
+        Args:
+            pattern (re.Pattern): Compiled expression
+            variable (str): Capture the first group (or the whole match) into this variable
+        """
+        self.pattern = pattern
+        self.variable = variable
+        self.match = None
+        self._tail = ''
+
+    @property
+    def done(self):
+        return self.match is not None
+
+    def feed(self, text):
+        window = self._tail + text
+        self.match = self.pattern.search(window)
+        self._tail = window[-REGEX_OVERLAP:]
+
+    def finish(self, truncated):
+        if self.match is None:
+            return f"no match for /{self.pattern.pattern}/" + (' in the bytes read' if truncated else '')
+        return None
+
+    def captured(self):
+        return self.match.group(1) if self.pattern.groups else self.match.group(0)
+
+
+class JSONMatcher:
+    def __init__(self, expected, captures):
+        """
+        Decode the body as JSON once it has been read and compare values at paths
+
+        JSON has to be read whole, so the body is buffered, but never beyond
+        the check's max_bytes.
+
+        Args:
+            expected (list): (path, tokens, expected value) tuples
+            captures (list): (variable, path, tokens) tuples
+        """
+        self.expected = expected
+        self.captures = captures
+        self.values = {}
+        self._chunks = []
+
+    done = False
+
+    def feed(self, text):
+        self._chunks.append(text)
+
+    def finish(self, truncated):
+        if truncated:
+            return 'body is larger than max_bytes, so its JSON cannot be checked'
+        try:
+            document = json.loads(''.join(self._chunks))
+        except ValueError as e:
+            return f'body is not valid JSON: {e}'
+        finally:
+            self._chunks = []
+        for path, tokens, expected in self.expected:
+            try:
+                value = resolve_json_path(document, tokens)
+            except (LookupError, TypeError):
+                return f"JSON path '{path}' not found"
+            if value != expected:
+                return f"JSON path '{path}' is {json.dumps(value)}, expected {json.dumps(expected)}"
+        for variable, path, tokens in self.captures:
+            try:
+                value = resolve_json_path(document, tokens)
+            except (LookupError, TypeError):
+                return f"JSON path '{path}' not found"
+            self.values[variable] = value if isinstance(value, str) else json.dumps(value)
+        return None
+
+
+class CheckStep:
+    def __init__(self, config):
+        """
+        One request of a check and what its response must look like
+
+        Args:
+            config (dict): Step definition (see Check)
+
+        Raises:
+            ValueError: If the definition is invalid
+        """
+        if not isinstance(config, dict):
+            raise ValueError('each step must be an object')
+        self.method = str(config.get('method', 'GET')).upper()
+        if self.method not in CHECK_METHODS:
+            raise ValueError(f"method must be one of: {', '.join(CHECK_METHODS)}")
+        self.url = config.get('url')
+        if self.url is not None and not isinstance(self.url, str):
+            raise ValueError('url must be a string')
+        self.headers = config.get('headers') or {}
+        if not isinstance(self.headers, dict):
+            raise ValueError('headers must be an object')
+        self.body = config.get('body')
+        self.json = config.get('json')
+        if self.body is not None and self.json is not None:
+            raise ValueError('a step can send body or json, not both')
+
+        expect = config.get('expect') or {}
+        if not isinstance(expect, dict):
+            raise ValueError('expect must be an object')
+        self.statuses = None
+        if expect.get('status') is not None:
+            try:
+                self.statuses = [int(status) for status in _as_list(expect['status'])]
+            except (TypeError, ValueError):
+                raise ValueError('expect.status must be a status code or a list of them')
+        self.contains = [str(keyword) for keyword in _as_list(expect.get('contains') or []) if keyword != '']
+        self.not_contains = [str(keyword) for keyword in _as_list(expect.get('not_contains') or []) if keyword != '']
+        try:
+            self.regexes = [re.compile(pattern) for pattern in _as_list(expect.get('regex') or [])]
+        except (re.error, TypeError) as e:
+            raise ValueError(f'invalid expect.regex: {e}')
+        expected_json = expect.get('json') or {}
+        if not isinstance(expected_json, dict):
+            raise ValueError('expect.json must map JSON paths to expected values')
+        self.expected_json = [(path, parse_json_path(path), value) for path, value in expected_json.items()]
+
+        capture = config.get('capture') or {}
+        if not isinstance(capture, dict):
+            raise ValueError('capture must map variable names to a json path, regex or header')
+        self.capture_json = []
+        self.capture_regex = []
+        self.capture_headers = []
+        for variable, source in capture.items():
+            if not _VARIABLE_NAME.match(variable):
+                raise ValueError(f"capture name '{variable}' must be letters, digits and underscores")
+            if not isinstance(source, dict) or len(source) != 1:
+                raise ValueError(f"capture '{variable}' must be one of {{\"json\": path}}, "
+                                 f"{{\"regex\": pattern}} or {{\"header\": name}}")
+            (kind, value), = source.items()
+            if kind == 'json':
+                self.capture_json.append((variable, value, parse_json_path(value)))
+            elif kind == 'regex':
+                try:
+                    self.capture_regex.append((variable, re.compile(value)))
+                except (re.error, TypeError) as e:
+                    raise ValueError(f"invalid regex for capture '{variable}': {e}")
+            elif kind == 'header':
+                self.capture_headers.append((variable, str(value)))
+            else:
+                raise ValueError(f"capture '{variable}' must use json, regex or header")
+
+    def matchers(self):
+        """
+        Create fresh matchers for one run of the step
+
+        Returns:
+            list: Objects with feed(text), done and finish(truncated)
+        """
+        matchers = [KeywordMatcher(keyword) for keyword in self.contains]
+        matchers.extend(KeywordMatcher(keyword, negate=True) for keyword in self.not_contains)
+        matchers.extend(RegexMatcher(pattern) for pattern in self.regexes)
+        matchers.extend(RegexMatcher(pattern, variable) for variable, pattern in self.capture_regex)
+        if self.expected_json or self.capture_json:
+            matchers.append(JSONMatcher(self.expected_json, self.capture_json))
+        return matchers
+
+    def request_options(self, url, variables):
+        """
+        Build the request for this step, filling ${name} placeholders from earlier captures
+
+        Returns:
+            tuple: (method, url, dict of extra request arguments)
+        """
+        def fill(value):
+            if isinstance(value, str):
+                return Template(value).safe_substitute(variables)
+            if isinstance(value, dict):
+                return {key: fill(item) for key, item in value.items()}
+            if isinstance(value, list):
+                return [fill(item) for item in value]
+            return value
+
+        options = {'headers': {str(name): str(fill(value)) for name, value in self.headers.items()}}
+        if self.body is not None:
+            options['data'] = fill(self.body if isinstance(self.body, str) else json.dumps(self.body)).encode('utf-8')
+        if self.json is not None:
+            options['json'] = fill(self.json)
+        return self.method, fill(self.url) if self.url else url, options
+
+    def check_status(self, status_code):
+        """
+        Get the reason a status code fails the step, or None if it passes
+        """
+        if self.statuses is None:
+            return f'status {status_code}' if is_error(status_code) else None
+        if status_code not in self.statuses:
+            return f"status {status_code}, expected {' or '.join(str(status) for status in self.statuses)}"
+        return None
+
+
+class Check:
+    def __init__(self, config):
+        """
+        A content check or multi-step flow run in place of a plain probe
+
+        The check is either a single step or {"steps": [...]} with shared
+        settings; a step defaults to a GET of the monitored URL:
+
+            {"timeout": 10, "max_bytes": 65536, "steps": [
+                {"method": "POST", "url": "https://example.com/login",
+                 "json": {"user": "monitor", "password": "..."},
+                 "capture": {"token": {"json": "data.token"}}},
+                {"headers": {"Authorization": "Bearer ${token}"},
+                 "expect": {"status": 200, "contains": "ok", "json": {"db.healthy": true}}}
+            ]}
+
+        Cookies set by one step are sent by the following ones, and are
+        forgotten when the check ends.
+
+        Args:
+            config (dict): Check definition from bot_config.json
+
+        Raises:
+            ValueError: If the definition is invalid
+        """
+        if not isinstance(config, dict):
+            raise ValueError('check must be an object')
+        steps = config.get('steps', [config])
+        if not isinstance(steps, list) or not steps:
+            raise ValueError('steps must be a non-empty list')
+        if len(steps) > CHECK_MAX_STEPS:
+            raise ValueError(f'a check can have at most {CHECK_MAX_STEPS} steps')
+        try:
+            self.timeout = float(config['timeout']) if config.get('timeout') is not None else None
+            self.max_bytes = int(config.get('max_bytes', CHECK_MAX_BYTES))
+        except (TypeError, ValueError):
+            raise ValueError('timeout and max_bytes must be numbers')
+        if (self.timeout is not None and self.timeout <= 0) or self.max_bytes < 0:
+            raise ValueError('timeout must be above 0 and max_bytes at least 0')
+        self.steps = []
+        for number, step in enumerate(steps, 1):
+            try:
+                self.steps.append(CheckStep(step))
+            except ValueError as e:
+                raise ValueError(f'step {number}: {e}' if len(steps) > 1 else str(e))
+
+    def run(self, transport, url):
+        """
+        Run every step over the shared transport, stopping at the first failure
+
+        The whole check shares one deadline (timeout, default the transport's
+        request timeout), and each response body is streamed through the
+        step's matchers and read no further than max_bytes, or than the
+        matchers need.
+
+        Args:
+            transport (ProbeTransport): Shared connection pool
+            url (str): Monitored URL, requested by steps without their own
+
+        Returns:
+            dict: Like PingBot.check_status(), with status_code None and a
+                'check_error' message if the check failed
+        """
+        timeout = self.timeout or transport.timeout
+        deadline = time.monotonic() + timeout
+        start_time = time.perf_counter()
+        timings = dict.fromkeys(PHASES, 0.0)
+        cookies = RequestsCookieJar()
+        variables = {}
+        status_code = None
+        body_bytes = 0
+        error = None
+
+        for number, step in enumerate(self.steps, 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                error = f'timed out after {timeout:g}s'
+                break
+            method, step_url, options = step.request_options(url, variables)
+            try:
+                response = transport.request(method, step_url, cookies=cookies, timeout=remaining, **options)
+            except requests.exceptions.RequestException as e:
+                error = f'request failed: {e}'
+                break
+            for redirect in response.history:
+                cookies.update(redirect.cookies)
+            cookies.update(response.cookies)
+            status_code = response.status_code
+
+            transfer_start = time.perf_counter()
+            error = step.check_status(status_code)
+            if error is None:
+                read, error = self._read_body(response, step, deadline, variables)
+                body_bytes += read
+            else:
+                response.close()
+            response.timings.transfer = time.perf_counter() - transfer_start
+            for phase, value in response.timings.as_dict().items():
+                timings[phase] += value
+            if error is not None:
+                break
+
+        response_time = round((time.perf_counter() - start_time) * 1000, 2)
+        result = {
+            'status_code': status_code,
+            'response_time': response_time,
+            'timings': {phase: round(value, 2) for phase, value in timings.items()},
+            'bytes': body_bytes,
+            'timestamp': datetime.now().isoformat()
+        }
+        if error is not None:
+            if len(self.steps) > 1:
+                error = f'step {number}: {error}'
+            logging.error(f"Check failed for {url}: {error}")
+            # Counted as a failed probe everywhere a status code is judged
+            result['status_code'] = None
+            result['check_error'] = error
+        return result
+
+    def _read_body(self, response, step, deadline, variables):
+        """
+        Stream a response body through the step's matchers
+
+        Reading stops once every matcher has what it needs, at max_bytes or
+        at the deadline, and a step without body assertions reads none of it.
+        A fully read body returns the connection to the pool; one cut short
+        closes it.
+
+        Returns:
+            tuple: (body bytes read, failure reason or None)
+        """
+        for variable, header in step.capture_headers:
+            if header not in response.headers:
+                response.close()
+                return 0, f"header '{header}' not found"
+            variables[variable] = response.headers[header]
+
+        matchers = step.matchers()
+        if step.method == 'HEAD':
+            response.content
+            return 0, None
+        if not matchers:
+            # Only the status and headers were checked, so the body is never read
+            response.close()
+            return 0, None
+
+        decoder = _text_decoder(response)
+        body_bytes = 0
+        truncated = False
+        complete = False
+        try:
+            for chunk in _body_chunks(response):
+                if self.max_bytes - body_bytes < len(chunk):
+                    chunk = chunk[:self.max_bytes - body_bytes]
+                    truncated = True
+                body_bytes += len(chunk)
+                text = decoder.decode(chunk)
+                for matcher in matchers:
+                    if not matcher.done:
+                        matcher.feed(text)
+                if truncated or (matchers and all(matcher.done for matcher in matchers)):
+                    break
+                if time.monotonic() > deadline:
+                    return body_bytes, 'timed out reading the body'
+            else:
+                complete = True
+        except (requests.exceptions.RequestException, HTTPError) as e:
+            return body_bytes, f'reading the body failed: {e}'
+        finally:
+            # A body read to the end leaves the connection reusable; one cut short cannot be
+            if complete:
+                response.raw.release_conn()
+            else:
+                response.close()
+
+        tail = decoder.decode(b'', final=True)
+        for matcher in matchers:
+            if tail and not matcher.done:
+                matcher.feed(tail)
+            error = matcher.finish(truncated)
+            if error is not None:
+                return body_bytes, error
+            if isinstance(matcher, RegexMatcher) and matcher.variable:
+                variables[matcher.variable] = matcher.captured()
+            if isinstance(matcher, JSONMatcher):
+                variables.update(matcher.values)
+        return body_bytes, None
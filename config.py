@@ -0,0 +1,193 @@
+import copy
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from persistence import FSYNC_POLICIES, write_atomic
+
+# Configuration file
+CONFIG_FILE = 'bot_config.json'
+# How often the cached config checks the file for outside edits (seconds)
+CONFIG_STAT_INTERVAL = 1.0
+# fsync policy for config writes (see persistence.FSYNC_POLICIES); writes are rare, so default to the safest
+CONFIG_FSYNC = os.environ.get('CONFIG_FSYNC', 'always').lower()
+if CONFIG_FSYNC not in FSYNC_POLICIES:
+    logging.error(f"Unknown CONFIG_FSYNC '{CONFIG_FSYNC}', using 'always'")
+    CONFIG_FSYNC = 'always'
+
+# 'version' counts saves; 'written' is the newest version on disk; 'pending' is the newest
+# configuration passed to save_config(), published as 'config' once it has been written
+config_cache = {'config': None, 'mtime': None, 'checked': 0, 'version': 0, 'written': 0, 'pending': None}
+# Guards config_cache only; never held during file I/O, so readers do not wait on writers
+config_cache_lock = threading.Lock()
+# Serialises file writes
+config_write_lock = threading.Lock()
+# Serialises load-edit-save cycles (see edit_config)
+config_edit_lock = threading.Lock()
+
+def read_config_file(fallback=None):
+    """Load configuration from file
+    
+    If the file exists but cannot be parsed (e.g. while someone is editing it
+    by hand), fallback is returned when given, so a running bot keeps its
+    last good configuration instead of reverting to the defaults.
+    """
+    default_config = {
+        'urls': [
+            {
+                'url': 'https://example.com',
+                'interval': 120,
+                'enabled': True
+            }
+        ],
+        'enabled': False
+    }
+    
+    if os.path.exists(CONFIG_FILE):
+        try:
+            with open(CONFIG_FILE, 'r') as f:
+                loaded_config = json.load(f)
+                
+            # Ensure the config has the new structure
+            if 'urls' not in loaded_config:
+                # Convert old single-URL format to new multi-URL format
+                if 'target_url' in loaded_config:
+                    loaded_config['urls'] = [
+                        {
+                            'url': loaded_config['target_url'],
+                            'interval': loaded_config.get('check_interval', 120),
+                            'enabled': True
+                        }
+                    ]
+                    # Remove old keys
+                    loaded_config.pop('target_url', None)
+                    loaded_config.pop('check_interval', None)
+                else:
+                    # If no URLs found, use default
+                    loaded_config['urls'] = default_config['urls']
+            
+            # Ensure all required fields exist
+            for url_config in loaded_config['urls']:
+                if 'url' not in url_config:
+                    url_config['url'] = 'https://example.com'
+                if 'interval' not in url_config:
+                    url_config['interval'] = 120
+                if 'enabled' not in url_config:
+                    url_config['enabled'] = True
+            
+            if 'enabled' not in loaded_config:
+                loaded_config['enabled'] = False
+                
+            return loaded_config
+        except Exception as e:
+            if fallback is not None:
+                logging.error(f"Error loading config, keeping the last good one: {e}")
+                return fallback
+            logging.error(f"Error loading config: {e}")
+            return default_config
+    return default_config
+
+def config_mtime():
+    """Get the config file's modification time, or None if it does not exist"""
+    try:
+        return os.stat(CONFIG_FILE).st_mtime_ns
+    except OSError:
+        return None
+
+def load_config():
+    """Load configuration, served from memory until the file is written or changes on disk
+    
+    The file is re-read outside the cache lock, so a slow disk never holds up
+    other readers, and because writes replace the file atomically a reader
+    never sees one half-written.
+    """
+    now = time.monotonic()
+    with config_cache_lock:
+        snapshot = config_cache['config']
+        stale = snapshot is None or now - config_cache['checked'] >= CONFIG_STAT_INTERVAL
+        if stale:
+            config_cache['checked'] = now
+            cached_mtime = config_cache['mtime']
+            version = config_cache['version']
+    
+    if stale:
+        mtime = config_mtime()
+        if snapshot is None or mtime != cached_mtime:
+            loaded = read_config_file(fallback=snapshot)
+            with config_cache_lock:
+                # Unless a save landed while we were reading, in which case it is newer
+                if config_cache['version'] == version:
+                    config_cache['mtime'] = mtime
+                    if loaded != snapshot:
+                        config_cache['config'] = snapshot = loaded
+                        config_cache['version'] += 1
+                        config_cache['written'] = config_cache['version']
+                else:
+                    snapshot = config_cache['config']
+    
+    # Callers edit the returned config before saving it, so hand out a copy
+    return copy.deepcopy(snapshot)
+
+def config_version():
+    """Get a number that changes whenever the configuration does"""
+    with config_cache_lock:
+        return config_cache['version']
+
+def save_config(config):
+    """Save configuration to file
+    
+    The new configuration is visible to load_config() once it is on disk; if
+    the write fails the error is raised and readers keep the previous one.
+    Saves that arrive while another is being written are coalesced: whichever
+    writer runs next writes the newest configuration once, and every caller
+    returns only after a version at least as new as its own is on disk.
+    """
+    snapshot = copy.deepcopy(config)
+    with config_cache_lock:
+        config_cache['version'] += 1
+        version = config_cache['version']
+        config_cache['pending'] = snapshot
+    
+    with config_write_lock:
+        with config_cache_lock:
+            if config_cache['written'] >= version:
+                return
+            latest, latest_version = config_cache['pending'], config_cache['version']
+        write_atomic(CONFIG_FILE, json.dumps(latest, indent=2), CONFIG_FSYNC)
+        mtime = config_mtime()
+        with config_cache_lock:
+            # Writes are serialised and take the newest pending version, so this one is the newest on disk
+            config_cache['written'] = max(config_cache['written'], latest_version)
+            config_cache['config'] = latest
+            config_cache['mtime'] = mtime
+            config_cache['checked'] = time.monotonic()
+            if config_cache['version'] == latest_version:
+                config_cache['pending'] = None
+
+@contextmanager
+def edit_config(on_saved=None):
+    """Load the configuration for editing and save it afterwards if it changed
+    
+    Edits are serialised, so two requests changing different URLs at the same
+    time cannot overwrite each other's change. Nothing is saved if the block
+    raises.
+    
+        with edit_config() as config:
+            config['urls'].append(url_config)
+    
+    Args:
+        on_saved (callable): Called with the configuration once a change is on
+            disk, still under the edit lock, so changes are applied in the
+            order they were saved and never when the save failed
+    """
+    with config_edit_lock:
+        config = load_config()
+        original = copy.deepcopy(config)
+        yield config
+        if config != original:
+            save_config(config)
+            if on_saved is not None:
+                on_saved(config)
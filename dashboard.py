@@ -1,123 +1,253 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify
-import json
+from flask import Flask, Response, g, render_template, request, redirect, url_for, jsonify, stream_with_context
+import copy
+import functools
 import os
 import threading
 import time
 import logging
-from ping_bot import MultiURLPingBot
-from datetime import datetime, timedelta
+import requests
 from dotenv import load_dotenv
 
-# Load environment variables from .env file
-load_dotenv()
+# Load environment variables from .env file before the bot modules read them
+# (spawned probe workers inherit them; see init_monitor())
+if __name__ != '__mp_main__':
+    load_dotenv()
+
+import metrics
+from config import config_version, edit_config, load_config
+from events import EventBus, EventBusLogHandler, format_sse
+from monitor import active_urls, create_monitor, monitor_running
+from ping_bot import LOG_FILE
+from response_cache import ResponseCache
+from results_store import ROLLUP_RETENTION_HOURS
+from stats import PHASES, lttb
+from uptime import DEFAULT_SLO, UPTIME_WINDOWS
+from urls import BATCH_FORMATS, apply_batch, parse_probe_settings, read_records, write_records
+from datetime import datetime
 
 app = Flask(__name__)
 
-# Configuration file
-CONFIG_FILE = 'bot_config.json'
+# Seconds between keep-alive comments on idle event streams
+STREAM_HEARTBEAT = 15
+# Most /api/stream connections open at once in this process (0 = no limit). Each holds a
+# server thread while it is open, so gunicorn.conf.py keeps this below the thread count
+MAX_EVENT_STREAMS = int(os.environ.get('MAX_EVENT_STREAMS', 0))
+# Block size for reading the log backwards, and the most /api/logs?since= reads at once
+LOG_READ_BLOCK = 8192
+LOG_MAX_READ = 256 * 1024
+
+# Where probing happens:
+#   embedded - a thread of this process, started and stopped from the dashboard (default)
+#   external - a separate monitor.py process; this process only reads what it stores, so
+#              any number of web workers can serve the dashboard (see gunicorn.conf.py)
+MONITOR_MODE = os.environ.get('MONITOR_MODE', 'embedded').lower()
+# Seconds between checks for results and log lines written by an external monitor
+FOLLOW_INTERVAL = 1.0
+# Longest time /api/results and /api/current_status responses are reused, in seconds
+API_CACHE_TTL = float(os.environ.get('API_CACHE_TTL', 2))
+# With MONITOR_MODE=external, /metrics serves the monitor's metrics from this URL (gunicorn.conf.py
+# sets it when it starts the monitor) plus the ones below, which each web worker keeps for itself
+MONITOR_METRICS_URL = os.environ.get('MONITOR_METRICS_URL')
+WEB_METRICS = (metrics.HTTP_REQUEST_SECONDS.name, metrics.CACHE_REQUESTS.name, 'ping_bot_monitored_urls',
+               'ping_bot_event_stream_listeners', 'ping_bot_running')
 
 # Global variables
 bot_thread = None
-multi_bot = MultiURLPingBot()
+event_bus = EventBus()
+# Set by init_monitor()
+multi_bot = scheduler = None
 bot_running = False
+stream_slots = threading.BoundedSemaphore(MAX_EVENT_STREAMS) if MAX_EVENT_STREAMS > 0 else None
+response_cache = ResponseCache(API_CACHE_TTL)
 
-def load_config():
-    """Load configuration from file"""
-    default_config = {
-        'urls': [
-            {
-                'url': 'https://example.com',
-                'interval': 120,
-                'enabled': True
-            }
-        ],
-        'enabled': False
-    }
+# Read at scrape time, so these cost nothing between scrapes
+metrics.REGISTRY.gauge('ping_bot_monitored_urls', 'URLs currently monitored', function=lambda: monitored_url_count())
+metrics.REGISTRY.gauge('ping_bot_event_stream_listeners', 'Open /api/stream connections',
+                       function=lambda: event_bus.listeners)
+metrics.REGISTRY.gauge('ping_bot_running', '1 while the monitoring loop is running',
+                       function=lambda: int(is_bot_running()))
+
+def is_bot_running():
+    """Whether URLs are being probed, by this process or by the external monitor"""
+    if MONITOR_MODE == 'external':
+        return monitor_running()
+    return bot_running
+
+def monitored_url_count():
+    """Number of URLs being probed, by this process or by the external monitor"""
+    if MONITOR_MODE == 'external':
+        return len(active_urls(load_config()))
+    return len(multi_bot.bots)
+
+def follow_monitor(stopped):
+    """Keep this process current with an external monitor until stopped is set
+    
+    New results are read from the results store into the cache, uptime
+    counters and event stream, new lines of the shared log file are
+    published as 'log' events, and a change in whether the monitor is
+    running is published as a 'bot' event.
+    """
+    running = is_bot_running()
+    log_file, log_offset = None, 0
+    try:
+        stat = os.stat(LOG_FILE)
+        log_file, log_offset = stat.st_ino, stat.st_size
+    except OSError:
+        pass
     
-    if os.path.exists(CONFIG_FILE):
+    while not stopped.wait(FOLLOW_INTERVAL):
         try:
-            with open(CONFIG_FILE, 'r') as f:
-                loaded_config = json.load(f)
-                
-            # Ensure the config has the new structure
-            if 'urls' not in loaded_config:
-                # Convert old single-URL format to new multi-URL format
-                if 'target_url' in loaded_config:
-                    loaded_config['urls'] = [
-                        {
-                            'url': loaded_config['target_url'],
-                            'interval': loaded_config.get('check_interval', 120),
-                            'enabled': True
-                        }
-                    ]
-                    # Remove old keys
-                    loaded_config.pop('target_url', None)
-                    loaded_config.pop('check_interval', None)
-                else:
-                    # If no URLs found, use default
-                    loaded_config['urls'] = default_config['urls']
+            multi_bot.follow_results_store()
             
-            # Ensure all required fields exist
-            for url_config in loaded_config['urls']:
-                if 'url' not in url_config:
-                    url_config['url'] = 'https://example.com'
-                if 'interval' not in url_config:
-                    url_config['interval'] = 120
-                if 'enabled' not in url_config:
-                    url_config['enabled'] = True
+            now_running = is_bot_running()
+            if now_running != running:
+                running = now_running
+                event_bus.publish('bot', {'running': running})
             
-            if 'enabled' not in loaded_config:
-                loaded_config['enabled'] = False
-                
-            return loaded_config
+            try:
+                with open(LOG_FILE, 'rb') as f:
+                    stat = os.fstat(f.fileno())
+                    if stat.st_ino != log_file or stat.st_size < log_offset:
+                        # Rotated: the new file's lines all come after the ones already sent
+                        log_file, log_offset = stat.st_ino, 0
+                    if stat.st_size - log_offset > LOG_MAX_READ:
+                        log_offset = stat.st_size - LOG_MAX_READ
+                    lines, log_offset = read_log_since(f, log_offset, stat.st_size)
+            except FileNotFoundError:
+                lines = []
+            for line in lines:
+                event_bus.publish('log', line.rstrip('\n'))
         except Exception as e:
-            print(f"Error loading config: {e}")
-            return default_config
-    return default_config
-
-def save_config(config):
-    """Save configuration to file"""
-    with open(CONFIG_FILE, 'w') as f:
-        json.dump(config, f, indent=2)
-
-def run_bot():
-    """Run the bot in a separate thread"""
-    global multi_bot, bot_running
+            logging.error(f"Error following the monitor: {e}")
+
+def init_monitor():
+    """Create this process's probe engine and hook it up to the monitor mode
     
-    config = load_config()
-    bot_running = True
+    Not done at import time in spawned probe workers (see workers.py): they
+    re-run the launching script as __mp_main__ and need no store, cache or
+    monitor of their own.
+    """
+    global multi_bot, scheduler, MONITOR_MODE
+    multi_bot, scheduler = create_monitor(event_bus=event_bus)
+    if MONITOR_MODE == 'external':
+        if not multi_bot.can_follow_results_store():
+            # The cache, uptime and current status would stay frozen at what was stored when this worker started
+            raise RuntimeError("MONITOR_MODE=external needs a results backend other processes can follow; "
+                               "RESULTS_BACKEND=json cannot be followed, use sqlite")
+        # Runs in every web worker; gunicorn.conf.py leaves preload_app off so each worker starts its own
+        threading.Thread(target=follow_monitor, args=(threading.Event(),), daemon=True).start()
+    else:
+        if MONITOR_MODE != 'embedded':
+            logging.error(f"Unknown MONITOR_MODE '{MONITOR_MODE}', probing in this process")
+            MONITOR_MODE = 'embedded'
+        # Stream log lines to dashboards as they are written
+        log_handler = EventBusLogHandler(event_bus)
+        log_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+        logging.getLogger().addHandler(log_handler)
+
+if __name__ != '__mp_main__':
+    init_monitor()
+
+def cached_response(view):
+    """Serve a JSON view from response_cache, with an ETag so unchanged data costs a 304
     
-    # Clear existing bots and add new ones
-    multi_bot.bots.clear()
-    for url_config in config['urls']:
-        if url_config.get('enabled', True):
-            multi_bot.add_url(url_config['url'], url_config['interval'])
+    Entries are keyed by path and query string and dropped as soon as new
+    results are recorded or the configuration changes.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.full_path
+        version = (multi_bot.results_version, config_version())
+        cached = response_cache.get(key, version)
+        if cached is None:
+            response = app.make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            etag = response_cache.put(key, version, response.get_data())
+        else:
+            body, etag = cached
+            response = Response(body, mimetype='application/json')
+        response.set_etag(etag)
+        # Browsers revalidate every time, which costs a 304 while the data is unchanged
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
+    return wrapper
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    """Time every route by its URL rule, so /api/uptime?url=... is one series however it is called"""
+    start = g.get('request_start')
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, route=route, method=request.method)
+    return response
+
+def run_bot(config):
+    """Run the bot in a separate thread
     
-    # Get the minimum interval for the main loop
-    min_interval = min([url_config.get('interval', 120) for url_config in config['urls'] if url_config.get('enabled', True)], default=120)
+    Takes the configuration it starts with rather than loading it, so it
+    starts with exactly what sync_bot() applied.
+    """
+    global bot_running
+    
+    # Each URL is probed on its own interval; the scheduler sleeps until the next one is due
+    scheduler.apply(config['urls'])
+    scheduler.schedule_all()
     
     try:
-        while bot_running:
-            # Check all URLs
-            multi_bot.check_all_urls()
-            
-            # Sleep for the minimum interval
-            for _ in range(min_interval):
-                if not bot_running:
-                    break
-                time.sleep(1)
-                
+        scheduler.run()
     except Exception as e:
         print(f"Bot error: {e}")
     finally:
         bot_running = False
 
+def start_bot(config):
+    """Start the bot thread with a configuration"""
+    global bot_thread, bot_running
+    
+    bot_running = True
+    scheduler.reset()
+    bot_thread = threading.Thread(target=run_bot, args=(config,), daemon=True)
+    bot_thread.start()
+    event_bus.publish('bot', {'running': True})
+
+def stop_bot():
+    """Stop the bot thread if it is running"""
+    global bot_running
+    
+    if bot_running:
+        bot_running = False
+        scheduler.stop()
+        if bot_thread:
+            bot_thread.join(timeout=5)
+        event_bus.publish('bot', {'running': False})
+
+def sync_bot(config):
+    """Apply a saved configuration to the bot
+    
+    A running bot is reconfigured in place, so only the URLs that changed
+    are touched and the others keep their state and connections. An
+    external monitor picks up the saved file itself.
+    """
+    if MONITOR_MODE == 'external':
+        return
+    if not config['enabled']:
+        stop_bot()
+    elif bot_running:
+        scheduler.apply(config['urls'])
+    else:
+        start_bot(copy.deepcopy(config))
+
 @app.route('/')
 def dashboard():
     """Main dashboard page"""
     try:
         config = load_config()
-        return render_template('dashboard.html', config=config, bot_running=bot_running)
+        return render_template('dashboard.html', config=config, bot_running=is_bot_running())
     except Exception as e:
         print(f"Error loading dashboard: {e}")
         # Return a minimal config if there's an error
@@ -125,46 +255,39 @@ def dashboard():
             'urls': [{'url': 'https://example.com', 'interval': 120, 'enabled': True}],
             'enabled': False
         }
-        return render_template('dashboard.html', config=fallback_config, bot_running=bot_running)
+        return render_template('dashboard.html', config=fallback_config, bot_running=is_bot_running())
 
 @app.route('/update_config', methods=['POST'])
 def update_config():
     """Update bot configuration"""
-    global bot_thread, bot_running
-    
-    config = load_config()
-    
-    # Parse form data for multiple URLs
-    urls = []
-    url_count = int(request.form.get('url_count', 1))
-    
-    for i in range(url_count):
-        url = request.form.get(f'url_{i}', '').strip()
-        interval = int(request.form.get(f'interval_{i}', 120))
-        enabled = request.form.get(f'enabled_{i}') == 'on'
-        
-        if url:  # Only add non-empty URLs
-            urls.append({
-                'url': url,
-                'interval': interval,
-                'enabled': enabled
-            })
-    
-    config['urls'] = urls
-    config['enabled'] = request.form.get('enabled') == 'on'
-    
-    save_config(config)
-    
-    # Always stop the bot if running
-    if bot_running:
-        bot_running = False
-        if bot_thread:
-            bot_thread.join(timeout=5)
-    
-    # Start bot if enabled
-    if config['enabled']:
-        bot_thread = threading.Thread(target=run_bot, daemon=True)
-        bot_thread.start()
+    # Start, stop or reconfigure the bot to match once the change is saved
+    with edit_config(on_saved=sync_bot) as config:
+        saved = copy.deepcopy(config)
+        # Parse form data for multiple URLs, keeping settings the form does not edit (e.g. probe_mode)
+        existing = {url_config.get('url'): url_config for url_config in config['urls']}
+        urls = []
+        url_count = int(request.form.get('url_count', 1))
+        
+        for i in range(url_count):
+            url = request.form.get(f'url_{i}', '').strip()
+            interval = int(request.form.get(f'interval_{i}', 120))
+            enabled = request.form.get(f'enabled_{i}') == 'on'
+            
+            if url:  # Only add non-empty URLs
+                url_config = dict(existing.get(url, {}))
+                url_config.update({
+                    'url': url,
+                    'interval': interval,
+                    'enabled': enabled
+                })
+                urls.append(url_config)
+        
+        config['urls'] = urls
+        config['enabled'] = request.form.get('enabled') == 'on'
+        
+        if config == saved:
+            # Nothing to save, but the bot may still need starting (e.g. after the dashboard restarted)
+            sync_bot(config)
     
     return redirect(url_for('dashboard'))
 
@@ -173,47 +296,243 @@ def api_status():
     """API endpoint to get bot status"""
     config = load_config()
     return jsonify({
-        'running': bot_running,
+        'running': is_bot_running(),
         'config': config
     })
 
+def read_log_tail(f, size, lines):
+    """Read the last complete lines of an open log file by seeking backwards from its end
+    
+    Only the blocks holding those lines are read, so the cost does not depend
+    on the size of the file. Returns (lines, offset of the end of the last line).
+    """
+    position = size
+    data = b''
+    while position > 0 and data.count(b'\n') <= lines:
+        step = min(LOG_READ_BLOCK, position)
+        position -= step
+        f.seek(position)
+        data = f.read(step) + data
+    # Leave a line that is still being written for the next read
+    end = data.rfind(b'\n') + 1
+    tail = data[:end].splitlines(keepends=True)[-lines:] if end else []
+    return [line.decode('utf-8', 'replace') for line in tail], position + end
+
+def read_log_since(f, offset, size):
+    """Read the complete lines written after a byte offset of an open log file
+    
+    Returns (lines, offset of the end of the last line).
+    """
+    f.seek(offset)
+    data = f.read(size - offset)
+    end = data.rfind(b'\n') + 1
+    return [line.decode('utf-8', 'replace') for line in data[:end].splitlines(keepends=True)], offset + end
+
 @app.route('/api/logs')
 def api_logs():
-    """API endpoint to get recent logs"""
+    """API endpoint to get recent logs
+    
+    Returns the last `lines` lines (default 50). Pass the returned `offset` and
+    `file` back as `since` and `file` to get only the lines written after it;
+    if the log has rotated or too much was written since, the latest lines
+    are returned instead with `reset` set.
+    """
+    lines = min(max(request.args.get('lines', 50, type=int), 1), 1000)
+    since = request.args.get('since', type=int)
+    file_id = request.args.get('file', type=int)
     try:
-        with open('ping_bot.log', 'r') as f:
-            lines = f.readlines()
-            # Return last 50 lines
-            return jsonify({'logs': lines[-50:]})
+        with open(LOG_FILE, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            size = stat.st_size
+            same_file = file_id is None or file_id == stat.st_ino
+            if since is not None and same_file and 0 <= since <= size and size - since <= LOG_MAX_READ:
+                logs, offset = read_log_since(f, since, size)
+                reset = False
+            else:
+                logs, offset = read_log_tail(f, size, lines)
+                reset = since is not None
+            return jsonify({'logs': logs, 'offset': offset, 'file': stat.st_ino, 'reset': reset})
     except FileNotFoundError:
-        return jsonify({'logs': []})
+        return jsonify({'logs': [], 'offset': 0, 'file': None, 'reset': since is not None})
+
+@app.route('/api/stream')
+def api_stream():
+    """Server-Sent Events stream of probe results, status changes, bot state and log lines
+    
+    Every event comes from memory as the bot produces it, so open dashboards
+    no longer poll the config, results and log files. Beyond MAX_EVENT_STREAMS
+    open streams the request gets a 503, and the page polls instead.
+    """
+    if stream_slots is not None and not stream_slots.acquire(blocking=False):
+        return jsonify({'error': 'Too many open event streams'}), 503, {'Retry-After': '60'}
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID', ''))
+    except ValueError:
+        last_event_id = None
+    subscription = event_bus.subscribe(last_event_id)
+    
+    def generate():
+        try:
+            yield 'retry: 5000\n\n'
+            yield format_sse((None, 'bot', {'running': is_bot_running()}))
+            while True:
+                event = subscription.get(timeout=STREAM_HEARTBEAT)
+                # A comment line keeps proxies from closing an idle stream
+                yield format_sse(event) if event else ': keep-alive\n\n'
+        finally:
+            event_bus.unsubscribe(subscription)
+    
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    if stream_slots is not None:
+        # Runs even if the client leaves before the first event is sent
+        response.call_on_close(stream_slots.release)
+    return response
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """The bot's own counters and histograms in the Prometheus text format
+    
+    With PROBE_WORKERS set, probing and scheduling happen in worker
+    processes, so the probe, sweep and scheduler figures stay empty here;
+    per-target results, store writes and cache reads are still complete.
+    With MONITOR_MODE=external everything but WEB_METRICS comes from the
+    monitor, so every web worker reports the same probe counters.
+    """
+    if MONITOR_MODE != 'external':
+        body = metrics.REGISTRY.render()
+    else:
+        body = metrics.REGISTRY.render(WEB_METRICS)
+        if MONITOR_METRICS_URL:
+            try:
+                response = requests.get(MONITOR_METRICS_URL, timeout=5)
+                response.raise_for_status()
+                body = metrics.drop_families(response.text, WEB_METRICS) + body
+            except requests.exceptions.RequestException as e:
+                logging.error(f"Error reading the monitor's metrics: {e}")
+    return Response(body, content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def pick_resolution(hours, max_points):
+    """Pick the data source for drawing a window with at most max_points per URL
+    
+    Returns None for raw samples, otherwise the finest rollup resolution in
+    seconds whose bucket count stays within a small multiple of max_points
+    (LTTB trims the rest).
+    """
+    seconds = hours * 3600
+    if seconds / max_points < min(ROLLUP_RETENTION_HOURS):
+        return None
+    for resolution in sorted(ROLLUP_RETENTION_HOURS):
+        if seconds / resolution <= max_points * 4:
+            return resolution
+    return max(ROLLUP_RETENTION_HOURS)
+
+def label_format(hours, resolution=None):
+    """Pick a chart label format that stays unambiguous for the window"""
+    if resolution is not None and resolution >= 86400:
+        return '%Y-%m-%d'
+    return '%H:%M' if hours <= 24 else '%m-%d %H:%M'
 
 @app.route('/api/results')
+@cached_response
 def api_results():
-    """API endpoint to get monitoring results for charts"""
-    hours = int(request.args.get('hours', 24))
-    results = multi_bot.get_recent_results(hours)
+    """API endpoint to get monitoring results for charts
     
-    # Format data for Chart.js
+    Short windows return raw samples; longer windows return per-minute,
+    per-hour or per-day rollups so each URL gets at most max_points points.
+    """
+    # type= gives None for a value that does not parse, so only missing arguments get defaults
+    hours = request.args.get('hours', type=float) if 'hours' in request.args else 24.0
+    if hours is None or not 0 < hours < float('inf'):
+        return jsonify({'error': 'hours must be a positive number'}), 400
+    max_points = request.args.get('max_points', type=int) if 'max_points' in request.args else 500
+    if max_points is None:
+        return jsonify({'error': 'max_points must be a whole number'}), 400
+    max_points = max(max_points, 3)
+    url = request.args.get('url') or None
+    
+    resolution = pick_resolution(hours, max_points)
+    rollups = multi_bot.get_recent_rollups(resolution, hours, url) if resolution else None
+    if rollups is not None:
+        series = {}
+        for bucket_url, bucket, rollup in rollups:
+            series.setdefault(bucket_url, []).append((bucket, rollup))
+        
+        fmt = label_format(hours, resolution)
+        chart_data = {}
+        for bucket_url, buckets in series.items():
+            if len(buckets) > max_points:
+                keep = lttb([b[0] for b in buckets], [b[1].mean or 0 for b in buckets], max_points)
+                buckets = [buckets[i] for i in keep]
+            chart_data[bucket_url] = {
+                'resolution': resolution,
+                'labels': [time.strftime(fmt, time.localtime(b[0])) for b in buckets],
+                'response_times': [b[1].mean for b in buckets],
+                'min': [b[1].min for b in buckets],
+                'max': [b[1].max for b in buckets],
+                'p95': [b[1].histogram.percentile(95) for b in buckets],
+                'counts': [b[1].count for b in buckets],
+                'errors': [b[1].errors for b in buckets],
+                'phases': {phase: [(b[1].phase_means or {}).get(phase) for b in buckets] for phase in PHASES}
+            }
+        return jsonify(chart_data)
+    
+    # Format data for Chart.js straight from the store's epoch timestamps
+    series = {}
+    for sample_url, timestamp, status_code, response_time, timings in multi_bot.get_recent_samples(hours, url):
+        points = series.setdefault(sample_url, [])
+        if status_code is not None:
+            points.append((timestamp, response_time, status_code, timings or {}))
+    
+    fmt = label_format(hours)
     chart_data = {}
-    for url, url_results in results.items():
-        chart_data[url] = {
-            'labels': [],
-            'response_times': [],
-            'status_codes': []
+    for sample_url, points in series.items():
+        # Backends without rollups still get a bounded response via LTTB downsampling
+        if len(points) > max_points:
+            keep = lttb([p[0] for p in points], [p[1] for p in points], max_points)
+            points = [points[i] for i in keep]
+        chart_data[sample_url] = {
+            'resolution': 0,
+            'labels': [time.strftime(fmt, time.localtime(p[0])) for p in points],
+            'response_times': [p[1] for p in points],
+            'status_codes': [p[2] for p in points],
+            'phases': {phase: [p[3].get(phase) for p in points] for phase in PHASES}
         }
-        
-        for entry in url_results:
-            if entry['result'] is None:
-                continue
-            timestamp = datetime.fromisoformat(entry['timestamp'])
-            chart_data[url]['labels'].append(timestamp.strftime('%H:%M'))
-            chart_data[url]['response_times'].append(entry['result']['response_time'])
-            chart_data[url]['status_codes'].append(entry['result']['status_code'])
     
     return jsonify(chart_data)
 
+@app.route('/api/uptime')
+def api_uptime():
+    """API endpoint for availability, error budget, incidents and latency percentiles
+    
+    Optional `url` and `window` (1h, 24h, 7d or 30d) narrow the response;
+    `slo` sets the availability target in percent for the error budget.
+    Served from counters kept up to date as results arrive, so every window
+    costs the same to read.
+    """
+    url = request.args.get('url')
+    window = request.args.get('window')
+    if window is not None and window not in UPTIME_WINDOWS:
+        return jsonify({'error': f"window must be one of: {', '.join(UPTIME_WINDOWS)}"}), 400
+    slo = request.args.get('slo', DEFAULT_SLO, type=float)
+    if not 0 < slo < 100:
+        return jsonify({'error': 'slo must be between 0 and 100'}), 400
+    
+    windows = [window] if window else list(UPTIME_WINDOWS)
+    urls = [url] if url else multi_bot.uptime.urls
+    uptime = {}
+    for target in urls:
+        summaries = {name: multi_bot.uptime.summary(target, name, slo) for name in windows}
+        if any(summaries.values()):
+            uptime[target] = summaries
+    if url and not uptime:
+        return jsonify({'error': 'No data for this URL'}), 404
+    return jsonify(uptime)
+
 @app.route('/api/current_status')
+@cached_response
 def api_current_status():
     """API endpoint to get current status of all URLs"""
     try:
@@ -238,8 +557,18 @@ def api_current_status():
                     'interval': url_config.get('interval', 120)
                 }
             else:
+                # Fall back to the last cached sample, e.g. while the bot restarts
+                latest = multi_bot.cache.latest(url)
+                previous_result = None
+                if latest is not None and latest[1] is not None:
+                    previous_result = {
+                        'status_code': latest[1],
+                        'response_time': latest[2],
+                        'timings': latest[3],
+                        'timestamp': datetime.fromtimestamp(latest[0]).isoformat()
+                    }
                 current_status[url] = {
-                    'previous_result': None,
+                    'previous_result': previous_result,
                     'enabled': url_config.get('enabled', True),
                     'interval': url_config.get('interval', 120)
                 }
@@ -252,8 +581,6 @@ def api_current_status():
 @app.route('/api/update_url', methods=['POST'])
 def api_update_url():
     """API endpoint to update a single URL via AJAX"""
-    global bot_thread, bot_running
-    
     try:
         data = request.get_json()
         if not data:
@@ -267,32 +594,24 @@ def api_update_url():
         if not new_url:
             return jsonify({'success': False, 'error': 'URL cannot be empty'}), 400
         
-        config = load_config()
-        
-        # Find and update the URL in the config
-        url_updated = False
-        for url_config in config['urls']:
-            if url_config.get('url', '') == original_url:
-                url_config['url'] = new_url
-                url_config['interval'] = interval
-                url_config['enabled'] = enabled
-                url_updated = True
-                break
-        
-        if not url_updated:
-            return jsonify({'success': False, 'error': 'URL not found'}), 404
-        
-        save_config(config)
-        
-        # Restart bot if running to pick up changes
-        if bot_running:
-            bot_running = False
-            if bot_thread:
-                bot_thread.join(timeout=5)
-        
-        if config['enabled']:
-            bot_thread = threading.Thread(target=run_bot, daemon=True)
-            bot_thread.start()
+        probe_settings, error = parse_probe_settings(data)
+        if error:
+            return jsonify({'success': False, 'error': error}), 400
+        
+        with edit_config(on_saved=sync_bot) as config:
+            # Find and update the URL in the config
+            url_updated = False
+            for url_config in config['urls']:
+                if url_config.get('url', '') == original_url:
+                    url_config['url'] = new_url
+                    url_config['interval'] = interval
+                    url_config['enabled'] = enabled
+                    url_config.update(probe_settings)
+                    url_updated = True
+                    break
+            
+            if not url_updated:
+                return jsonify({'success': False, 'error': 'URL not found'}), 404
         
         return jsonify({
             'success': True, 
@@ -307,8 +626,6 @@ def api_update_url():
 @app.route('/api/add_url', methods=['POST'])
 def api_add_url():
     """API endpoint to add a new URL via AJAX"""
-    global bot_thread, bot_running
-    
     try:
         data = request.get_json()
         if not data:
@@ -321,32 +638,24 @@ def api_add_url():
         if not url:
             return jsonify({'success': False, 'error': 'URL cannot be empty'}), 400
         
-        config = load_config()
-        
-        # Check if URL already exists
-        for url_config in config['urls']:
-            if url_config.get('url', '') == url:
-                return jsonify({'success': False, 'error': 'URL already exists'}), 409
+        probe_settings, error = parse_probe_settings(data)
+        if error:
+            return jsonify({'success': False, 'error': error}), 400
         
-        # Add new URL
-        new_url_config = {
-            'url': url,
-            'interval': interval,
-            'enabled': enabled
-        }
-        config['urls'].append(new_url_config)
-        
-        save_config(config)
-        
-        # Restart bot if running to pick up new URL
-        if bot_running:
-            bot_running = False
-            if bot_thread:
-                bot_thread.join(timeout=5)
-        
-        if config['enabled']:
-            bot_thread = threading.Thread(target=run_bot, daemon=True)
-            bot_thread.start()
+        with edit_config(on_saved=sync_bot) as config:
+            # Check if URL already exists
+            for url_config in config['urls']:
+                if url_config.get('url', '') == url:
+                    return jsonify({'success': False, 'error': 'URL already exists'}), 409
+            
+            # Add new URL
+            new_url_config = {
+                'url': url,
+                'interval': interval,
+                'enabled': enabled
+            }
+            new_url_config.update(probe_settings)
+            config['urls'].append(new_url_config)
         
         return jsonify({
             'success': True, 
@@ -362,8 +671,6 @@ def api_add_url():
 @app.route('/api/remove_url', methods=['POST'])
 def api_remove_url():
     """API endpoint to remove a URL via AJAX"""
-    global bot_thread, bot_running
-    
     try:
         data = request.get_json()
         if not data:
@@ -374,26 +681,13 @@ def api_remove_url():
         if not url:
             return jsonify({'success': False, 'error': 'URL cannot be empty'}), 400
         
-        config = load_config()
-        
-        # Remove URL from config
-        original_count = len(config['urls'])
-        config['urls'] = [url_config for url_config in config['urls'] if url_config.get('url', '') != url]
-        
-        if len(config['urls']) == original_count:
-            return jsonify({'success': False, 'error': 'URL not found'}), 404
-        
-        save_config(config)
-        
-        # Restart bot if running to pick up changes
-        if bot_running:
-            bot_running = False
-            if bot_thread:
-                bot_thread.join(timeout=5)
-        
-        if config['enabled']:
-            bot_thread = threading.Thread(target=run_bot, daemon=True)
-            bot_thread.start()
+        with edit_config(on_saved=sync_bot) as config:
+            # Remove URL from config
+            original_count = len(config['urls'])
+            config['urls'] = [url_config for url_config in config['urls'] if url_config.get('url', '') != url]
+            
+            if len(config['urls']) == original_count:
+                return jsonify({'success': False, 'error': 'URL not found'}), 404
         
         return jsonify({
             'success': True, 
@@ -405,6 +699,69 @@ def api_remove_url():
         print(f"Error removing URL: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def batch_format():
+    """Pick the bulk format from ?format=, else from the Content-Type (CSV or NDJSON)"""
+    requested = request.args.get('format', '').lower()
+    if requested:
+        return requested
+    return 'csv' if 'csv' in (request.content_type or '') else 'ndjson'
+
+@app.route('/api/urls/export')
+def api_urls_export():
+    """Download every configured URL as NDJSON or CSV, in the form /api/urls/import accepts"""
+    export_format = request.args.get('format', 'ndjson').lower()
+    if export_format not in BATCH_FORMATS:
+        return jsonify({'success': False, 'error': f"format must be one of: {', '.join(BATCH_FORMATS)}"}), 400
+    config = load_config()
+    mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    return Response(write_records(config['urls'], export_format), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename=urls.{export_format}'
+    })
+
+@app.route('/api/urls/import', methods=['POST'])
+@app.route('/api/urls/patch', methods=['POST'], defaults={'patch': True})
+def api_urls_batch(patch=False):
+    """Apply many URL changes as one batch
+    
+    The body is NDJSON or CSV records. /api/urls/import merges them into the
+    configured URLs (or, with ?mode=replace, makes them the whole list);
+    /api/urls/patch applies each record's op (upsert, add, update, remove).
+    The batch is validated as a whole, then written to bot_config.json once
+    and handed to the bot once, so importing thousands of URLs costs one
+    write and one reconfiguration. ?dry_run=1 reports what would change
+    without saving.
+    """
+    try:
+        body_format = batch_format()
+        if body_format not in BATCH_FORMATS:
+            return jsonify({'success': False, 'error': f"format must be one of: {', '.join(BATCH_FORMATS)}"}), 400
+        mode = 'patch' if patch else request.args.get('mode', 'merge').lower()
+        if mode not in ('merge', 'replace', 'patch'):
+            return jsonify({'success': False, 'error': 'mode must be merge or replace'}), 400
+        
+        records, errors = read_records(request.get_data(as_text=True), body_format)
+        if not errors and not records and mode != 'replace':
+            return jsonify({'success': False, 'error': 'No records provided'}), 400
+        
+        dry_run = request.args.get('dry_run', '').lower() in ('1', 'true', 'yes')
+        with edit_config(on_saved=sync_bot) as config:
+            urls, summary, batch_errors = apply_batch(config['urls'], records, mode)
+            errors = sorted(errors + batch_errors, key=lambda error: error['line'])
+            if errors:
+                return jsonify({'success': False, 'error': f'{len(errors)} invalid record(s); nothing was changed',
+                                'errors': errors[:100]}), 400
+            
+            if not dry_run:
+                # One save and one reconfiguration for the whole batch; untouched URLs keep their schedule
+                config['urls'] = urls
+        
+        summary['total'] = len(urls)
+        return jsonify({'success': True, 'dry_run': dry_run, **summary})
+        
+    except Exception as e:
+        print(f"Error applying URL batch: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 if __name__ == '__main__':
     # Create templates directory if it doesn't exist
     os.makedirs('templates', exist_ok=True)
@@ -0,0 +1,155 @@
+import json
+import logging
+import queue
+import threading
+from collections import deque
+
+
+class Subscription:
+    def __init__(self, max_queued):
+        """
+        One listener's queue of pending events
+
+        Args:
+            max_queued (int): Events held before the oldest are dropped
+        """
+        self._queue = queue.Queue(max_queued)
+
+    def put(self, event):
+        """
+        Queue an event, dropping the oldest one if the listener has fallen behind
+
+        Args:
+            event (tuple): (id, name, data)
+        """
+        while True:
+            try:
+                self._queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout=None):
+        """
+        Wait for the next event
+
+        Args:
+            timeout (float): Seconds to wait
+
+        Returns:
+            tuple: (id, name, data), or None if nothing arrived in time
+        """
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventBus:
+    def __init__(self, history=256, max_queued=256):
+        """
+        In-process fan-out of monitoring events to any number of listeners
+
+        Publishing costs one queue put per listener and never blocks, so a
+        slow or stalled listener only loses its own oldest events.
+
+        Args:
+            history (int): Recent events kept so a reconnecting listener can catch up
+            max_queued (int): Events queued per listener before the oldest are dropped
+        """
+        self.max_queued = max_queued
+        self._history = deque(maxlen=history)
+        self._subscribers = set()
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def publish(self, name, data):
+        """
+        Send an event to every listener
+
+        Args:
+            name (str): Event name (e.g. 'results', 'status_change', 'log')
+            data: JSON-serialisable payload
+        """
+        with self._lock:
+            event = (self._next_id, name, data)
+            self._next_id += 1
+            self._history.append(event)
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            subscription.put(event)
+
+    def subscribe(self, last_event_id=None):
+        """
+        Start listening
+
+        Args:
+            last_event_id (int): Last event the listener saw; newer events still
+                in the history are queued straight away
+
+        Returns:
+            Subscription: The listener's queue; pass it to unsubscribe() when done
+        """
+        subscription = Subscription(self.max_queued)
+        with self._lock:
+            if last_event_id is not None:
+                for event in self._history:
+                    if event[0] > last_event_id:
+                        subscription.put(event)
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """
+        Stop listening
+
+        Args:
+            subscription (Subscription): Queue returned by subscribe()
+        """
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    @property
+    def listeners(self):
+        """
+        Number of current listeners
+        """
+        with self._lock:
+            return len(self._subscribers)
+
+
+def format_sse(event):
+    """
+    Encode an event in the Server-Sent Events wire format
+
+    Args:
+        event (tuple): (id, name, data); an id of None sends the event without one
+
+    Returns:
+        str: The encoded event
+    """
+    event_id, name, data = event
+    prefix = f"id: {event_id}\n" if event_id is not None else ''
+    return f"{prefix}event: {name}\ndata: {json.dumps(data)}\n\n"
+
+
+class EventBusLogHandler(logging.Handler):
+    def __init__(self, event_bus, level=logging.NOTSET):
+        """
+        Logging handler that publishes each formatted record as a 'log' event
+
+        Args:
+            event_bus (EventBus): Bus to publish to
+            level (int): Minimum level to publish
+        """
+        super().__init__(level)
+        self.event_bus = event_bus
+
+    def emit(self, record):
+        try:
+            self.event_bus.publish('log', self.format(record))
+        except Exception:
+            self.handleError(record)
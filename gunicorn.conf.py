@@ -0,0 +1,92 @@
+"""
+Gunicorn settings for serving the dashboard in production
+
+    gunicorn -c gunicorn.conf.py dashboard:app
+
+Web workers only serve the dashboard (MONITOR_MODE=external). Probing is done
+by a single monitor.py process, which the gunicorn master starts and restarts
+alongside the workers unless WEB_SPAWN_MONITOR=false (e.g. when it runs as a
+separate service sharing the same files).
+"""
+import logging
+import multiprocessing
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from dotenv import load_dotenv
+
+# Workers load .env when they import dashboard; load it here too, before the monitor's environment is
+# copied, so the monitor writes to the same store with the same settings the workers read
+load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env'))
+os.environ.setdefault('MONITOR_MODE', 'external')
+
+bind = f"{os.environ.get('HOST', '0.0.0.0')}:{os.environ.get('PORT', '5001')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+# Threaded workers, because every open dashboard holds a thread for its /api/stream connection
+worker_class = 'gthread'
+threads = int(os.environ.get('WEB_THREADS', 16))
+# Open /api/stream connections beyond this get a 503 (the page then polls), so streams can
+# never take every thread and leave none for the API
+os.environ.setdefault('MAX_EVENT_STREAMS', str(max(threads // 2, 1)))
+timeout = 60
+graceful_timeout = 10
+keepalive = 5
+# Each worker starts its own thread following the monitor, which would not survive a preloading fork
+preload_app = False
+
+if os.environ['MONITOR_MODE'] != 'external' and workers > 1:
+    # Every worker would run its own probe thread and probe each URL once per worker
+    logging.warning("MONITOR_MODE is not 'external'; serving with a single worker")
+    workers = 1
+
+SPAWN_MONITOR = (os.environ['MONITOR_MODE'] == 'external'
+                 and os.environ.get('WEB_SPAWN_MONITOR', 'true').lower() not in ('0', 'false', 'no'))
+MONITOR_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'monitor.py')
+# Seconds before a monitor that exited is started again
+MONITOR_RESTART_DELAY = 5
+
+if SPAWN_MONITOR:
+    # Probe and scheduler metrics only exist in the monitor; it serves them on the loopback
+    # interface and every web worker proxies them through /metrics
+    os.environ.setdefault('METRICS_PORT', '9100')
+    os.environ.setdefault('METRICS_HOST', '127.0.0.1')
+    metrics_host = os.environ['METRICS_HOST']
+    if metrics_host in ('', '0.0.0.0', '::'):
+        metrics_host = '127.0.0.1'
+    os.environ.setdefault('MONITOR_METRICS_URL', f"http://{metrics_host}:{os.environ['METRICS_PORT']}/metrics")
+
+# The monitor owns rotation of the shared log; workers only append to it
+monitor_environ = dict(os.environ)
+os.environ['LOG_MAX_BYTES'] = '0'
+
+
+def _supervise_monitor(server):
+    while not server.monitor_stopping:
+        environ = dict(monitor_environ, MONITOR_PARENT_PID=str(os.getpid()))
+        server.monitor_process = subprocess.Popen([sys.executable, MONITOR_SCRIPT], env=environ)
+        server.log.info(f"Started monitor.py (pid {server.monitor_process.pid})")
+        code = server.monitor_process.wait()
+        if not server.monitor_stopping:
+            server.log.error(f"monitor.py exited with code {code}; restarting in {MONITOR_RESTART_DELAY}s")
+            time.sleep(MONITOR_RESTART_DELAY)
+
+
+def when_ready(server):
+    server.monitor_stopping = False
+    server.monitor_process = None
+    if SPAWN_MONITOR:
+        threading.Thread(target=_supervise_monitor, args=(server,), daemon=True).start()
+
+
+def on_exit(server):
+    server.monitor_stopping = True
+    process = getattr(server, 'monitor_process', None)
+    if process is not None and process.poll() is None:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
@@ -0,0 +1,303 @@
+"""
+Self-instrumentation: counters, gauges and histograms rendered in the
+Prometheus text exposition format at the dashboard's /metrics endpoint.
+
+Updating a metric is a dict lookup and an addition under a lock, cheap
+enough for the probe path.
+"""
+import bisect
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Seconds; spans a fast local probe up to a slow sweep
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Per-target series can be switched off when thousands of URLs would make /metrics too large
+PER_TARGET = os.environ.get('METRICS_PER_TARGET', 'true').lower() not in ('0', 'false', 'no')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        """
+        A named metric with optional labels
+
+        Args:
+            name (str): Metric name
+            documentation (str): HELP text
+            labelnames (tuple): Label names; values are passed as keyword arguments
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(labels.get(name, '') for name in self.labelnames)
+
+    def remove(self, **labels):
+        """
+        Drop the series with these label values (e.g. for a URL no longer monitored)
+        """
+        with self._lock:
+            self._values.pop(self._key(labels), None)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}')
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        """
+        A value that goes up and down
+
+        Args:
+            function (callable): Read the value from this at render time instead of set()/inc()
+        """
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def render(self):
+        if self.function is not None:
+            self.set(self.function())
+        return super().render()
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # Per-bucket counts (the last one is +Inf), then the sum
+                series = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._values.items()]
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(float(bound))}"')
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(series[-1])}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        """
+        Collection of metrics rendered together
+        """
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """
+        Add a metric, or return the one already registered under its name
+        """
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), function=None):
+        return self.register(Gauge(name, documentation, labelnames, function))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self, names=None):
+        """
+        Render every metric in the Prometheus text exposition format
+
+        Args:
+            names (iterable): Render only the metrics with these names (default: all)
+
+        Returns:
+            str: The exposition
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        if names is not None:
+            names = set(names)
+            metrics = [metric for metric in metrics if metric.name in names]
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+# Probe engine
+PROBES = REGISTRY.counter(
+    'ping_bot_probes_total', 'Probes recorded, by target and outcome (ok, error or failed)', ('url', 'outcome'))
+PROBE_RESPONSE_SECONDS = REGISTRY.histogram(
+    'ping_bot_probe_response_seconds', 'Response time of successful probes per target', ('url',))
+PROBES_IN_FLIGHT = REGISTRY.gauge(
+    'ping_bot_probes_in_flight', 'Probes currently waiting on a target in this process')
+SWEEP_SECONDS = REGISTRY.histogram(
+    'ping_bot_sweep_duration_seconds', 'Time to probe one batch of due URLs')
+SCHEDULER_LAG_SECONDS = REGISTRY.histogram(
+    'ping_bot_scheduler_lag_seconds', 'How late probes start compared with when they were due',
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300))
+SCHEDULER_QUEUE_DEPTH = REGISTRY.gauge(
+    'ping_bot_scheduler_queue_depth', 'Entries in the scheduler heap')
+SCHEDULER_OVERDUE = REGISTRY.gauge(
+    'ping_bot_scheduler_overdue', 'URLs that were more than a full interval late in the last batch')
+
+# Storage and reads
+STORE_WRITE_SECONDS = REGISTRY.histogram(
+    'ping_bot_results_store_write_seconds', 'Time to append one sweep to the results store')
+CACHE_REQUESTS = REGISTRY.counter(
+    'ping_bot_cache_requests_total', 'Recent-history reads, by whether the in-memory cache served them', ('result',))
+
+# Dashboard
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    'ping_bot_http_request_duration_seconds', 'Dashboard request handling time by route', ('route', 'method'))
+
+
+def target_label(url):
+    """
+    Label value for a per-target series, collapsed when METRICS_PER_TARGET is off
+
+    Args:
+        url (str): Monitored URL
+
+    Returns:
+        str: The URL, or 'all'
+    """
+    return url if PER_TARGET else 'all'
+
+
+def forget_target(url):
+    """
+    Drop a URL's per-target series once it is no longer monitored
+
+    Args:
+        url (str): Monitored URL
+    """
+    if not PER_TARGET:
+        return
+    for outcome in ('ok', 'error', 'failed'):
+        PROBES.remove(url=url, outcome=outcome)
+    PROBE_RESPONSE_SECONDS.remove(url=url)
+
+
+def drop_families(exposition, names):
+    """
+    Remove metrics from an exposition rendered by another process's Registry
+
+    Args:
+        exposition (str): Prometheus text exposition
+        names (iterable): Names of the metrics to remove
+
+    Returns:
+        str: The exposition without those metrics
+    """
+    names = set(names)
+    lines = []
+    family = None
+    for line in exposition.splitlines():
+        # Registry.render() starts every metric with its HELP line
+        if line.startswith('# HELP '):
+            family = line.split(' ', 3)[2]
+        if line and family not in names:
+            lines.append(line)
+    return '\n'.join(lines) + '\n' if lines else ''
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port, host='0.0.0.0'):
+    """
+    Serve /metrics from a background thread, for processes without the dashboard
+
+    Args:
+        port (int): Port to listen on
+        host (str): Address to listen on
+
+    Returns:
+        ThreadingHTTPServer: The server; call shutdown() to stop it
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,233 @@
+"""
+Headless monitor: probes every URL in bot_config.json and records the results,
+without the web dashboard.
+
+Run it as a lightweight sidecar with ``python monitor.py``. It does not import
+Flask, Jinja or dotenv, so it starts quickly and stays small; settings come
+from the same environment variables the dashboard reads (see env.example).
+"""
+import json
+import logging
+import os
+import signal
+import threading
+import time
+
+import metrics
+from config import CONFIG_STAT_INTERVAL, load_config
+from persistence import write_atomic
+from ping_bot import MultiURLPingBot, ProbeScheduler
+from results_store import create_results_store
+from transport import ProbeTransport
+from workers import ShardedMonitor
+
+# Heartbeat file the monitor rewrites every MONITOR_HEARTBEAT seconds, so dashboards
+# in other processes can show whether it is running
+MONITOR_STATE_FILE = os.environ.get('MONITOR_STATE_FILE', 'monitor_state.json')
+MONITOR_HEARTBEAT = 5
+
+
+def create_monitor(environ=None, event_bus=None):
+    """
+    Build the probe engine from environment settings
+
+    Args:
+        environ (dict): Environment variables (defaults to os.environ)
+        event_bus (EventBus): Receives events for every saved sweep
+
+    Returns:
+        tuple: (MultiURLPingBot, scheduler), where the scheduler is a ProbeScheduler,
+            or a ShardedMonitor when PROBE_WORKERS is above zero
+    """
+    environ = os.environ if environ is None else environ
+    probe_options = {
+        'max_workers': int(environ.get('PROBE_MAX_WORKERS', 32)),
+        'per_host_limit': int(environ.get('PROBE_PER_HOST_LIMIT', 4))
+    }
+    transport_options = {
+        'per_host_connections': int(environ.get('PROBE_PER_HOST_LIMIT', 4)),
+        'idle_timeout': int(environ.get('PROBE_IDLE_TIMEOUT', 300)),
+        'dns_ttl': int(environ.get('PROBE_DNS_TTL', 60)),
+        'timeout': float(environ.get('PROBE_TIMEOUT', 30))
+    }
+
+    multi_bot = MultiURLPingBot(
+        results_store=create_results_store(
+            environ.get('RESULTS_BACKEND', 'sqlite'),
+            environ.get('RESULTS_PATH'),
+            retention_hours=int(environ.get('RESULTS_RETENTION_HOURS', 168)),
+            fsync=environ.get('RESULTS_FSYNC', 'file').lower()
+        ),
+        cache_hours=float(environ.get('RESULTS_CACHE_HOURS', 24)),
+        cache_capacity=int(environ.get('RESULTS_CACHE_CAPACITY', 2880)),
+        transport=ProbeTransport(**transport_options),
+        event_bus=event_bus,
+        **probe_options
+    )
+
+    # Number of probe worker processes; 0 probes in a thread of this process
+    workers = int(environ.get('PROBE_WORKERS', 0))
+    if workers > 0:
+        # Workers own consistent-hash shards of the URLs; this process only records their results
+        scheduler = ShardedMonitor(multi_bot, workers, probe_options, transport_options)
+    else:
+        scheduler = ProbeScheduler(multi_bot)
+    return multi_bot, scheduler
+
+
+def active_urls(config):
+    """
+    Get the URL configurations that should be probed
+
+    Args:
+        config (dict): Configuration as returned by load_config()
+
+    Returns:
+        list: URL configuration dicts, empty when monitoring is disabled
+    """
+    return config['urls'] if config.get('enabled') else []
+
+
+def watch_config(scheduler, stopped, applied, interval=CONFIG_STAT_INTERVAL):
+    """
+    Apply edits to bot_config.json to the running scheduler until stopped is set
+
+    load_config() only re-reads the file when its modification time changes,
+    so polling it is a stat call most of the time.
+
+    Args:
+        scheduler (ProbeScheduler): Scheduler to reconfigure
+        stopped (threading.Event): Set to end the watch
+        applied (list): URL configurations the scheduler is currently running
+        interval (float): Seconds between checks
+    """
+    while not stopped.wait(interval):
+        try:
+            urls = active_urls(load_config())
+        except Exception as e:
+            logging.error(f"Error reloading config: {e}")
+            continue
+        if urls != applied:
+            scheduler.apply(urls)
+            applied = urls
+            logging.info(f"Config reloaded: monitoring {len(urls)} URL(s)")
+
+
+def write_monitor_state(monitoring, started):
+    """
+    Record that this process is alive and whether it is probing
+
+    Args:
+        monitoring (bool): Monitoring is enabled and has URLs
+        started (float): Epoch timestamp the monitor started at
+    """
+    state = {'pid': os.getpid(), 'started': started, 'heartbeat': time.time(), 'monitoring': monitoring}
+    try:
+        write_atomic(MONITOR_STATE_FILE, json.dumps(state), fsync='never')
+    except OSError as e:
+        logging.error(f"Error writing monitor state: {e}")
+
+
+def monitor_running(now=None):
+    """
+    Check whether a headless monitor is probing, from its heartbeat file
+
+    Args:
+        now (float): Epoch timestamp to judge the heartbeat's age at (default: now)
+
+    Returns:
+        bool: True if the monitor has written a heartbeat recently and is monitoring
+    """
+    try:
+        with open(MONITOR_STATE_FILE) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return False
+    now = time.time() if now is None else now
+    return bool(state.get('monitoring')) and now - state.get('heartbeat', 0) < 3 * MONITOR_HEARTBEAT
+
+
+def heartbeat(stopped, started, interval=MONITOR_HEARTBEAT):
+    """
+    Rewrite the monitor state file until stopped is set, then mark the monitor stopped
+
+    Args:
+        stopped (threading.Event): Set when the monitor shuts down
+        started (float): Epoch timestamp the monitor started at
+        interval (float): Seconds between heartbeats
+    """
+    while True:
+        try:
+            monitoring = bool(active_urls(load_config()))
+        except Exception:
+            monitoring = False
+        write_monitor_state(monitoring, started)
+        if stopped.wait(interval):
+            break
+    write_monitor_state(False, started)
+
+
+def watch_parent(parent_pid, stopped, scheduler, interval=1.0):
+    """
+    Stop the monitor if the process that started it exits, so it is never left probing on its own
+
+    Args:
+        parent_pid (int): Process id of the supervising parent
+        stopped (threading.Event): Set when the monitor shuts down
+        scheduler (ProbeScheduler): Scheduler to stop
+        interval (float): Seconds between checks
+    """
+    while not stopped.wait(interval):
+        if os.getppid() != parent_pid:
+            logging.warning("Parent process exited; stopping the headless monitor")
+            stopped.set()
+            scheduler.stop()
+
+
+def main():
+    """
+    Run the headless monitor until interrupted or sent SIGTERM
+    """
+    multi_bot, scheduler = create_monitor()
+    stopped = threading.Event()
+
+    def handle_signal(signum, frame):
+        stopped.set()
+        scheduler.stop()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    urls = active_urls(load_config())
+    if not urls:
+        logging.info("Monitoring is disabled or has no URLs; waiting for bot_config.json to change")
+    scheduler.apply(urls)
+    scheduler.schedule_all()
+    threading.Thread(target=watch_config, args=(scheduler, stopped, urls), daemon=True).start()
+    heartbeat_thread = threading.Thread(target=heartbeat, args=(stopped, time.time()), daemon=True)
+    heartbeat_thread.start()
+    # Set by gunicorn.conf.py when the gunicorn master supervises this process
+    parent_pid = int(os.environ.get('MONITOR_PARENT_PID', 0))
+    if parent_pid:
+        threading.Thread(target=watch_parent, args=(parent_pid, stopped, scheduler), daemon=True).start()
+
+    # The dashboard serves /metrics itself; standalone, expose it on its own port when asked
+    metrics_port = int(os.environ.get('METRICS_PORT', 0))
+    if metrics_port:
+        metrics.serve(metrics_port, os.environ.get('METRICS_HOST', '0.0.0.0'))
+        logging.info(f"Serving metrics on port {metrics_port}")
+
+    logging.info(f"Headless monitor started for {len(urls)} URL(s)")
+    try:
+        scheduler.run()
+    finally:
+        stopped.set()
+        heartbeat_thread.join(timeout=5)
+        multi_bot.shutdown()
+        multi_bot.transport.close()
+        multi_bot.results_store.close()
+        logging.info("Headless monitor stopped")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+import os
+import tempfile
+
+# How hard write_atomic() pushes data to disk before returning:
+#   always - fsync the file and then its directory, so the rename itself survives a power cut
+#   file   - fsync the file only; a crash may keep the old version but never a partial one
+#   never  - leave flushing to the OS (fastest; a crash may lose recent writes)
+FSYNC_POLICIES = ('always', 'file', 'never')
+
+
+def write_atomic(path, data, fsync='always'):
+    """
+    Replace a file's contents so readers see either the old or the new version, never a mix
+
+    The data is written to a temporary file in the same directory, which is
+    then renamed over the target; a rename within one filesystem is atomic.
+
+    Args:
+        path (str): File to write
+        data (str): New contents
+        fsync (str): One of FSYNC_POLICIES
+    """
+    if fsync not in FSYNC_POLICIES:
+        raise ValueError(f"fsync must be one of: {', '.join(FSYNC_POLICIES)}")
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(data)
+            f.flush()
+            if fsync != 'never':
+                os.fsync(f.fileno())
+        # mkstemp creates the file owner-only; keep the permissions the file had
+        try:
+            os.chmod(temp_path, os.stat(path).st_mode & 0o777)
+        except FileNotFoundError:
+            os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+    if fsync == 'always':
+        _fsync_directory(directory)
+
+
+def _fsync_directory(directory):
+    """
+    Persist a rename by syncing its directory (not possible on Windows, where it is skipped)
+    """
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
@@ -1,57 +1,251 @@
 import requests
+import copy
+import os
 import time
 import logging
+from logging.handlers import RotatingFileHandler
 from datetime import datetime
-import os
-import json
+import threading
+import functools
+import heapq
+import random
+from array import array
+from collections import defaultdict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import urlsplit
+import metrics
+from checks import Check
+from results_store import SQLiteResultsStore
+from stats import PHASES, LatencyAnomalyDetector, is_error
+from transport import ProbeTransport
+from uptime import UPTIME_WINDOWS, UptimeTracker
+
+# Log file, rotated once it reaches LOG_MAX_BYTES so it never grows without bound
+LOG_FILE = 'ping_bot.log'
 
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s',
     handlers=[
-        logging.FileHandler('ping_bot.log'),
+        RotatingFileHandler(
+            LOG_FILE,
+            maxBytes=int(os.environ.get('LOG_MAX_BYTES', 5 * 1024 * 1024)),
+            backupCount=int(os.environ.get('LOG_BACKUP_COUNT', 3))
+        ),
         logging.StreamHandler()
     ]
 )
 
+# How a probe talks to its target:
+#   get    - full GET, body downloaded (default)
+#   head   - HEAD request, no body
+#   stream - GET that closes after the headers, or after max_bytes of body
+#   range  - GET asking for the first max_bytes of the body with a Range header
+PROBE_MODES = ('get', 'head', 'stream', 'range')
+
+# Stored in place of a missing latency or phase timing in SampleHistory
+MISSING = 0xFFFFFFFF
+
+# Size of each body read in the streaming modes
+READ_CHUNK_SIZE = 8192
+
+# Adaptive scheduling: after ADAPTIVE_STABLE_CHECKS healthy probes whose latency
+# stays within ADAPTIVE_LATENCY_TOLERANCE of its moving average the interval
+# grows by ADAPTIVE_GROWTH, up to max_interval. A status change or failure is
+# rechecked after a quarter of the interval (at least ADAPTIVE_MIN_INTERVAL),
+# and a target that stays down backs off exponentially with jitter.
+ADAPTIVE_STABLE_CHECKS = 3
+ADAPTIVE_GROWTH = 1.5
+ADAPTIVE_LATENCY_TOLERANCE = 0.5
+ADAPTIVE_MIN_INTERVAL = 5
+ADAPTIVE_JITTER = 0.2
+
 class PingBot:
-    def __init__(self, url, interval=120):
+    def __init__(self, url, interval=120, transport=None, probe_mode='get', max_bytes=0, adaptive=False,
+                 max_interval=None, check=None):
         """
         Initialize the ping bot
         
         Args:
             url (str): The URL to monitor
             interval (int): Check interval in seconds (default: 120 = 2 minutes)
+            transport (ProbeTransport): Shared connection pool (default: a private one)
+            probe_mode (str): One of PROBE_MODES
+            max_bytes (int): Body bytes read by the stream and range modes (0 = headers only / 1 byte range)
+            adaptive (bool): Stretch the interval while the target is stable and recheck sooner when it is not
+            max_interval (int): Longest adaptive interval in seconds (default: 4x interval)
+            check (dict): Content assertions or multi-step flow run instead of the plain probe (see checks.Check)
         """
         self.url = url
         self.interval = interval
+        self.probe_mode = probe_mode if probe_mode in PROBE_MODES else 'get'
+        self.max_bytes = max_bytes
+        self.adaptive = adaptive
+        self.max_interval = max_interval
         self.previous_status = None
-        self.session = requests.Session()
+        self.set_check(check)
+        self.reset_schedule()
         
-        # Set a reasonable timeout for requests
-        self.session.timeout = 30
+        # Requests time out after 30 seconds unless the shared transport says otherwise
+        self.transport = transport if transport is not None else ProbeTransport(max_hosts=1, per_host_connections=1)
+        self.session = self.transport.session
         
     def check_status(self):
         """
         Check the status of the target URL
         
         Returns:
-            dict: Dictionary containing status_code and response_time, or None if request failed
+            dict: Dictionary containing status_code, response_time and per-phase timings
+                  (dns, connect, tls, ttfb, transfer in milliseconds), or None if request failed
         """
+        metrics.PROBES_IN_FLIGHT.inc()
         try:
-            start_time = time.time()
-            response = self.session.get(self.url)
-            response_time = round((time.time() - start_time) * 1000, 2)  # Convert to milliseconds
+            if self.check is not None:
+                return self.check.run(self.transport, self.url)
+            start_time = time.perf_counter()
+            response = self._send()
+            transfer_start = time.perf_counter()
+            body_bytes = self._read_body(response)
+            response.timings.transfer = time.perf_counter() - transfer_start
+            response_time = round((time.perf_counter() - start_time) * 1000, 2)  # Convert to milliseconds
             
             return {
                 'status_code': response.status_code,
                 'response_time': response_time,
+                'timings': response.timings.as_dict(),
+                'bytes': body_bytes,
                 'timestamp': datetime.now().isoformat()
             }
         except requests.exceptions.RequestException as e:
             logging.error(f"Request failed for {self.url}: {e}")
             return None
+        finally:
+            metrics.PROBES_IN_FLIGHT.dec()
+    
+    def set_check(self, config):
+        """
+        Replace the URL's check definition
+        
+        An invalid definition is logged and the URL falls back to the plain probe.
+        
+        Args:
+            config (dict): Check definition, or None for a plain probe
+        """
+        # Kept to tell whether a reloaded configuration changed the check
+        self.check_config = copy.deepcopy(config)
+        self.check = None
+        if config:
+            try:
+                self.check = Check(config)
+            except ValueError as e:
+                logging.error(f"Invalid check for {self.url}, using a plain probe: {e}")
+    
+    def _send(self):
+        """
+        Send the request for the configured probe mode
+        
+        Returns:
+            requests.Response: Response whose body has not been read yet
+        """
+        if self.probe_mode == 'head':
+            return self.transport.request('HEAD', self.url, allow_redirects=True)
+        if self.probe_mode == 'range':
+            last_byte = max(self.max_bytes, 1) - 1
+            return self.transport.get(self.url, headers={'Range': f'bytes=0-{last_byte}'})
+        return self.transport.get(self.url)
+    
+    def _read_body(self, response):
+        """
+        Read as much of the response body as the probe mode calls for
+        
+        A fully read body returns the connection to the pool; a body cut
+        short closes the connection instead of draining the rest.
+        
+        Args:
+            response (requests.Response): Response returned by _send()
+            
+        Returns:
+            int: Number of body bytes read
+        """
+        if self.probe_mode == 'get':
+            return len(response.content)
+        if self.probe_mode == 'head':
+            # Reading the empty body hands the connection back to the pool
+            response.content
+            return 0
+        
+        # Range requests are capped too, in case the server ignores the Range header
+        limit = max(self.max_bytes, 1) if self.probe_mode == 'range' else self.max_bytes
+        body_bytes = 0
+        if limit > 0:
+            for chunk in response.iter_content(min(limit, READ_CHUNK_SIZE)):
+                body_bytes += len(chunk)
+                if body_bytes >= limit:
+                    break
+        response.close()
+        return body_bytes
+    
+    def reset_schedule(self):
+        """
+        Forget the adaptive scheduling state and go back to the configured interval
+        """
+        self.current_interval = self.interval
+        self._stable_checks = 0
+        self._failures = 0
+        self._latency_average = None
+        self._last_status = None
+    
+    def next_delay(self, result):
+        """
+        Decide how long to wait before probing again
+        
+        Args:
+            result (dict): Result of the probe that just finished, or None if it failed
+            
+        Returns:
+            float: Seconds until the next probe
+        """
+        if not self.adaptive:
+            return self.interval
+        
+        status = result['status_code'] if result else None
+        changed = self._last_status is not None and status != self._last_status
+        self._last_status = status
+        ceiling = max(self.max_interval or self.interval * 4, self.interval)
+        recheck = min(max(self.interval / 4, ADAPTIVE_MIN_INTERVAL), self.interval)
+        
+        if is_error(status):
+            # Confirm a new failure quickly, then back off while the target stays down
+            self._failures += 1
+            self._stable_checks = 0
+            self.current_interval = self.interval
+            if changed or self._failures == 1:
+                return recheck
+            delay = min(recheck * 2 ** (self._failures - 1), ceiling)
+            return delay * random.uniform(1 - ADAPTIVE_JITTER, 1)
+        
+        response_time = result['response_time']
+        if changed or self._failures:
+            # Recovered or changed status: confirm it before trusting the old pace
+            self._failures = 0
+            self._stable_checks = 0
+            self._latency_average = response_time
+            self.current_interval = self.interval
+            return recheck
+        
+        average = self._latency_average
+        if average is None or abs(response_time - average) <= average * ADAPTIVE_LATENCY_TOLERANCE:
+            self._stable_checks += 1
+            if self._stable_checks >= ADAPTIVE_STABLE_CHECKS:
+                self._stable_checks = 0
+                self.current_interval = min(self.current_interval * ADAPTIVE_GROWTH, ceiling)
+        else:
+            # Latency moved: go back to the configured pace
+            self._stable_checks = 0
+            self.current_interval = self.interval
+        self._latency_average = response_time if average is None else average * 0.8 + response_time * 0.2
+        return self.current_interval
     
     def log_status_change(self, current_result, previous_result):
         """
@@ -102,23 +296,284 @@ class PingBot:
         except Exception as e:
             logging.error(f"Unexpected error for {self.url}: {e}")
 
+def _to_centis(milliseconds):
+    """
+    Store milliseconds as whole hundredths, the precision probes record them at
+    """
+    return MISSING if milliseconds is None else min(int(round(milliseconds * 100)), MISSING - 1)
+
+def _from_centis(value):
+    return None if value == MISSING else value / 100
+
+class SampleHistory:
+    __slots__ = ('capacity', 'timestamps', 'statuses', 'latencies', 'phases', '_start')
+    
+    def __init__(self, capacity):
+        """
+        Columnar ring buffer of one URL's samples
+        
+        Each field lives in its own typed array (float64 epoch seconds, uint16
+        status codes, uint32 hundredths of a millisecond), about 34 bytes per
+        sample instead of a tuple, a float object per value and a timings
+        dict. Tuples are only built for the samples a read returns. A failed
+        probe is stored as status 0 and a MISSING latency; absent phase
+        timings are MISSING too.
+        
+        Args:
+            capacity (int): Samples kept before the oldest is overwritten
+        """
+        self.capacity = capacity
+        self.timestamps = array('d')
+        self.statuses = array('H')
+        self.latencies = array('I')
+        self.phases = tuple(array('I') for _ in PHASES)
+        self._start = 0
+    
+    def __len__(self):
+        return len(self.timestamps)
+    
+    def append(self, timestamp, status_code, response_time, timings):
+        """
+        Append a sample, overwriting the oldest once the buffer is full
+        
+        Returns:
+            float: Timestamp of the overwritten sample, or None if nothing was evicted
+        """
+        values = [timestamp, status_code or 0, _to_centis(response_time)]
+        values.extend(_to_centis(timings.get(phase) if timings else None) for phase in PHASES)
+        columns = (self.timestamps, self.statuses, self.latencies) + self.phases
+        if len(self.timestamps) < self.capacity:
+            for column, value in zip(columns, values):
+                column.append(value)
+            return None
+        
+        index = self._start
+        evicted = self.timestamps[index]
+        for column, value in zip(columns, values):
+            column[index] = value
+        self._start = (index + 1) % self.capacity
+        return evicted
+    
+    def _timestamp_at(self, position):
+        """
+        Get the timestamp at a position in time order (0 = oldest)
+        """
+        return self.timestamps[(self._start + position) % len(self.timestamps)]
+    
+    def _ordered(self, column, position):
+        """
+        Slice a column from a position in time order to the newest sample
+        """
+        first = self._start + position
+        if first >= len(column):
+            return column[first - len(column):self._start]
+        return column[first:] + column[:self._start]
+    
+    def rows_since(self, since):
+        """
+        Get the samples from a point in time onwards, oldest first
+        
+        Args:
+            since (float): Earliest epoch timestamp to include
+            
+        Returns:
+            list: (timestamp, status_code, response_time, timings) tuples
+        """
+        # Binary search for the first sample at or after since
+        low, high = 0, len(self.timestamps)
+        while low < high:
+            middle = (low + high) // 2
+            if self._timestamp_at(middle) < since:
+                low = middle + 1
+            else:
+                high = middle
+        if low == len(self.timestamps):
+            return []
+        
+        phase_columns = [self._ordered(column, low) for column in self.phases]
+        rows = []
+        for timestamp, status, latency, *phase_values in zip(self._ordered(self.timestamps, low),
+                                                             self._ordered(self.statuses, low),
+                                                             self._ordered(self.latencies, low),
+                                                             *phase_columns):
+            timings = None
+            if phase_values.count(MISSING) < len(PHASES):
+                timings = {phase: _from_centis(value) for phase, value in zip(PHASES, phase_values)}
+            rows.append((timestamp, status or None, _from_centis(latency), timings))
+        return rows
+    
+    def latest(self):
+        """
+        Get the newest sample, or None if the buffer is empty
+        """
+        if not self.timestamps:
+            return None
+        return self.rows_since(self._timestamp_at(len(self.timestamps) - 1))[-1]
+
+class RecentResultsCache:
+    def __init__(self, capacity=2880):
+        """
+        Bounded per-URL history of the most recent samples
+        
+        Fed directly by MultiURLPingBot.save_results so recent-history reads
+        can be answered from memory instead of the results store. Each URL's
+        samples are kept in a columnar SampleHistory.
+        
+        Args:
+            capacity (int): Samples kept per URL (default: one day at 30 second intervals)
+        """
+        self.capacity = capacity
+        self._samples = {}
+        self._covered_since = {}
+        self._default_covered_since = None
+        self._lock = threading.Lock()
+    
+    def warm(self, rows, since):
+        """
+        Load samples read from the results store
+        
+        Args:
+            rows (list): (url, timestamp, status_code, response_time, timings) tuples ordered by timestamp
+            since (float): Epoch timestamp from which the rows are complete
+        """
+        with self._lock:
+            self._default_covered_since = since
+            for url, timestamp, status_code, response_time, timings in rows:
+                self._append(url, timestamp, status_code, response_time, timings)
+    
+    def _append(self, url, timestamp, status_code, response_time, timings):
+        """
+        Append a sample, remembering how far back the URL's buffer is still complete
+        """
+        samples = self._samples.get(url)
+        if samples is None:
+            samples = self._samples[url] = SampleHistory(self.capacity)
+            self._covered_since.setdefault(url, self._default_covered_since)
+        evicted = samples.append(timestamp, status_code, response_time, timings)
+        if evicted is not None:
+            # Anything after the evicted sample is still in the buffer
+            self._covered_since[url] = evicted + 1e-6
+    
+    def add(self, results, timestamp):
+        """
+        Record the results of one sweep
+        
+        Args:
+            results (dict): Mapping of URL to check_status() result, or None if the probe failed
+            timestamp (float): Epoch timestamp of the sweep
+        """
+        with self._lock:
+            for url, result in results.items():
+                if result is None:
+                    self._append(url, timestamp, None, None, None)
+                else:
+                    self._append(url, timestamp, result['status_code'], result['response_time'], result.get('timings'))
+    
+    def covers(self, since, url=None):
+        """
+        Check whether the cache holds every sample from a point in time onwards
+        
+        Args:
+            since (float): Epoch timestamp
+            url (str): Only check this URL
+            
+        Returns:
+            bool: True if a query starting at since can be served from memory
+        """
+        with self._lock:
+            if self._default_covered_since is None or self._default_covered_since > since:
+                return False
+            if url is not None:
+                return self._covered_since.get(url, self._default_covered_since) <= since
+            return all(covered <= since for covered in self._covered_since.values())
+    
+    def query(self, since, url=None):
+        """
+        Get cached samples from a point in time onwards
+        
+        Args:
+            since (float): Earliest epoch timestamp to include
+            url (str): Only return samples for this URL
+            
+        Returns:
+            list: (url, timestamp, status_code, response_time, timings) tuples, ordered by timestamp within each URL
+        """
+        with self._lock:
+            urls = [url] if url is not None else list(self._samples)
+            rows = []
+            for sample_url in urls:
+                samples = self._samples.get(sample_url)
+                if samples is not None:
+                    rows.extend((sample_url,) + sample for sample in samples.rows_since(since))
+            return rows
+    
+    def latest(self, url):
+        """
+        Get the most recent sample for a URL
+        
+        Args:
+            url (str): Monitored URL
+            
+        Returns:
+            tuple: (timestamp, status_code, response_time, timings), or None if nothing is cached
+        """
+        with self._lock:
+            samples = self._samples.get(url)
+            return samples.latest() if samples is not None else None
+
 class MultiURLPingBot:
-    def __init__(self):
+    def __init__(self, max_workers=32, per_host_limit=4, results_store=None, cache_hours=24, cache_capacity=2880,
+                 transport=None, event_bus=None):
         """
         Initialize multi-URL ping bot
+        
+        Args:
+            max_workers (int): Maximum number of probes in flight across all hosts
+            per_host_limit (int): Maximum number of concurrent probes against a single host
+            results_store (ResultsStore): Backend for monitoring results (default: SQLite in WAL mode)
+            cache_hours (float): Hours of history preloaded into the in-memory cache
+            cache_capacity (int): Samples kept in memory per URL
+            transport (ProbeTransport): Connection pool shared by every URL (default: one sized to per_host_limit)
+            event_bus (EventBus): Receives 'results', 'status_change' and 'latency_anomaly' events as sweeps are saved
         """
         self.bots = {}
-        self.results_file = 'monitoring_results.json'
+        self.event_bus = event_bus
+        self.detectors = {}
+        self.results_store = results_store if results_store is not None else SQLiteResultsStore()
+        self.cache = RecentResultsCache(cache_capacity)
+        self.transport = transport if transport is not None else ProbeTransport(per_host_connections=per_host_limit)
+        # Bumped whenever results are recorded, so readers can tell when cached responses are stale
+        self.results_version = 0
+        # Taken before warming, so follow_results_store() also picks up samples written meanwhile
+        self._follow_cursor = self._read_new_results(None)[1]
+        self._warm_cache(cache_hours)
+        self.uptime = UptimeTracker()
+        self._warm_uptime()
+        self.max_workers = max_workers
+        self.per_host_limit = per_host_limit
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        # Probes running per host, and probes waiting for one of that host's slots
+        self._host_active = defaultdict(int)
+        self._host_pending = defaultdict(deque)
+        self._host_lock = threading.Lock()
         
-    def add_url(self, url, interval=120):
+    def add_url(self, url, interval=120, probe_mode='get', max_bytes=0, adaptive=False, max_interval=None,
+                check=None):
         """
         Add a URL to monitor
         
         Args:
             url (str): URL to monitor
             interval (int): Check interval in seconds
+            probe_mode (str): One of PROBE_MODES
+            max_bytes (int): Body bytes read by the stream and range modes
+            adaptive (bool): Adapt the interval to how stable the target is
+            max_interval (int): Longest adaptive interval in seconds
+            check (dict): Content assertions or multi-step flow (see checks.Check)
         """
-        self.bots[url] = PingBot(url, interval)
+        self.bots[url] = PingBot(url, interval, self.transport, probe_mode, max_bytes, adaptive, max_interval,
+                                 check)
         
     def remove_url(self, url):
         """
@@ -129,7 +584,98 @@ class MultiURLPingBot:
         """
         if url in self.bots:
             del self.bots[url]
+        self.detectors.pop(url, None)
+        self.uptime.forget(url)
+        metrics.forget_target(url)
+            
+    def _get_executor(self):
+        """
+        Lazily create the shared probe thread pool
+        
+        Returns:
+            ThreadPoolExecutor: Executor used to run probes concurrently
+        """
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='probe')
+            return self._executor
+    
+    def submit_probe(self, bot):
+        """
+        Start probing a URL without waiting for the result
+        
+        Probes are throttled per host before they reach the thread pool:
+        beyond per_host_limit running probes, a host's probes wait in its
+        own queue and are handed to the pool as its slots free up, so pool
+        threads never sit blocked on one busy host while other hosts wait.
+        
+        Args:
+            bot (PingBot): Bot to run
             
+        Returns:
+            concurrent.futures.Future: Resolves to the result of bot.check_status()
+        """
+        future = Future()
+        host = urlsplit(bot.url).netloc.lower()
+        with self._host_lock:
+            if self._host_active[host] >= self.per_host_limit:
+                self._host_pending[host].append((bot, future))
+                return future
+            self._host_active[host] += 1
+        if not self._start_probe(host, bot, future):
+            self._release_host(host)
+        return future
+    
+    def _start_probe(self, host, bot, future):
+        """
+        Hand a probe that holds one of its host's slots to the thread pool
+        
+        Returns:
+            bool: False if the pool has been shut down, in which case the future fails
+        """
+        try:
+            self._get_executor().submit(self._probe, host, bot, future)
+            return True
+        except RuntimeError as e:
+            if future.set_running_or_notify_cancel():
+                future.set_exception(e)
+            return False
+    
+    def _probe(self, host, bot, future):
+        """
+        Run a probe in a pool thread, then pass its host slot on
+        
+        Args:
+            host (str): Host whose slot the probe holds
+            bot (PingBot): Bot to run
+            future (Future): Receives the result
+        """
+        try:
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(bot.check_status())
+                except Exception as e:
+                    future.set_exception(e)
+        finally:
+            self._release_host(host)
+    
+    def _release_host(self, host):
+        """
+        Start the host's next queued probe in the freed slot, or free the slot
+        """
+        while True:
+            with self._host_lock:
+                pending = self._host_pending.get(host)
+                if not pending:
+                    self._host_pending.pop(host, None)
+                    self._host_active[host] -= 1
+                    if self._host_active[host] <= 0:
+                        del self._host_active[host]
+                    return
+                bot, future = pending.popleft()
+            if self._start_probe(host, bot, future):
+                return
+    
     def check_all_urls(self):
         """
         Check all URLs once
@@ -137,93 +683,553 @@ class MultiURLPingBot:
         Returns:
             dict: Results for all URLs
         """
+        return self.check_urls(list(self.bots))
+    
+    def check_urls(self, urls):
+        """
+        Check a subset of the monitored URLs once
+        
+        Probes run concurrently, bounded by max_workers overall and
+        per_host_limit per host, so a sweep takes roughly as long as the
+        slowest target rather than the sum of all targets.
+        
+        Args:
+            urls (list): URLs to check; URLs that are no longer monitored are skipped
+            
+        Returns:
+            dict: Results for the checked URLs
+        """
+        sweep_start = time.perf_counter()
+        bots = [(url, self.bots[url]) for url in urls if url in self.bots]
+        futures = [(url, bot, self.submit_probe(bot)) for url, bot in bots]
+        
         results = {}
-        for url, bot in self.bots.items():
-            result = bot.check_status()
-            if result:
-                results[url] = result
+        for url, bot, future in futures:
+            try:
+                result = future.result()
+            except Exception as e:
+                logging.error(f"Unexpected error probing {url}: {e}")
+                result = None
+            results[url] = result or None
+                
+        metrics.SWEEP_SECONDS.observe(time.perf_counter() - sweep_start)
+        self.record_probes(results)
+        return results
+    
+    def record_probes(self, results):
+        """
+        Log status changes in a batch of finished probes and save them as one sweep
+        
+        Args:
+            results (dict): Mapping of URL to check_status() result, or None if the probe failed
+        """
+        for url, result in results.items():
+            bot = self.bots.get(url)
+            if result and bot is not None:
                 bot.log_status_change(result, bot.previous_status)
                 bot.previous_status = result
-            else:
-                results[url] = None
-                
         # Save results to file for dashboard
         self.save_results(results)
-        return results
+        self.transport.evict_idle()
+    
+    def shutdown(self):
+        """
+        Stop the probe thread pool
+        """
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+    
+    def _warm_cache(self, hours):
+        """
+        Preload the in-memory cache with recent history from the results store
+        
+        Args:
+            hours (float): Number of hours to load
+        """
+        since = time.time() - hours * 3600
+        try:
+            rows = self.results_store.query(since=since)
+        except Exception as e:
+            logging.error(f"Error warming results cache: {e}")
+            return
+        self.cache.warm(rows, since)
+    
+    def _warm_uptime(self):
+        """
+        Preload the uptime counters from the results store's rollups
+        
+        Each window is loaded from the rollup resolution matching its bucket
+        width; backends without rollups replay their raw samples instead.
+        """
+        now = time.time()
+        try:
+            for name, (span, _, resolution) in UPTIME_WINDOWS.items():
+                rollups = self.results_store.query_rollups(resolution, since=now - span - resolution)
+                if rollups is None:
+                    since = now - max(span for span, _, _ in UPTIME_WINDOWS.values())
+                    for url, timestamp, status_code, response_time, _ in self.results_store.query(since=since):
+                        result = {'status_code': status_code, 'response_time': response_time} if status_code else None
+                        self.uptime.add({url: result}, timestamp)
+                    return
+                self.uptime.warm(name, rollups)
+        except Exception as e:
+            logging.error(f"Error warming uptime counters: {e}")
     
-    def save_results(self, results):
+    def save_results(self, results, timestamp=None):
         """
-        Save monitoring results to file
+        Save monitoring results to the results store and the in-memory cache
         
         Args:
             results (dict): Monitoring results
+            timestamp (float): Epoch timestamp of the sweep (default: now)
         """
+        if timestamp is None:
+            timestamp = time.time()
+        write_start = time.perf_counter()
         try:
-            # Load existing results
-            if os.path.exists(self.results_file):
-                with open(self.results_file, 'r') as f:
-                    all_results = json.load(f)
-            else:
-                all_results = {}
-            
-            # Add new results with timestamp
-            timestamp = datetime.now().isoformat()
-            all_results[timestamp] = results
-            
-            # Keep only last 1000 entries to prevent file from growing too large
-            if len(all_results) > 1000:
-                # Remove oldest entries
-                timestamps = sorted(all_results.keys())
-                for old_timestamp in timestamps[:-1000]:
-                    del all_results[old_timestamp]
-            
-            # Save back to file
-            with open(self.results_file, 'w') as f:
-                json.dump(all_results, f, indent=2)
-                
+            self.results_store.append(results, timestamp)
         except Exception as e:
             logging.error(f"Error saving results: {e}")
+        metrics.STORE_WRITE_SECONDS.observe(time.perf_counter() - write_start)
+        self.record_results(results, timestamp)
+    
+    def record_results(self, results, timestamp, log_anomalies=True, count_metrics=True):
+        """
+        Add a sweep to the in-memory cache, uptime counters, metrics and event bus
+        without writing it to the results store
+        
+        Args:
+            results (dict): Monitoring results
+            timestamp (float): Epoch timestamp of the sweep
+            log_anomalies (bool): Log latency regressions as well as publishing them
+            count_metrics (bool): Count the probes in this process's per-target metrics
+        """
+        if self.event_bus is not None:
+            previous = {url: self.cache.latest(url) for url in results}
+        self.cache.add(results, timestamp)
+        self.uptime.add(results, timestamp)
+        self.results_version += 1
+        if count_metrics:
+            self._record_metrics(results)
+        if self.event_bus is not None:
+            self._publish_results(results, timestamp, previous)
+        self._detect_anomalies(results, timestamp, log_anomalies)
+    
+    def _read_new_results(self, cursor):
+        """
+        Read samples appended to the results store after a cursor
+        
+        Returns:
+            tuple: (rows, new cursor); the cursor is None if the store cannot be followed
+        """
+        try:
+            followed = self.results_store.read_new(cursor)
+        except Exception as e:
+            logging.error(f"Error reading new results: {e}")
+            return [], cursor
+        return followed if followed is not None else ([], None)
+    
+    def can_follow_results_store(self):
+        """
+        Check whether follow_results_store() can see what other processes store
+        
+        Returns:
+            bool: False for backends without read_new() support, such as the json backend
+        """
+        return self._follow_cursor is not None
+    
+    def follow_results_store(self):
+        """
+        Record results that another process (e.g. monitor.py) appended to the results store
+        
+        Lets a process that does not probe, such as a dashboard web worker,
+        keep its cache, uptime counters and event stream current. Samples
+        already in the cache are skipped, so it is safe to call while this
+        process saves results of its own.
+        
+        Returns:
+            int: Samples recorded, or None if the store cannot be followed
+        """
+        if self._follow_cursor is None:
+            return None
+        rows, self._follow_cursor = self._read_new_results(self._follow_cursor)
+        sweeps = {}
+        for url, timestamp, status_code, response_time, timings in rows:
+            latest = self.cache.latest(url)
+            if latest is not None and latest[0] >= timestamp:
+                continue
+            result = None
+            if status_code is not None:
+                result = {'status_code': status_code, 'response_time': response_time, 'timings': timings}
+            sweeps.setdefault(timestamp, {})[url] = result
+        for timestamp in sorted(sweeps):
+            # The process that probed these has logged and counted them already
+            self.record_results(sweeps[timestamp], timestamp, log_anomalies=False, count_metrics=False)
+        return sum(len(results) for results in sweeps.values())
+    
+    def _record_metrics(self, results):
+        """
+        Count each probe's outcome and record its response time per target
+        
+        Done here rather than in check_status so results from worker
+        processes are counted too.
+        
+        Args:
+            results (dict): Monitoring results
+        """
+        for url, result in results.items():
+            target = metrics.target_label(url)
+            if result is None:
+                metrics.PROBES.inc(url=target, outcome='failed')
+            elif is_error(result['status_code']):
+                metrics.PROBES.inc(url=target, outcome='error')
+            else:
+                metrics.PROBES.inc(url=target, outcome='ok')
+                metrics.PROBE_RESPONSE_SECONDS.observe(result['response_time'] / 1000, url=target)
+    
+    def _detect_anomalies(self, results, timestamp, log=True):
+        """
+        Feed each successful probe's response time to its URL's latency anomaly detector
+        
+        Args:
+            results (dict): Monitoring results
+            timestamp (float): Epoch timestamp of the sweep
+            log (bool): Log each regression and recovery
+        """
+        for url, result in results.items():
+            if not result or is_error(result['status_code']) or result.get('response_time') is None:
+                continue
+            detector = self.detectors.get(url)
+            if detector is None:
+                detector = self.detectors[url] = LatencyAnomalyDetector()
+            baseline = detector.mean
+            state = detector.update(result['response_time'])
+            if state is None:
+                continue
+            if log and state == 'degraded':
+                logging.warning(f"Latency degraded for {url}: {result['response_time']}ms (baseline {baseline:.2f}ms)")
+            elif log:
+                logging.info(f"Latency recovered for {url}: {result['response_time']}ms (baseline {baseline:.2f}ms)")
+            if self.event_bus is not None:
+                self.event_bus.publish('latency_anomaly', {
+                    'url': url,
+                    'state': state,
+                    'response_time': result['response_time'],
+                    'baseline': round(baseline, 2),
+                    'timestamp': datetime.fromtimestamp(timestamp).isoformat()
+                })
+    
+    def _publish_results(self, results, timestamp, previous):
+        """
+        Publish a saved sweep, and any status transitions in it, to the event bus
+        
+        Args:
+            results (dict): Monitoring results
+            timestamp (float): Epoch timestamp of the sweep
+            previous (dict): Latest cached sample per URL from before the sweep
+        """
+        checked_at = datetime.fromtimestamp(timestamp).isoformat()
+        payload = {}
+        for url, result in results.items():
+            status_code = result['status_code'] if result else None
+            payload[url] = {
+                'status_code': status_code,
+                'response_time': result['response_time'] if result else None,
+                'timings': result.get('timings') if result else None,
+                'timestamp': checked_at
+            }
+            before = previous.get(url)
+            if before is not None and before[1] != status_code:
+                self.event_bus.publish('status_change', {
+                    'url': url,
+                    'previous': before[1],
+                    'current': status_code,
+                    'timestamp': checked_at
+                })
+        self.event_bus.publish('results', payload)
+    
+    def get_recent_samples(self, hours=24, url=None):
+        """
+        Get recent raw samples, from memory when the cache covers the window
+        
+        Args:
+            hours (float): Number of hours to look back
+            url (str): Only return samples for this URL
+            
+        Returns:
+            list: (url, timestamp, status_code, response_time, timings) tuples, ordered by timestamp within each URL
+        """
+        try:
+            cutoff_time = time.time() - (hours * 3600)
+            if self.cache.covers(cutoff_time, url):
+                metrics.CACHE_REQUESTS.inc(result='hit')
+                return self.cache.query(cutoff_time, url)
+            metrics.CACHE_REQUESTS.inc(result='miss')
+            return self.results_store.query(since=cutoff_time, url=url)
+        except Exception as e:
+            logging.error(f"Error loading recent results: {e}")
+            return []
+    
+    def get_recent_rollups(self, resolution, hours=24, url=None):
+        """
+        Get recent precomputed rollup buckets from the results store
+        
+        Args:
+            resolution (int): Bucket width in seconds
+            hours (float): Number of hours to look back
+            url (str): Only return buckets for this URL
+            
+        Returns:
+            list: (url, bucket start, RollupBucket) tuples, or None if the store keeps no rollups
+        """
+        try:
+            cutoff_time = time.time() - (hours * 3600)
+            return self.results_store.query_rollups(resolution, since=cutoff_time - resolution, url=url)
+        except Exception as e:
+            logging.error(f"Error loading rollups: {e}")
+            return None
     
-    def get_recent_results(self, hours=24):
+    def get_recent_results(self, hours=24, url=None):
         """
         Get recent monitoring results
         
         Args:
             hours (int): Number of hours to look back
+            url (str): Only return results for this URL
             
         Returns:
             dict: Recent results organized by URL
         """
-        try:
-            if not os.path.exists(self.results_file):
-                return {}
-                
-            with open(self.results_file, 'r') as f:
-                all_results = json.load(f)
-            
-            # Filter results from last N hours
-            cutoff_time = datetime.now().timestamp() - (hours * 3600)
-            recent_results = {}
+        recent_results = {}
+        for result_url, result_time, status_code, response_time, timings in self.get_recent_samples(hours, url):
+            timestamp = datetime.fromtimestamp(result_time).isoformat()
+            if status_code is None:
+                result = None
+            else:
+                result = {
+                    'status_code': status_code,
+                    'response_time': response_time,
+                    'timings': timings,
+                    'timestamp': timestamp
+                }
+            recent_results.setdefault(result_url, []).append({
+                'timestamp': timestamp,
+                'result': result
+            })
+        
+        return recent_results
+
+class ProbeScheduler:
+    def __init__(self, multi_bot, startup_spread=30):
+        """
+        Schedule each monitored URL on its own interval
+        
+        A min-heap keyed on each URL's next due time decides what to probe,
+        so a URL configured for 3600 seconds is only hit once an hour even
+        when another URL is probed every 30 seconds. Due probes are submitted
+        without waiting for them, and each URL is rescheduled when its own
+        probe finishes, so a slow target only delays itself.
+        
+        Args:
+            multi_bot (MultiURLPingBot): Bot holding the URLs to probe
+            startup_spread (int): Seconds over which first probes are staggered
+        """
+        self.multi_bot = multi_bot
+        self.startup_spread = startup_spread
+        self._heap = []
+        self._generations = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        # Bots with a probe in flight, and finished probes waiting to be recorded
+        self._in_flight = set()
+        self._finished = deque()
+    
+    def reset(self):
+        """
+        Drop every scheduled probe and clear a previous stop request
+        """
+        with self._lock:
+            self._heap = []
+        self._stopped.clear()
+    
+    def schedule(self, url, delay=0):
+        """
+        Schedule a URL to be probed after a delay
+        
+        Args:
+            url (str): URL to probe
+            delay (float): Seconds from now until the probe is due
+        """
+        with self._lock:
+            # Only the newest entry for a URL is live; older ones are dropped when popped
+            generation = self._generations.get(url, 0) + 1
+            self._generations[url] = generation
+            heapq.heappush(self._heap, (time.monotonic() + delay, url, generation))
+        self._wakeup.set()
+    
+    def schedule_all(self):
+        """
+        Schedule every monitored URL, spreading first probes over startup_spread seconds
+        """
+        urls = list(self.multi_bot.bots)
+        for index, url in enumerate(urls):
+            spread = min(self.startup_spread, self.multi_bot.bots[url].interval)
+            self.schedule(url, spread * index / len(urls))
+    
+    def _pop_due(self):
+        """
+        Pop every URL whose due time has passed
+        
+        Returns:
+            tuple: (list of (due time, url) pairs that are due, seconds until the next due time or None)
+        """
+        now = time.monotonic()
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                due_time, url, generation = heapq.heappop(self._heap)
+                if self._generations.get(url) == generation:
+                    due.append((due_time, url))
+                    metrics.SCHEDULER_LAG_SECONDS.observe(now - due_time)
+            next_wait = self._heap[0][0] - now if self._heap else None
+            metrics.SCHEDULER_QUEUE_DEPTH.set(len(self._heap))
+        return due, next_wait
+    
+    def apply(self, url_configs):
+        """
+        Bring the monitored URLs in line with a new configuration without restarting
+        
+        Only URLs that were added, removed or retuned are touched, so every
+        other URL keeps its state, schedule and connections.
+        
+        Args:
+            url_configs (list): URL configuration dicts as stored in bot_config.json
+        """
+        wanted = {}
+        for url_config in url_configs:
+            if url_config.get('enabled', True) and url_config.get('url'):
+                wanted[url_config['url']] = url_config
+        
+        for url in list(self.multi_bot.bots):
+            if url not in wanted:
+                self.multi_bot.remove_url(url)
+                with self._lock:
+                    self._generations.pop(url, None)
+        
+        for url, url_config in wanted.items():
+            interval = url_config.get('interval', 120)
+            probe_mode = url_config.get('probe_mode', 'get')
+            max_bytes = url_config.get('max_bytes', 0)
+            adaptive = bool(url_config.get('adaptive', False))
+            max_interval = url_config.get('max_interval')
+            check = url_config.get('check')
+            bot = self.multi_bot.bots.get(url)
+            if bot is None:
+                self.multi_bot.add_url(url, interval, probe_mode, max_bytes, adaptive, max_interval, check)
+                self.schedule(url)
+            else:
+                bot.probe_mode = probe_mode if probe_mode in PROBE_MODES else 'get'
+                bot.max_bytes = max_bytes
+                if bot.check_config != check:
+                    bot.set_check(check)
+                if (bot.interval, bot.adaptive, bot.max_interval) != (interval, adaptive, max_interval):
+                    bot.interval = interval
+                    bot.adaptive = adaptive
+                    bot.max_interval = max_interval
+                    bot.reset_schedule()
+                    self.schedule(url)
+    
+    def run(self):
+        """
+        Run the scheduling loop until stop() is called
+        """
+        while not self._stopped.is_set():
+            # Cleared before looking for work, so a probe finishing meanwhile still wakes the wait below
+            self._wakeup.clear()
+            self._record_finished()
+            due, next_wait = self._pop_due()
+            if not due:
+                self._wakeup.wait(next_wait)
+                continue
             
-            for timestamp, results in all_results.items():
-                try:
-                    result_time = datetime.fromisoformat(timestamp).timestamp()
-                    if result_time >= cutoff_time:
-                        for url, result in results.items():
-                            if url not in recent_results:
-                                recent_results[url] = []
-                            recent_results[url].append({
-                                'timestamp': timestamp,
-                                'result': result
-                            })
-                except:
+            started = time.monotonic()
+            overdue = 0
+            bots = []
+            for due_time, url in due:
+                bot = self.multi_bot.bots.get(url)
+                # A URL still being probed is rescheduled when that probe finishes
+                if bot is None or bot in self._in_flight:
                     continue
+                if started - due_time > bot.current_interval:
+                    overdue += 1
+                bots.append((due_time, url, bot))
+            metrics.SCHEDULER_OVERDUE.set(overdue)
             
-            return recent_results
-            
+            batch = {'started': time.perf_counter(), 'remaining': len(bots)}
+            for due_time, url, bot in bots:
+                self._in_flight.add(bot)
+                future = self.multi_bot.submit_probe(bot)
+                future.add_done_callback(functools.partial(self._probe_finished, batch, due_time, url, bot))
+        self._record_finished(reschedule=False)
+    
+    def _probe_finished(self, batch, due_time, url, bot, future):
+        """
+        Queue a finished probe for the scheduling loop to record (runs in a pool thread)
+        """
+        try:
+            result = future.result()
         except Exception as e:
-            logging.error(f"Error loading recent results: {e}")
-            return {}
+            logging.error(f"Unexpected error probing {url}: {e}")
+            result = None
+        with self._lock:
+            self._finished.append((batch, due_time, url, bot, result))
+        self._wakeup.set()
+    
+    def _record_finished(self, reschedule=True):
+        """
+        Save the probes that finished since the last call as one sweep and reschedule their URLs
+        
+        Args:
+            reschedule (bool): Schedule each URL's next probe
+        """
+        with self._lock:
+            finished = list(self._finished)
+            self._finished.clear()
+        if not finished:
+            return
+        
+        results = {}
+        for batch, due_time, url, bot, result in finished:
+            self._in_flight.discard(bot)
+            batch['remaining'] -= 1
+            if batch['remaining'] == 0:
+                metrics.SWEEP_SECONDS.observe(time.perf_counter() - batch['started'])
+            # Skip URLs removed or replaced while they were being probed
+            if self.multi_bot.bots.get(url) is bot:
+                results[url] = result or None
+        if results:
+            self.multi_bot.record_probes(results)
+        if not reschedule:
+            return
+        
+        now = time.monotonic()
+        for batch, due_time, url, bot, result in finished:
+            if url not in results:
+                continue
+            # Keep the original cadence unless we have fallen a full delay behind
+            delay = bot.next_delay(result or None)
+            next_due = due_time + delay
+            self.schedule(url, next_due - now if next_due > now else delay)
+    
+    def stop(self):
+        """
+        Stop the scheduling loop
+        """
+        self._stopped.set()
+        self._wakeup.set()
 
 def main():
     """
@@ -0,0 +1,69 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResponseCache:
+    def __init__(self, ttl=2.0, max_entries=256):
+        """
+        Rendered response bodies with their ETags, reused while the data behind them is unchanged
+
+        An entry is served until the data version it was built from changes
+        or it is ttl seconds old, whichever comes first; the age limit covers
+        responses that also depend on the clock, such as "the last 24 hours".
+
+        Args:
+            ttl (float): Longest time an entry is served, in seconds
+            max_entries (int): Entries kept before the least recently used is dropped
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        """
+        Look up a cached response
+
+        Args:
+            key: Identifies the response (e.g. the request path and query string)
+            version: Current version of the data the response is built from
+
+        Returns:
+            tuple: (body bytes, ETag), or None if nothing current is cached
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            body, etag, entry_version, created = entry
+            if entry_version != version or time.monotonic() - created >= self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return body, etag
+
+    def put(self, key, version, body):
+        """
+        Cache a response
+
+        Args:
+            key: Identifies the response
+            version: Version of the data the response was built from
+            body (bytes): Response body
+
+        Returns:
+            str: The body's ETag
+        """
+        etag = hashlib.sha1(body).hexdigest()[:20]
+        with self._lock:
+            self._entries[key] = (body, etag, version, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return etag
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,633 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from persistence import write_atomic
+from stats import PHASES, LatencyHistogram, RollupBucket
+
+# Rollup resolutions in seconds mapped to how many hours each is kept
+ROLLUP_RETENTION_HOURS = {
+    60: 24 * 30,
+    3600: 24 * 365,
+    86400: None,
+}
+
+PHASE_COLUMNS = ', '.join(f'{phase}_ms' for phase in PHASES)
+SAMPLE_COLUMNS = f'target_id, ts, status_code, response_time, {PHASE_COLUMNS}'
+
+
+def _phase_values(timings):
+    """
+    Flatten a timings dict into column values ordered like PHASES
+    """
+    if not timings:
+        return (None,) * len(PHASES)
+    return tuple(timings.get(phase) for phase in PHASES)
+
+
+def _timings_from_values(values):
+    """
+    Rebuild a timings dict from column values ordered like PHASES, or None if none were recorded
+    """
+    if all(value is None for value in values):
+        return None
+    return dict(zip(PHASES, values))
+
+
+def _rollup_from_row(row):
+    """
+    Build a RollupBucket from (count, errors, min, max, sum, histogram, phases) column values
+    """
+    count, errors, minimum, maximum, total, histogram, phases = row
+    return RollupBucket(count, errors, minimum, maximum, total,
+                        LatencyHistogram.from_dict(json.loads(histogram)),
+                        json.loads(phases) if phases else None)
+
+
+class ResultsStore:
+    """
+    Base class for monitoring results backends
+
+    A backend stores one sample per URL per probe. Each sample is returned
+    from query() as a (url, timestamp, status_code, response_time, timings)
+    tuple, where timestamp is seconds since the epoch, timings is a dict of
+    milliseconds per latency phase (or None if not recorded), and
+    status_code, response_time and timings are None for failed probes.
+    """
+
+    def append(self, results, timestamp=None):
+        """
+        Store the results of one sweep
+
+        Args:
+            results (dict): Mapping of URL to check_status() result, or None if the probe failed
+            timestamp (float): Epoch seconds of the sweep (default: now)
+        """
+        raise NotImplementedError
+
+    def query(self, since=None, until=None, url=None):
+        """
+        Load samples in a time range
+
+        Args:
+            since (float): Earliest epoch timestamp to include
+            until (float): Latest epoch timestamp to include
+            url (str): Only return samples for this URL
+
+        Returns:
+            list: (url, timestamp, status_code, response_time, timings) tuples ordered by timestamp
+        """
+        raise NotImplementedError
+
+    def query_rollups(self, resolution, since=None, until=None, url=None):
+        """
+        Load precomputed rollup buckets in a time range
+
+        Args:
+            resolution (int): Bucket width in seconds, one of ROLLUP_RETENTION_HOURS
+            since (float): Earliest bucket start to include
+            until (float): Latest bucket start to include
+            url (str): Only return buckets for this URL
+
+        Returns:
+            list: (url, bucket start, RollupBucket) tuples ordered by bucket start,
+                  or None if the backend does not keep rollups
+        """
+        return None
+
+    def read_new(self, cursor=None):
+        """
+        Load samples appended since a cursor, in the order they were written
+
+        Lets another process follow what is being stored without re-reading
+        a time range.
+
+        Args:
+            cursor: Value returned by the previous call; None starts at the current end
+
+        Returns:
+            tuple: (list of query()-style tuples, new cursor), or None if the backend
+                   cannot be followed
+        """
+        return None
+
+    def close(self):
+        """
+        Release any resources held by the backend
+        """
+
+
+class SQLiteResultsStore(ResultsStore):
+    def __init__(self, path='monitoring_results.db', retention_hours=168, synchronous='NORMAL'):
+        """
+        Append-only results store backed by SQLite in WAL mode
+
+        Every sample is a single indexed insert, so writes cost the same no
+        matter how much history is kept, and a crash can at worst lose the
+        sweep being written rather than corrupting the whole history.
+        Per-minute, per-hour and per-day rollups are maintained alongside the
+        raw samples so long time ranges can be charted without reading them.
+
+        Args:
+            path (str): Database file
+            retention_hours (int): Samples older than this are pruned
+            synchronous (str): SQLite synchronous setting (OFF, NORMAL or FULL)
+        """
+        self.path = path
+        self.retention_hours = retention_hours
+        self.prune_interval = 300
+        self._last_prune = 0
+        self._target_ids = {}
+        self._target_urls = {}
+        self._open_rollups = {}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(f'PRAGMA synchronous={synchronous}')
+        self._create_schema()
+
+    def _create_schema(self):
+        """
+        Create tables and indexes if they do not exist yet
+        """
+        with self._lock:
+            had_rollups = self._conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'rollups'"
+            ).fetchone() is not None
+            self._conn.executescript('''
+                CREATE TABLE IF NOT EXISTS targets (
+                    id INTEGER PRIMARY KEY,
+                    url TEXT UNIQUE NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS samples (
+                    target_id INTEGER NOT NULL,
+                    ts REAL NOT NULL,
+                    status_code INTEGER,
+                    response_time REAL
+                );
+                CREATE INDEX IF NOT EXISTS samples_target_ts ON samples (target_id, ts);
+                CREATE INDEX IF NOT EXISTS samples_ts ON samples (ts);
+                CREATE TABLE IF NOT EXISTS rollups (
+                    resolution INTEGER NOT NULL,
+                    target_id INTEGER NOT NULL,
+                    bucket REAL NOT NULL,
+                    count INTEGER NOT NULL,
+                    errors INTEGER NOT NULL,
+                    min REAL,
+                    max REAL,
+                    sum REAL NOT NULL,
+                    histogram TEXT NOT NULL,
+                    PRIMARY KEY (resolution, target_id, bucket)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS rollups_resolution_bucket ON rollups (resolution, bucket);
+                CREATE TABLE IF NOT EXISTS imports (
+                    source TEXT PRIMARY KEY,
+                    until REAL NOT NULL
+                );
+            ''')
+            self._add_missing_columns('samples', {f'{phase}_ms': 'REAL' for phase in PHASES})
+            self._add_missing_columns('rollups', {'phases': 'TEXT'})
+            has_samples = self._conn.execute('SELECT 1 FROM samples LIMIT 1').fetchone() is not None
+
+        # Databases created before rollups existed get them computed once from their samples
+        if not had_rollups and has_samples:
+            self.rebuild_rollups()
+
+    def _add_missing_columns(self, table, columns):
+        """
+        Add columns introduced after a database was created
+
+        Args:
+            table (str): Table name
+            columns (dict): Column types keyed by column name
+        """
+        existing = {row[1] for row in self._conn.execute(f'PRAGMA table_info({table})')}
+        for column, column_type in columns.items():
+            if column not in existing:
+                self._conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {column_type}')
+
+    def _target_id(self, url):
+        """
+        Get the row id for a URL, creating it on first use
+
+        Args:
+            url (str): Monitored URL
+
+        Returns:
+            int: Target id
+        """
+        target_id = self._target_ids.get(url)
+        if target_id is None:
+            self._conn.execute('INSERT OR IGNORE INTO targets (url) VALUES (?)', (url,))
+            target_id = self._conn.execute('SELECT id FROM targets WHERE url = ?', (url,)).fetchone()[0]
+            self._target_ids[url] = target_id
+            self._target_urls[target_id] = url
+        return target_id
+
+    def _sample_rows(self, results, timestamp):
+        """
+        Turn one sweep into (target_id, ts, status_code, response_time, timings) tuples
+        """
+        rows = []
+        for url, result in results.items():
+            if result is None:
+                rows.append((self._target_id(url), timestamp, None, None, None))
+            else:
+                rows.append((self._target_id(url), timestamp, result['status_code'], result['response_time'],
+                             result.get('timings')))
+        return rows
+
+    def _insert_samples(self, rows):
+        self._conn.executemany(
+            f'INSERT INTO samples (target_id, ts, status_code, response_time, {PHASE_COLUMNS}) '
+            f'VALUES (?, ?, ?, ?, {", ".join("?" * len(PHASES))})',
+            [row[:4] + _phase_values(row[4]) for row in rows]
+        )
+
+    def append(self, results, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+
+        with self._lock:
+            rows = self._sample_rows(results, timestamp)
+            self._conn.execute('BEGIN')
+            try:
+                self._insert_samples(rows)
+                self._update_rollups(rows)
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+
+            if timestamp - self._last_prune >= self.prune_interval:
+                self._prune(timestamp)
+
+    def _open_rollup(self, resolution, target_id, bucket):
+        """
+        Get the in-progress rollup bucket for a target, loading it if the process restarted mid-bucket
+
+        Args:
+            resolution (int): Bucket width in seconds
+            target_id (int): Target id
+            bucket (float): Bucket start
+
+        Returns:
+            RollupBucket: The bucket being accumulated
+        """
+        key = (resolution, target_id)
+        current = self._open_rollups.get(key)
+        if current is not None and current[0] == bucket:
+            return current[1]
+
+        row = self._conn.execute(
+            'SELECT count, errors, min, max, sum, histogram, phases FROM rollups '
+            'WHERE resolution = ? AND target_id = ? AND bucket = ?',
+            (resolution, target_id, bucket)
+        ).fetchone()
+        rollup = RollupBucket() if row is None else _rollup_from_row(row)
+        self._open_rollups[key] = (bucket, rollup)
+        return rollup
+
+    def _update_rollups(self, rows, now=None):
+        """
+        Fold new samples into every rollup resolution
+
+        Each sample touches one in-memory bucket per resolution, and each
+        bucket touched is written once per call, so rollups cost O(1) per
+        sample. Rows must be in time order per target.
+
+        Args:
+            rows (list): (target_id, ts, status_code, response_time, timings) tuples
+            now (float): When given, skip buckets already past their resolution's retention
+        """
+        cutoffs = {}
+        if now is not None:
+            cutoffs = {resolution: now - hours * 3600
+                       for resolution, hours in ROLLUP_RETENTION_HOURS.items() if hours is not None}
+        touched = {}
+        for target_id, ts, status_code, response_time, timings in rows:
+            for resolution in ROLLUP_RETENTION_HOURS:
+                bucket = ts - ts % resolution
+                if bucket < cutoffs.get(resolution, bucket):
+                    continue
+                rollup = self._open_rollup(resolution, target_id, bucket)
+                rollup.add(status_code, response_time, timings)
+                touched[(resolution, target_id, bucket)] = rollup
+        updates = [(resolution, target_id, bucket, rollup.count, rollup.errors, rollup.min, rollup.max, rollup.sum,
+                    json.dumps(rollup.histogram.to_dict()), json.dumps(rollup.phases) if rollup.phases else None)
+                   for (resolution, target_id, bucket), rollup in touched.items()]
+        self._conn.executemany(
+            'INSERT OR REPLACE INTO rollups '
+            '(resolution, target_id, bucket, count, errors, min, max, sum, histogram, phases) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            updates
+        )
+
+    def rebuild_rollups(self, batch_size=10000):
+        """
+        Recompute every rollup bucket from the raw samples
+
+        Used when rollups are added to a database that already holds samples.
+
+        Args:
+            batch_size (int): Number of samples folded in per transaction
+        """
+        with self._lock:
+            self._conn.execute('DELETE FROM rollups')
+            self._open_rollups = {}
+            last_rowid = 0
+            while True:
+                rows = self._conn.execute(
+                    f'SELECT rowid, target_id, ts, status_code, response_time, {PHASE_COLUMNS} FROM samples '
+                    'WHERE rowid > ? ORDER BY rowid LIMIT ?',
+                    (last_rowid, batch_size)
+                ).fetchall()
+                if not rows:
+                    break
+                last_rowid = rows[-1][0]
+                self._conn.execute('BEGIN')
+                self._update_rollups([row[1:5] + (_timings_from_values(row[5:]),) for row in rows])
+                self._conn.execute('COMMIT')
+
+    def backfill(self, sweeps, source=None):
+        """
+        Load a batch of historical sweeps in one transaction
+
+        Every sample is folded into the rollups that are still within their
+        retention, but only samples inside the raw retention window are kept
+        as samples, so importing years of history costs a few rows per URL
+        per hour or day rather than one per probe. Stop the monitor first:
+        its in-progress rollup buckets would overwrite backfilled ones that
+        fall in the same minute, hour or day.
+
+        Args:
+            sweeps (list): (results, timestamp) pairs, as passed to append()
+            source (str): Name to record progress under, read back with imported_until()
+
+        Returns:
+            int: Samples loaded
+        """
+        if not sweeps:
+            return 0
+        sweeps = sorted(sweeps, key=lambda sweep: sweep[1])
+        now = time.time()
+        cutoff = now - self.retention_hours * 3600
+        with self._lock:
+            rows = []
+            for results, timestamp in sweeps:
+                rows.extend(self._sample_rows(results, timestamp))
+            self._conn.execute('BEGIN')
+            try:
+                self._insert_samples([row for row in rows if row[1] >= cutoff])
+                self._update_rollups(rows, now)
+                if source is not None:
+                    self._conn.execute(
+                        'INSERT INTO imports (source, until) VALUES (?, ?) '
+                        'ON CONFLICT (source) DO UPDATE SET until = MAX(until, excluded.until)',
+                        (source, sweeps[-1][1])
+                    )
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+            # Old buckets loaded here are not what live appends will add to next
+            self._open_rollups = {}
+        return len(rows)
+
+    def imported_until(self, source):
+        """
+        Get the newest sweep timestamp backfilled from a source
+
+        Args:
+            source (str): Name passed to backfill()
+
+        Returns:
+            float: Epoch timestamp, or None if nothing has been imported from it
+        """
+        with self._lock:
+            row = self._conn.execute('SELECT until FROM imports WHERE source = ?', (source,)).fetchone()
+        return row[0] if row else None
+
+    def compact(self, vacuum=True):
+        """
+        Drop everything past its retention and give the space back to the filesystem
+
+        Raw samples and minute rollups age out first, leaving hourly and daily
+        rollups, so the file stays bounded however many years it covers.
+
+        Args:
+            vacuum (bool): Rewrite the database file to release free pages (needs
+                free disk space about the size of the file and blocks writers meanwhile)
+
+        Returns:
+            dict: File size in bytes before and after
+        """
+        size_before = self._file_size()
+        with self._lock:
+            self._prune(time.time())
+            self._conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            if vacuum:
+                self._conn.execute('VACUUM')
+                self._conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            self._conn.execute('PRAGMA optimize')
+        return {'bytes_before': size_before, 'bytes_after': self._file_size()}
+
+    def _file_size(self):
+        total = 0
+        for suffix in ('', '-wal'):
+            try:
+                total += os.path.getsize(self.path + suffix)
+            except OSError:
+                pass
+        return total
+
+    def _prune(self, now):
+        """
+        Delete samples that fall outside the retention window
+
+        Args:
+            now (float): Current epoch timestamp
+        """
+        self._last_prune = now
+        cutoff = now - self.retention_hours * 3600
+        self._conn.execute('DELETE FROM samples WHERE ts < ?', (cutoff,))
+        for resolution, retention_hours in ROLLUP_RETENTION_HOURS.items():
+            if retention_hours is not None:
+                self._conn.execute('DELETE FROM rollups WHERE resolution = ? AND bucket < ?',
+                                   (resolution, now - retention_hours * 3600))
+
+    def _target_url(self, target_id):
+        """
+        Get the URL for a target id
+
+        Args:
+            target_id (int): Target id
+
+        Returns:
+            str: Monitored URL
+        """
+        url = self._target_urls.get(target_id)
+        if url is None:
+            for row_id, row_url in self._conn.execute('SELECT id, url FROM targets'):
+                self._target_urls[row_id] = row_url
+                self._target_ids[row_url] = row_id
+            url = self._target_urls.get(target_id)
+        return url
+
+    def query(self, since=None, until=None, url=None):
+        # Both paths are index range scans: (target_id, ts) for one URL, (ts) otherwise
+        params = [since if since is not None else 0]
+        if url is not None:
+            with self._lock:
+                row = self._conn.execute('SELECT id FROM targets WHERE url = ?', (url,)).fetchone()
+            if row is None:
+                return []
+            sql = f'SELECT {SAMPLE_COLUMNS} FROM samples WHERE target_id = ? AND ts >= ?'
+            params.insert(0, row[0])
+        else:
+            sql = f'SELECT {SAMPLE_COLUMNS} FROM samples WHERE ts >= ?'
+        if until is not None:
+            sql += ' AND ts <= ?'
+            params.append(until)
+        sql += ' ORDER BY ts'
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+            return [(self._target_url(row[0]), row[1], row[2], row[3], _timings_from_values(row[4:]))
+                    for row in rows]
+
+    def read_new(self, cursor=None, limit=100000):
+        # Row ids only grow (pruning removes the oldest rows), so they order samples by commit
+        with self._lock:
+            if cursor is None:
+                return [], self._conn.execute('SELECT COALESCE(MAX(rowid), 0) FROM samples').fetchone()[0]
+            rows = self._conn.execute(
+                f'SELECT rowid, {SAMPLE_COLUMNS} FROM samples WHERE rowid > ? ORDER BY rowid LIMIT ?',
+                (cursor, limit)
+            ).fetchall()
+            if not rows:
+                # A VACUUM renumbers rows; start again from the new end rather than wait for it
+                newest = self._conn.execute('SELECT COALESCE(MAX(rowid), 0) FROM samples').fetchone()[0]
+                return [], min(cursor, newest)
+            return ([(self._target_url(row[1]), row[2], row[3], row[4], _timings_from_values(row[5:]))
+                     for row in rows], rows[-1][0])
+
+    def query_rollups(self, resolution, since=None, until=None, url=None):
+        params = [resolution, since if since is not None else 0]
+        if url is not None:
+            with self._lock:
+                row = self._conn.execute('SELECT id FROM targets WHERE url = ?', (url,)).fetchone()
+            if row is None:
+                return []
+            sql = ('SELECT target_id, bucket, count, errors, min, max, sum, histogram, phases FROM rollups '
+                   'WHERE resolution = ? AND bucket >= ? AND target_id = ?')
+            params.append(row[0])
+        else:
+            sql = ('SELECT target_id, bucket, count, errors, min, max, sum, histogram, phases FROM rollups '
+                   'WHERE resolution = ? AND bucket >= ?')
+        if until is not None:
+            sql += ' AND bucket <= ?'
+            params.append(until)
+        sql += ' ORDER BY bucket'
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+            return [(self._target_url(row[0]), row[1], _rollup_from_row(row[2:])) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class JSONFileResultsStore(ResultsStore):
+    def __init__(self, path='monitoring_results.json', max_entries=1000, fsync='file'):
+        """
+        Legacy results store that rewrites a single JSON file keyed by sweep timestamp
+
+        Each rewrite goes to a temporary file that replaces the old one, so
+        readers (including other processes) never see a truncated file.
+
+        Args:
+            path (str): JSON file
+            max_entries (int): Number of sweeps to keep
+            fsync (str): fsync policy for each rewrite (see persistence.FSYNC_POLICIES)
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.fsync = fsync
+        self._lock = threading.Lock()
+
+    def _load(self):
+        """
+        Load the whole results file
+
+        Returns:
+            dict: Results keyed by ISO sweep timestamp
+        """
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, 'r') as f:
+            return json.load(f)
+
+    def append(self, results, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+
+        # Appends read, extend and rewrite the whole file, so two at once would lose one
+        with self._lock:
+            all_results = self._load()
+            all_results[datetime.fromtimestamp(timestamp).isoformat()] = results
+
+            # Keep only the newest entries to prevent the file from growing too large
+            if len(all_results) > self.max_entries:
+                timestamps = sorted(all_results.keys())
+                for old_timestamp in timestamps[:-self.max_entries]:
+                    del all_results[old_timestamp]
+
+            write_atomic(self.path, json.dumps(all_results, indent=2), self.fsync)
+
+    def query(self, since=None, until=None, url=None):
+        rows = []
+        for timestamp, results in self._load().items():
+            try:
+                result_time = datetime.fromisoformat(timestamp).timestamp()
+            except ValueError:
+                continue
+            if since is not None and result_time < since:
+                continue
+            if until is not None and result_time > until:
+                continue
+            for result_url, result in results.items():
+                if url is not None and result_url != url:
+                    continue
+                if result is None:
+                    rows.append((result_url, result_time, None, None, None))
+                else:
+                    rows.append((result_url, result_time, result['status_code'], result['response_time'],
+                                 result.get('timings')))
+        rows.sort(key=lambda row: row[1])
+        return rows
+
+
+def create_results_store(backend='sqlite', path=None, retention_hours=168, fsync='file'):
+    """
+    Create a results backend by name
+
+    Args:
+        backend (str): 'sqlite' (default) or 'json' for the legacy single-file format
+        path (str): File to store results in (default depends on the backend)
+        retention_hours (int): How long the sqlite backend keeps samples
+        fsync (str): fsync policy for the json backend's rewrites (sqlite commits through its WAL)
+
+    Returns:
+        ResultsStore: The configured backend
+    """
+    if backend == 'json':
+        return JSONFileResultsStore(path or 'monitoring_results.json', fsync=fsync)
+    if backend != 'sqlite':
+        logging.error(f"Unknown results backend '{backend}', falling back to sqlite")
+    return SQLiteResultsStore(path or 'monitoring_results.db', retention_hours=retention_hours)
@@ -0,0 +1,318 @@
+import math
+
+# Phases of a probe's latency, in the order they happen
+PHASES = ('dns', 'connect', 'tls', 'ttfb', 'transfer')
+
+
+def is_error(status_code):
+    """
+    Decide whether a probe counts as an error
+
+    Args:
+        status_code (int): HTTP status code, or None if the request failed
+
+    Returns:
+        bool: True for failed requests and 4xx/5xx responses
+    """
+    return status_code is None or status_code >= 400
+
+
+class LatencyHistogram:
+    # Bucket boundaries grow by 5% so any percentile is accurate to within 5%
+    GROWTH = 1.05
+    _LOG_GROWTH = math.log(GROWTH)
+
+    def __init__(self, counts=None):
+        """
+        Sparse log-bucketed histogram of response times in milliseconds
+
+        Args:
+            counts (dict): Existing bucket counts keyed by bucket index
+        """
+        self.counts = dict(counts) if counts else {}
+        self.total = sum(self.counts.values())
+
+    def _bucket(self, value):
+        """
+        Get the bucket index for a value
+
+        Args:
+            value (float): Response time in milliseconds
+
+        Returns:
+            int: Bucket index
+        """
+        if value <= 1:
+            return 0
+        return int(math.log(value) / self._LOG_GROWTH) + 1
+
+    def add(self, value, count=1):
+        """
+        Record a value
+
+        Args:
+            value (float): Response time in milliseconds
+            count (int): Number of times to record it
+        """
+        bucket = self._bucket(value)
+        self.counts[bucket] = self.counts.get(bucket, 0) + count
+        self.total += count
+
+    def merge(self, other):
+        """
+        Add another histogram's counts to this one
+
+        Args:
+            other (LatencyHistogram): Histogram to merge in
+        """
+        for bucket, count in other.counts.items():
+            self.counts[bucket] = self.counts.get(bucket, 0) + count
+        self.total += other.total
+
+    def subtract(self, other):
+        """
+        Remove another histogram's counts from this one (the inverse of merge)
+
+        Args:
+            other (LatencyHistogram): Histogram previously merged in
+        """
+        for bucket, count in other.counts.items():
+            remaining = self.counts.get(bucket, 0) - count
+            if remaining > 0:
+                self.counts[bucket] = remaining
+            else:
+                self.counts.pop(bucket, None)
+        self.total -= other.total
+
+    def percentile(self, percent):
+        """
+        Estimate a percentile
+
+        Args:
+            percent (float): Percentile between 0 and 100
+
+        Returns:
+            float: Estimated value in milliseconds, or None if the histogram is empty
+        """
+        if not self.total:
+            return None
+        rank = math.ceil(self.total * percent / 100) or 1
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                if bucket == 0:
+                    return 1.0
+                # Report the bucket's geometric midpoint
+                return round(self.GROWTH ** (bucket - 0.5), 2)
+        return None
+
+    def to_dict(self):
+        """
+        Serialise the histogram
+
+        Returns:
+            dict: Bucket counts keyed by bucket index as strings (JSON friendly)
+        """
+        return {str(bucket): count for bucket, count in self.counts.items()}
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Deserialise a histogram produced by to_dict()
+
+        Args:
+            data (dict): Bucket counts keyed by bucket index
+
+        Returns:
+            LatencyHistogram: The histogram
+        """
+        return cls({int(bucket): count for bucket, count in (data or {}).items()})
+
+
+class RollupBucket:
+    def __init__(self, count=0, errors=0, minimum=None, maximum=None, total=0.0, histogram=None, phases=None):
+        """
+        Aggregate of the samples falling into one rollup time bucket
+
+        Args:
+            count (int): Number of samples
+            errors (int): Number of failed or 4xx/5xx samples
+            minimum (float): Lowest response time
+            maximum (float): Highest response time
+            total (float): Sum of response times
+            histogram (LatencyHistogram): Response time distribution
+            phases (dict): Sum of each latency phase plus 'n', the number of samples with phase timings
+        """
+        self.count = count
+        self.errors = errors
+        self.min = minimum
+        self.max = maximum
+        self.sum = total
+        self.histogram = histogram or LatencyHistogram()
+        self.phases = dict(phases) if phases else {}
+
+    def add(self, status_code, response_time, timings=None):
+        """
+        Fold one sample into the bucket
+
+        Args:
+            status_code (int): HTTP status code, or None if the request failed
+            response_time (float): Response time in milliseconds, or None if the request failed
+            timings (dict): Milliseconds spent in each of PHASES, if recorded
+        """
+        self.count += 1
+        if is_error(status_code):
+            self.errors += 1
+        if response_time is None:
+            return
+        self.min = response_time if self.min is None else min(self.min, response_time)
+        self.max = response_time if self.max is None else max(self.max, response_time)
+        self.sum += response_time
+        self.histogram.add(response_time)
+        if timings:
+            self.phases['n'] = self.phases.get('n', 0) + 1
+            for phase in PHASES:
+                self.phases[phase] = self.phases.get(phase, 0.0) + (timings.get(phase) or 0.0)
+
+    @property
+    def phase_means(self):
+        """
+        Mean milliseconds spent in each latency phase, or None if no sample had timings
+        """
+        timed = self.phases.get('n')
+        if not timed:
+            return None
+        return {phase: round(self.phases.get(phase, 0.0) / timed, 2) for phase in PHASES}
+
+    @property
+    def mean(self):
+        """
+        Mean response time of the samples with a response
+        """
+        if not self.histogram.total:
+            return None
+        return round(self.sum / self.histogram.total, 2)
+
+
+def lttb(xs, ys, threshold):
+    """
+    Pick the points that best preserve a series' shape (Largest-Triangle-Three-Buckets)
+
+    Args:
+        xs (list): X values in ascending order
+        ys (list): Y values
+        threshold (int): Maximum number of points to keep
+
+    Returns:
+        list: Indexes of the points to keep, in ascending order
+    """
+    length = len(xs)
+    if threshold >= length:
+        return list(range(length))
+    if threshold < 3:
+        return [0, length - 1][:max(threshold, 0)]
+
+    selected = [0]
+    bucket_size = (length - 2) / (threshold - 2)
+    previous = 0
+    for bucket in range(threshold - 2):
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+
+        # Average of the next bucket is the third vertex of the triangle
+        next_start = end
+        next_end = min(int((bucket + 2) * bucket_size) + 1, length)
+        span = next_end - next_start
+        avg_x = sum(xs[next_start:next_end]) / span
+        avg_y = sum(ys[next_start:next_end]) / span
+
+        best_index = start
+        best_area = -1
+        for index in range(start, end):
+            area = abs((xs[previous] - avg_x) * (ys[index] - ys[previous]) -
+                       (xs[previous] - xs[index]) * (avg_y - ys[previous]))
+            if area > best_area:
+                best_area = area
+                best_index = index
+        selected.append(best_index)
+        previous = best_index
+    selected.append(length - 1)
+    return selected
+
+
+class LatencyAnomalyDetector:
+    def __init__(self, alpha=0.1, warmup=20, slack=0.5, threshold=8.0, clip=4.0):
+        """
+        Online detector of sustained response time increases for one URL
+
+        Keeps an exponentially weighted mean and variance of the response time
+        and runs a one-sided CUSUM over each sample's clipped z-score, so a
+        single spike cannot raise an alarm but a few slow samples in a row
+        do. State is a handful of floats and each update is O(1).
+
+        Args:
+            alpha (float): Weight of each new sample in the moving mean and variance
+            warmup (int): Samples learned before any alarm can be raised
+            slack (float): Deviation in standard deviations tolerated per sample
+            threshold (float): Accumulated deviation that raises an alarm
+            clip (float): Largest z-score a single sample can contribute
+        """
+        self.alpha = alpha
+        self.warmup = warmup
+        self.slack = slack
+        self.threshold = threshold
+        self.clip = clip
+        self.mean = None
+        self.variance = 0.0
+        self.count = 0
+        self.cusum = 0.0
+        self.degraded = False
+
+    @property
+    def deviation(self):
+        """
+        Standard deviation used to score samples, floored at 5% of the mean (and 1 ms)
+        so a very steady baseline does not turn tiny jitter into alarms
+        """
+        return max(math.sqrt(self.variance), (self.mean or 0.0) * 0.05, 1.0)
+
+    def _learn(self, value):
+        if self.mean is None:
+            self.mean = value
+            return
+        difference = value - self.mean
+        increment = self.alpha * difference
+        self.mean += increment
+        self.variance = (1 - self.alpha) * (self.variance + difference * increment)
+
+    def update(self, value):
+        """
+        Feed one response time
+
+        Args:
+            value (float): Response time in milliseconds
+
+        Returns:
+            str: 'degraded' when an alarm is raised, 'recovered' when it clears, otherwise None
+        """
+        if self.count < self.warmup:
+            self.count += 1
+            self._learn(value)
+            return None
+
+        score = min((value - self.mean) / self.deviation, self.clip)
+        # Capped so a long alarm can still clear after a run of normal samples
+        self.cusum = min(max(0.0, self.cusum + score - self.slack), self.threshold * 1.5)
+
+        event = None
+        if not self.degraded and self.cusum > self.threshold:
+            self.degraded = True
+            event = 'degraded'
+        elif self.degraded and self.cusum == 0.0:
+            self.degraded = False
+            event = 'recovered'
+        # Stop learning during an alarm so the regression does not become the baseline
+        if not self.degraded:
+            self._learn(value)
+        return event
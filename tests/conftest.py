@@ -0,0 +1,35 @@
+import os
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# The bot writes its config, log and results to the working directory
+os.chdir(tempfile.mkdtemp(prefix='ping-bot-tests-'))
+os.environ['MONITOR_MODE'] = 'embedded'
+
+
+class OKHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server_port():
+    """Port of a local HTTP server on 127.0.0.1 that answers every GET with 200 "ok" """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), OKHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server.server_address[1]
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,43 @@
+import io
+import json
+
+import pytest
+
+from backfill import iter_object_items
+
+DOCUMENT = {
+    '2024-01-01T00:00:00': {
+        'https://example.com/': {'status_code': 200, 'response_time': 123.456},
+        'https://example.org/a?b=c': None
+    },
+    '2024-01-01T00:01:00': {'https://example.com/': {'status_code': 503, 'response_time': 1e3}},
+    'escaped "key" \\ é': [1, 22, 333, -4.5e-6, True, False, None],
+    'number': 1234567890,
+    'literal': False,
+    'empty': {}
+}
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 7, 64, 1 << 20])
+@pytest.mark.parametrize('indent', [None, 2])
+def test_values_split_across_chunks(chunk_size, indent):
+    text = json.dumps(DOCUMENT, indent=indent)
+    assert list(iter_object_items(io.StringIO(text), chunk_size)) == list(DOCUMENT.items())
+
+
+@pytest.mark.parametrize('chunk_size', [1, 4, 1 << 20])
+def test_number_at_the_end_of_a_chunk_is_not_cut_short(chunk_size):
+    # Each chunk boundary falls inside or right after a number
+    text = '{"a":12345678,"b":1.5e10}'
+    assert list(iter_object_items(io.StringIO(text), chunk_size)) == [('a', 12345678), ('b', 1.5e10)]
+
+
+@pytest.mark.parametrize('text', ['{}', ' \n{ }\n'])
+def test_empty_object(text):
+    assert list(iter_object_items(io.StringIO(text), 1)) == []
+
+
+@pytest.mark.parametrize('text', ['[1, 2]', '{"a": 1', '{"a" 1}', '{"a": 1,}', '{1: 2}', '{"a": [1, 2}'])
+def test_malformed_documents_raise(text):
+    with pytest.raises(ValueError):
+        list(iter_object_items(io.StringIO(text), 2))
@@ -0,0 +1,121 @@
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from checks import Check, KeywordMatcher, RegexMatcher
+from transport import ProbeTransport
+
+TRICKLE_DELAY = 0.1
+
+
+class BodyHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        if self.path == '/split':
+            # Two writes with a pause between them, so the body arrives as two chunks
+            parts = [b'status: all sys', b'tems go, id=4217']
+        elif self.path == '/trickle':
+            parts = [b'x'] * 50
+        else:
+            parts = [b'hello world']
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; charset=utf-8')
+        self.send_header('Content-Length', str(sum(len(part) for part in parts)))
+        self.end_headers()
+        try:
+            for part in parts:
+                self.wfile.write(part)
+                self.wfile.flush()
+                time.sleep(TRICKLE_DELAY)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def base_url():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), BodyHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def transport():
+    transport = ProbeTransport(timeout=5)
+    yield transport
+    transport.close()
+
+
+def feed_split(matcher, text, at):
+    matcher.feed(text[:at])
+    if not matcher.done:
+        matcher.feed(text[at:])
+
+
+@pytest.mark.parametrize('at', range(1, len('the keyword here')))
+def test_keyword_straddling_chunks(at):
+    matcher = KeywordMatcher('keyword')
+    feed_split(matcher, 'the keyword here', at)
+    assert matcher.finish(truncated=False) is None
+    negated = KeywordMatcher('keyword', negate=True)
+    feed_split(negated, 'the keyword here', at)
+    assert negated.finish(truncated=False) == "body contains 'keyword'"
+
+
+def test_keyword_missing():
+    matcher = KeywordMatcher('keyword')
+    feed_split(matcher, 'the key word here', 7)
+    assert matcher.finish(truncated=True) == "'keyword' not found in the bytes read"
+    assert KeywordMatcher('keyword', negate=True).finish(truncated=False) is None
+
+
+@pytest.mark.parametrize('at', range(1, len('token=abc123;')))
+def test_regex_straddling_chunks(at):
+    matcher = RegexMatcher(re.compile(r'token=(\w+);'), 'token')
+    feed_split(matcher, 'token=abc123;', at)
+    assert matcher.finish(truncated=False) is None
+    assert matcher.captured() == 'abc123'
+
+
+def test_check_matches_across_network_chunks(base_url, transport):
+    check = Check({
+        'expect': {'contains': 'all systems go', 'regex': r'systems?\s+go'},
+        'capture': {'id': {'regex': r'id=(\d+)'}}
+    })
+    result = check.run(transport, f'{base_url}/split')
+    assert result['status_code'] == 200, result.get('check_error')
+    assert result['bytes'] == len(b'status: all systems go, id=4217')
+
+
+def test_body_beyond_max_bytes_is_not_read(base_url, transport):
+    result = Check({'max_bytes': 5, 'expect': {'contains': 'world'}}).run(transport, f'{base_url}/plain')
+    assert result['status_code'] is None
+    assert result['check_error'] == "'world' not found in the bytes read"
+    assert result['bytes'] == 5
+    assert Check({'max_bytes': 5, 'expect': {'contains': 'hell'}}).run(transport, f'{base_url}/plain')['status_code'] == 200
+
+
+def test_trickled_body_stops_at_the_deadline(base_url, transport):
+    started = time.monotonic()
+    result = Check({'timeout': 0.5, 'expect': {'contains': 'never'}}).run(transport, f'{base_url}/trickle')
+    assert result['check_error'] == 'timed out reading the body'
+    assert 0 < result['bytes'] < 50
+    assert time.monotonic() - started < 2
+
+
+def test_step_without_body_assertions_reads_no_body(base_url, transport):
+    started = time.monotonic()
+    # The trickled body takes 5 s to send; only the status is checked
+    result = Check({'expect': {'status': 200}}).run(transport, f'{base_url}/trickle')
+    assert result['status_code'] == 200
+    assert result['bytes'] == 0
+    assert time.monotonic() - started < 1
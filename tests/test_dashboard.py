@@ -0,0 +1,145 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import config
+import dashboard
+import metrics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+OLD_URL = 'http://127.0.0.1:9/old'
+NEW_URL = 'http://127.0.0.1:9/new'
+
+
+@pytest.fixture
+def client():
+    with open(config.CONFIG_FILE, 'w') as f:
+        json.dump({'urls': [{'url': OLD_URL, 'interval': 60, 'enabled': True}], 'enabled': False}, f)
+    with config.config_cache_lock:
+        config.config_cache.update({'config': None, 'mtime': None, 'checked': 0})
+    yield dashboard.app.test_client()
+    dashboard.stop_bot()
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_starting_the_bot_uses_the_edited_config(client):
+    # The bot is started from inside edit_config(), before the edit is saved
+    response = client.post('/update_config', data={
+        'enabled': 'on', 'url_count': 1, 'url_0': NEW_URL, 'interval_0': 60, 'enabled_0': 'on'
+    })
+    assert response.status_code == 302
+    assert wait_for(lambda: dashboard.multi_bot.bots)
+    assert list(dashboard.multi_bot.bots) == [NEW_URL]
+    assert [url_config['url'] for url_config in config.load_config()['urls']] == [NEW_URL]
+
+
+def test_spawned_workers_do_not_build_a_monitor(tmp_path):
+    # What a spawned probe worker does when `python dashboard.py` started it
+    code = ("import runpy, sys; namespace = runpy.run_path(sys.argv[1], run_name='__mp_main__'); "
+            "print(namespace['multi_bot'], namespace['scheduler'])")
+    # Spawned children get the parent's sys.path, so the bot modules import from the repo
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    output = subprocess.run([sys.executable, '-c', code, os.path.join(ROOT, 'dashboard.py')], cwd=tmp_path,
+                            env=env, capture_output=True, text=True, timeout=60, check=True).stdout
+    assert output.split() == ['None', 'None']
+    assert not (tmp_path / 'monitoring_results.db').exists()
+
+
+MONITOR_EXPOSITION = '''# HELP ping_bot_probes_total Probes recorded, by target and outcome (ok, error or failed)
+# TYPE ping_bot_probes_total counter
+ping_bot_probes_total{url="http://a.test/",outcome="ok"} 42
+# HELP ping_bot_http_request_duration_seconds Dashboard request handling time by route
+# TYPE ping_bot_http_request_duration_seconds histogram
+'''
+
+
+@pytest.fixture
+def monitor_metrics_url():
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = MONITOR_EXPOSITION.encode()
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_address[1]}/metrics'
+    server.shutdown()
+    server.server_close()
+
+
+def test_external_mode_serves_the_monitors_metrics(monkeypatch, monitor_metrics_url):
+    monkeypatch.setattr(dashboard, 'MONITOR_MODE', 'external')
+    monkeypatch.setattr(dashboard, 'MONITOR_METRICS_URL', monitor_metrics_url)
+    monkeypatch.setattr(dashboard, 'monitor_running', lambda: True)
+    metrics.PROBES.inc(url='http://a.test/', outcome='ok')
+    try:
+        body = dashboard.app.test_client().get('/metrics').get_data(as_text=True)
+    finally:
+        metrics.PROBES.remove(url='http://a.test/', outcome='ok')
+    assert 'ping_bot_probes_total{url="http://a.test/",outcome="ok"} 42' in body
+    # This worker's own probe counters are not served; its request timings are, once
+    assert body.count('# HELP ping_bot_probes_total') == 1
+    assert body.count('# HELP ping_bot_http_request_duration_seconds') == 1
+    assert 'ping_bot_running 1' in body
+
+
+def test_event_streams_beyond_the_limit_get_a_503(monkeypatch):
+    monkeypatch.setattr(dashboard, 'stream_slots', threading.BoundedSemaphore(1))
+    client = dashboard.app.test_client()
+    first = client.get('/api/stream')
+    assert first.status_code == 200
+    assert client.get('/api/stream').status_code == 503
+    # Closing a stream frees its slot
+    first.close()
+    second = client.get('/api/stream')
+    assert second.status_code == 200
+    second.close()
+
+
+@pytest.mark.parametrize('query', ['hours=abc', 'hours=0', 'hours=-1', 'hours=inf', 'hours=nan', 'max_points=ten'])
+def test_results_reject_bad_arguments(query):
+    response = dashboard.app.test_client().get(f'/api/results?{query}')
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+def test_results_default_arguments():
+    assert dashboard.app.test_client().get('/api/results?hours=1.5').status_code == 200
+    assert dashboard.app.test_client().get('/api/results').status_code == 200
+
+
+def test_failed_save_leaves_the_config_and_the_bot_alone(client, monkeypatch):
+    def disk_full(*args, **kwargs):
+        raise OSError(28, 'No space left on device')
+
+    monkeypatch.setattr(config, 'write_atomic', disk_full)
+    response = client.post('/update_config', data={
+        'enabled': 'on', 'url_count': 1, 'url_0': NEW_URL, 'interval_0': 60, 'enabled_0': 'on'
+    })
+    assert response.status_code == 500
+    assert not dashboard.bot_running
+    assert [url_config['url'] for url_config in config.load_config()['urls']] == [OLD_URL]
+    monkeypatch.undo()
+    # The next save still goes through
+    client.post('/update_config', data={'url_count': 1, 'url_0': NEW_URL, 'interval_0': 60})
+    assert [url_config['url'] for url_config in config.load_config()['urls']] == [NEW_URL]
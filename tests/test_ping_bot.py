@@ -0,0 +1,153 @@
+import threading
+import time
+
+import pytest
+
+import metrics
+from ping_bot import MultiURLPingBot, ProbeScheduler, SampleHistory
+from results_store import JSONFileResultsStore, SQLiteResultsStore
+
+
+class FakeBot:
+    def __init__(self, url, delay, tracker=None):
+        self.url = url
+        self.delay = delay
+        self.tracker = tracker
+
+    def check_status(self):
+        if self.tracker:
+            self.tracker.enter(self.url)
+        try:
+            time.sleep(self.delay)
+            return {'status_code': 200, 'response_time': self.delay * 1000}
+        finally:
+            if self.tracker:
+                self.tracker.leave(self.url)
+
+
+class ConcurrencyTracker:
+    def __init__(self):
+        self.running = {}
+        self.peak = {}
+        self._lock = threading.Lock()
+
+    def enter(self, url):
+        host = url.split('/')[2]
+        with self._lock:
+            self.running[host] = self.running.get(host, 0) + 1
+            self.peak[host] = max(self.peak.get(host, 0), self.running[host])
+
+    def leave(self, url):
+        with self._lock:
+            self.running[url.split('/')[2]] -= 1
+
+
+@pytest.fixture
+def multi_bot(tmp_path):
+    bot = MultiURLPingBot(max_workers=4, per_host_limit=1, results_store=SQLiteResultsStore(str(tmp_path / 'r.db')))
+    yield bot
+    bot.shutdown()
+
+
+def test_busy_host_does_not_hold_up_other_hosts(multi_bot):
+    tracker = ConcurrencyTracker()
+    slow = [multi_bot.submit_probe(FakeBot(f'http://slow.test/{i}', 0.2, tracker)) for i in range(6)]
+    started = time.monotonic()
+    fast = multi_bot.submit_probe(FakeBot('http://fast.test/', 0.01, tracker))
+    assert fast.result(timeout=5)['status_code'] == 200
+    assert time.monotonic() - started < 0.15
+    assert all(future.result(timeout=5)['status_code'] == 200 for future in slow)
+    assert tracker.peak['slow.test'] == 1
+    # Every slot was handed back
+    assert not multi_bot._host_active and not multi_bot._host_pending
+
+
+def test_failed_probe_frees_its_host_slot(multi_bot):
+    class BrokenBot(FakeBot):
+        def check_status(self):
+            raise RuntimeError('boom')
+
+    broken = multi_bot.submit_probe(BrokenBot('http://broken.test/a', 0))
+    after = multi_bot.submit_probe(FakeBot('http://broken.test/b', 0))
+    with pytest.raises(RuntimeError):
+        broken.result(timeout=5)
+    assert after.result(timeout=5)['status_code'] == 200
+
+
+def test_slow_target_does_not_stall_the_schedule(tmp_path):
+    multi_bot = MultiURLPingBot(max_workers=4, per_host_limit=4,
+                                results_store=SQLiteResultsStore(str(tmp_path / 'r.db')))
+    scheduler = ProbeScheduler(multi_bot, startup_spread=0)
+    scheduler.apply([{'url': 'http://slow.test/', 'interval': 60}, {'url': 'http://fast.test/', 'interval': 0.1}])
+    probes = []
+
+    def fake_check(url, delay):
+        def check_status():
+            probes.append((url, time.monotonic()))
+            time.sleep(delay)
+            return {'status_code': 200, 'response_time': delay * 1000}
+        return check_status
+
+    multi_bot.bots['http://slow.test/'].check_status = fake_check('slow', 1.0)
+    multi_bot.bots['http://fast.test/'].check_status = fake_check('fast', 0.01)
+    thread = threading.Thread(target=scheduler.run, daemon=True)
+    thread.start()
+    time.sleep(0.8)
+    scheduler.stop()
+    thread.join(timeout=5)
+    multi_bot.shutdown()
+
+    assert [url for url, _ in probes].count('slow') == 1
+    # About one fast probe per 0.1 s while the slow one is still in flight
+    assert [url for url, _ in probes].count('fast') >= 5
+    assert multi_bot.cache.latest('http://fast.test/') is not None
+
+
+def sample(number):
+    """Sample number n; every third one is a failed probe, and two share each timestamp"""
+    timestamp = 1000.0 + number // 2
+    if number % 3 == 0:
+        return timestamp, None, None, None
+    timings = {'dns': 0.5, 'connect': 1.25, 'tls': None, 'ttfb': number + 0.01, 'transfer': 0.0}
+    return timestamp, 200 + number, number * 10.5, timings
+
+
+@pytest.mark.parametrize('count', [0, 1, 4, 5, 6, 9, 10, 23])
+def test_sample_history_keeps_the_newest_samples_in_order(count):
+    history = SampleHistory(5)
+    evicted = [history.append(*sample(number)) for number in range(count)]
+    assert evicted == [None] * min(count, 5) + [sample(number)[0] for number in range(count - 5)]
+    assert len(history) == min(count, 5)
+    kept = [sample(number) for number in range(max(count - 5, 0), count)]
+    assert history.rows_since(float('-inf')) == kept
+    assert history.latest() == (kept[-1] if kept else None)
+    # Every cut-off, including ones between, on and beyond the stored timestamps
+    for since in [999, 1000, 1000.5] + [1000 + tenth / 10 for tenth in range(0, 130, 5)]:
+        assert history.rows_since(since) == [row for row in kept if row[0] >= since]
+
+
+def test_sample_history_latest_of_a_shared_timestamp():
+    history = SampleHistory(3)
+    for number in range(1, 8):
+        history.append(*sample(number))
+    # 6 and 7 share a timestamp; latest() is the newer of the two
+    assert history.latest() == sample(7)
+
+
+def test_follows_results_another_process_stores(tmp_path):
+    path = str(tmp_path / 'r.db')
+    follower = MultiURLPingBot(results_store=SQLiteResultsStore(path))
+    assert follower.can_follow_results_store()
+    writer = SQLiteResultsStore(path)
+    writer.append({'http://a.test/': {'status_code': 200, 'response_time': 12.5}, 'http://b.test/': None})
+    assert follower.follow_results_store() == 2
+    assert follower.cache.latest('http://a.test/')[1:3] == (200, 12.5)
+    assert follower.follow_results_store() == 0
+    # Counted by the process that probed them, not again by every follower
+    assert ('http://a.test/', 'ok') not in metrics.PROBES._values
+
+
+def test_json_backend_cannot_be_followed(tmp_path):
+    follower = MultiURLPingBot(results_store=JSONFileResultsStore(str(tmp_path / 'r.json')))
+    assert not follower.can_follow_results_store()
+    assert follower.follow_results_store() is None
@@ -0,0 +1,31 @@
+import socket
+
+from transport import DNSCache, ProbeTransport
+
+real_getaddrinfo = socket.getaddrinfo
+
+
+def fake_resolver(addresses):
+    def getaddrinfo(host, port, family=0, type=0, proto=0, flags=0):
+        if host != 'multi.test':
+            return real_getaddrinfo(host, port, family, type, proto, flags)
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, '', (address, port)) for address in addresses]
+    return getaddrinfo
+
+
+def test_cache_keeps_every_address(monkeypatch):
+    monkeypatch.setattr(socket, 'getaddrinfo', fake_resolver(['10.0.0.1', '10.0.0.2', '10.0.0.1']))
+    cache = DNSCache(ttl=60)
+    assert cache.resolve('multi.test', 80) == ['10.0.0.1', '10.0.0.2']
+    cache.forget('multi.test', 80)
+    assert cache._entries == {}
+
+
+def test_unreachable_first_address_falls_through_to_the_next(monkeypatch, server_port):
+    # The server only listens on 127.0.0.1, so 127.0.0.2 refuses the connection
+    monkeypatch.setattr(socket, 'getaddrinfo', fake_resolver(['127.0.0.2', '127.0.0.1']))
+    transport = ProbeTransport(timeout=5)
+    response = transport.get(f'http://multi.test:{server_port}/')
+    assert response.status_code == 200
+    assert response.content == b'ok'
+    transport.close()
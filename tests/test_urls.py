@@ -0,0 +1,90 @@
+import pytest
+
+from urls import apply_batch
+
+A = 'https://a.example/'
+B = 'https://b.example/'
+C = 'https://c.example/'
+
+
+@pytest.fixture
+def url_configs():
+    return [
+        {'url': A, 'interval': 60, 'enabled': True, 'probe_mode': 'head'},
+        {'url': B, 'interval': 300, 'enabled': False}
+    ]
+
+
+def numbered(*records):
+    return list(enumerate(records, 1))
+
+
+def test_merge_updates_sent_fields_and_adds_new_urls(url_configs):
+    new_configs, summary, errors = apply_batch(url_configs, numbered(
+        {'url': A, 'interval': '30'},
+        {'url': C, 'enabled': 'false'},
+        {'url': B, 'interval': 300}
+    ))
+    assert errors == []
+    assert new_configs == [
+        {'url': A, 'interval': 30, 'enabled': True, 'probe_mode': 'head'},
+        {'url': B, 'interval': 300, 'enabled': False},
+        {'url': C, 'interval': 120, 'enabled': False}
+    ]
+    assert summary == {'added': 1, 'updated': 1, 'removed': 0, 'unchanged': 1}
+
+
+def test_replace_makes_the_batch_the_whole_list(url_configs):
+    new_configs, summary, errors = apply_batch(url_configs, numbered(
+        {'url': C},
+        {'url': A, 'interval': 60}
+    ), mode='replace')
+    assert errors == []
+    # A starts over from the record, so its probe_mode is dropped
+    assert new_configs == [
+        {'url': A, 'interval': 60, 'enabled': True},
+        {'url': C, 'interval': 120, 'enabled': True}
+    ]
+    assert summary == {'added': 1, 'updated': 1, 'removed': 1, 'unchanged': 0}
+
+
+def test_patch_applies_each_op(url_configs):
+    new_configs, summary, errors = apply_batch(url_configs, numbered(
+        {'op': 'remove', 'url': B},
+        {'op': 'update', 'url': A, 'enabled': 'off'},
+        {'op': 'add', 'url': C, 'interval': 10}
+    ), mode='patch')
+    assert errors == []
+    assert new_configs == [
+        {'url': A, 'interval': 60, 'enabled': False, 'probe_mode': 'head'},
+        {'url': C, 'interval': 10, 'enabled': True}
+    ]
+    assert summary == {'added': 1, 'updated': 1, 'removed': 1, 'unchanged': 0}
+
+
+def test_op_is_ignored_outside_patch_mode(url_configs):
+    new_configs, summary, errors = apply_batch(url_configs, numbered({'op': 'remove', 'url': B}))
+    assert errors == []
+    assert new_configs == url_configs
+    assert summary['removed'] == 0
+
+
+@pytest.mark.parametrize('mode, record, error', [
+    ('patch', {'op': 'add', 'url': A}, f'{A} already exists'),
+    ('patch', {'op': 'update', 'url': C}, f'{C} not found'),
+    ('patch', {'op': 'remove', 'url': C}, f'{C} not found'),
+    ('patch', {'op': 'delete', 'url': A}, 'op must be one of: upsert, add, update, remove'),
+    ('merge', {'url': ''}, 'URL cannot be empty'),
+    ('replace', {'url': C, 'interval': 0}, 'interval must be at least 1 second'),
+])
+def test_an_invalid_record_rejects_the_whole_batch(url_configs, mode, record, error):
+    original = [dict(url_config) for url_config in url_configs]
+    new_configs, summary, errors = apply_batch(url_configs, numbered({'url': B, 'interval': 5}, record), mode=mode)
+    assert (new_configs, summary) == (None, None)
+    assert errors == [{'line': 2, 'error': error}]
+    assert url_configs == original
+
+
+def test_a_url_sent_twice_is_an_error(url_configs):
+    _, _, errors = apply_batch(url_configs, numbered({'url': C}, {'url': C, 'interval': 5}))
+    assert errors == [{'line': 2, 'error': f'{C} appears more than once in the batch'}]
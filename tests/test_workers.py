@@ -0,0 +1,73 @@
+import logging
+import queue
+import threading
+import time
+
+from results_store import SQLiteResultsStore
+from ping_bot import MultiURLPingBot
+from workers import QueueResultsStore, ShardedMonitor, WorkerPingBot
+
+
+def wait_for(condition, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_worker_only_forwards_its_results():
+    result_queue = queue.Queue()
+    multi_bot = WorkerPingBot(results_store=QueueResultsStore(result_queue), cache_capacity=1)
+    results = {'http://a.test/': {'status_code': 200, 'response_time': 5.0}}
+    multi_bot.save_results(results, 100.0)
+    assert result_queue.get_nowait() == (results, 100.0)
+    # Recording, metrics and latency detection are left to the parent
+    assert multi_bot.cache.latest('http://a.test/') is None
+    multi_bot.shutdown()
+
+
+def test_sharded_monitor_records_worker_results(tmp_path, server_port, caplog):
+    caplog.set_level(logging.INFO)
+    multi_bot = MultiURLPingBot(results_store=SQLiteResultsStore(str(tmp_path / 'r.db')))
+    monitor = ShardedMonitor(multi_bot, 2)
+    urls = [f'http://127.0.0.1:{server_port}/{i}' for i in range(4)]
+    # First probes are spread over the interval, so keep it short
+    monitor.apply([{'url': url, 'interval': 1} for url in urls])
+    thread = threading.Thread(target=monitor.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline and not all(multi_bot.cache.latest(url) for url in urls):
+        time.sleep(0.05)
+    monitor.stop()
+    thread.join(timeout=15)
+    multi_bot.shutdown()
+
+    assert all(multi_bot.cache.latest(url)[1] == 200 for url in urls)
+    # Workers log through this process
+    assert sum('Probe worker' in record.getMessage() for record in caplog.records) == 2
+
+
+def test_dead_worker_is_restarted_while_others_keep_reporting(tmp_path, server_port):
+    multi_bot = MultiURLPingBot(results_store=SQLiteResultsStore(str(tmp_path / 'r.db')))
+    monitor = ShardedMonitor(multi_bot, 2)
+    urls = [f'http://127.0.0.1:{server_port}/{i}' for i in range(40)]
+    crashed = [url for url in urls if monitor.ring.node_for(url) == 0][0]
+    # Worker 1 alone sends results several times a second, so the result queue never sits idle
+    monitor.apply([{'url': url, 'interval': 1} for url in urls if url == crashed or monitor.ring.node_for(url) == 1])
+    thread = threading.Thread(target=monitor.run, daemon=True)
+    thread.start()
+    try:
+        assert wait_for(lambda: multi_bot.cache.latest(crashed) is not None)
+        killed = monitor._processes[0]
+        killed.kill()
+        killed.join(timeout=5)
+        last_result = multi_bot.cache.latest(crashed)[0]
+        assert wait_for(lambda: multi_bot.cache.latest(crashed)[0] > last_result)
+        assert monitor._processes[0] is not killed
+    finally:
+        monitor.stop()
+        thread.join(timeout=15)
+        multi_bot.shutdown()
+
@@ -0,0 +1,282 @@
+import logging
+import socket
+import threading
+import time
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError
+from urllib3.util.connection import allowed_gai_family
+
+from stats import PHASES
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+class ProbeTimings:
+    def __init__(self):
+        """
+        Per-phase durations of one probe, in seconds
+        """
+        for phase in PHASES:
+            setattr(self, phase, 0.0)
+
+    def as_dict(self):
+        """
+        Get the durations in milliseconds
+
+        Returns:
+            dict: Milliseconds spent in each phase
+        """
+        return {phase: round(getattr(self, phase) * 1000, 2) for phase in PHASES}
+
+
+class DNSCache:
+    def __init__(self, ttl=60):
+        """
+        Thread-safe cache of resolved host addresses
+
+        Args:
+            ttl (int): Seconds a lookup is reused before resolving again (0 disables caching)
+        """
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, host, port):
+        """
+        Resolve a host to its addresses, reusing a recent lookup if there is one
+
+        Only address families urllib3 would use are returned (no IPv6 on
+        hosts without it), in the order getaddrinfo() prefers them.
+
+        Args:
+            host (str): Host name
+            port (int): Port the connection will use
+
+        Returns:
+            list: IP addresses to try, in order
+        """
+        now = time.monotonic()
+        if self.ttl:
+            with self._lock:
+                entry = self._entries.get((host, port))
+            if entry is not None and entry[0] > now:
+                return entry[1]
+
+        # Resolve outside the lock so one slow lookup does not stall other hosts
+        addresses = []
+        for info in socket.getaddrinfo(host, port, allowed_gai_family(), socket.SOCK_STREAM):
+            if info[4][0] not in addresses:
+                addresses.append(info[4][0])
+        if self.ttl:
+            with self._lock:
+                self._entries[(host, port)] = (now + self.ttl, addresses)
+        return addresses
+
+    def forget(self, host, port):
+        """
+        Drop a cached lookup, so the next connection resolves the host again
+        """
+        with self._lock:
+            self._entries.pop((host, port), None)
+
+
+class _CachedDNSMixin:
+    """
+    Connection mixin that connects to a cached address instead of resolving on
+    every connect, and records DNS, TCP connect and TLS handshake durations
+    into the calling thread's ProbeTimings
+    """
+    dns_cache = None
+    timings_local = None
+
+    def _timings(self):
+        return getattr(self.timings_local, 'current', None) if self.timings_local is not None else None
+
+    def _new_conn(self):
+        timings = self._timings()
+        # urllib3 connects to _dns_host while TLS SNI and certificate checks use
+        # the host read back after _new_conn returns, so swap it only for the connect
+        original_host = self._dns_host
+        started = time.perf_counter()
+        try:
+            addresses = self.dns_cache.resolve(original_host, self.port)
+        except OSError:
+            # Let urllib3 resolve again so the failure surfaces as its usual error
+            return super()._new_conn()
+        resolved = time.perf_counter()
+        try:
+            # Like urllib3, fall through the addresses until one accepts the connection
+            for index, address in enumerate(addresses):
+                self._dns_host = address
+                try:
+                    return super()._new_conn()
+                except ConnectTimeoutError:
+                    if index == len(addresses) - 1:
+                        # Every cached address failed; the host may have moved
+                        self.dns_cache.forget(original_host, self.port)
+                        raise
+            return super()._new_conn()
+        finally:
+            self._dns_host = original_host
+            if timings is not None:
+                timings.dns += resolved - started
+                timings.connect += time.perf_counter() - resolved
+
+    def connect(self):
+        timings = self._timings()
+        if timings is None or not isinstance(self, HTTPSConnection):
+            return super().connect()
+        # Whatever connect() spends beyond DNS and TCP connect is the TLS handshake
+        before = timings.dns + timings.connect
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            timings.tls += time.perf_counter() - started - (timings.dns + timings.connect - before)
+
+
+class _ProbeAdapter(HTTPAdapter):
+    def __init__(self, dns_cache, timings_local, **kwargs):
+        """
+        HTTP adapter whose connection pools share a DNS cache and record phase timings
+
+        Args:
+            dns_cache (DNSCache): Cache used for every new connection
+            timings_local (threading.local): Holds the ProbeTimings of the probe running on each thread
+            **kwargs: Pool sizing options passed to HTTPAdapter
+        """
+        self.dns_cache = dns_cache
+        self.timings_local = timings_local
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        attributes = {'dns_cache': self.dns_cache, 'timings_local': self.timings_local}
+        connection_classes = {
+            'http': type('CachedDNSHTTPConnection', (_CachedDNSMixin, HTTPConnection), attributes),
+            'https': type('CachedDNSHTTPSConnection', (_CachedDNSMixin, HTTPSConnection), attributes),
+        }
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': type('CachedDNSHTTPConnectionPool', (HTTPConnectionPool,), {'ConnectionCls': connection_classes['http']}),
+            'https': type('CachedDNSHTTPSConnectionPool', (HTTPSConnectionPool,), {'ConnectionCls': connection_classes['https']}),
+        }
+
+
+class ProbeTransport:
+    def __init__(self, max_hosts=1000, per_host_connections=4, idle_timeout=300, dns_ttl=60, timeout=30):
+        """
+        Shared HTTP transport for every monitored URL
+
+        All probes go through one requests.Session, so probes to the same
+        host reuse kept-alive connections (and skip DNS, TCP and TLS setup)
+        instead of every URL owning a private pool.
+
+        Args:
+            max_hosts (int): Number of per-host connection pools kept open
+            per_host_connections (int): Connections kept alive per host
+            idle_timeout (int): Seconds after which an unused host's connections are closed
+            dns_ttl (int): Seconds DNS lookups are cached for (0 disables caching)
+            timeout (float): Request timeout in seconds
+        """
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.dns_cache = DNSCache(dns_ttl)
+        self._timings_local = threading.local()
+        self.adapter = _ProbeAdapter(self.dns_cache, self._timings_local,
+                                     pool_connections=max_hosts, pool_maxsize=per_host_connections)
+        self.session = requests.Session()
+        # Probes never share cookies; a check flow keeps its own for the length of one run
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+        self._last_used = {}
+        self._last_eviction = time.monotonic()
+        self._lock = threading.Lock()
+
+    def request(self, method, url, **kwargs):
+        """
+        Send a request over the shared session
+
+        The response is returned as soon as its headers arrive (the body is
+        left for the caller to read) with a ``timings`` attribute holding the
+        ProbeTimings for DNS, connect, TLS and time-to-first-byte, measured
+        on the monotonic clock. New connections fill in the first three;
+        reused keep-alive connections leave them at zero.
+
+        Args:
+            method (str): HTTP method
+            url (str): URL to request
+            **kwargs: Extra arguments for requests.Session.request
+
+        Returns:
+            requests.Response: The response
+        """
+        parts = urlsplit(url)
+        port = parts.port or DEFAULT_PORTS.get(parts.scheme)
+        with self._lock:
+            self._last_used[(parts.scheme, parts.hostname, port)] = time.monotonic()
+        kwargs.setdefault('timeout', self.timeout)
+        kwargs.setdefault('stream', True)
+
+        timings = ProbeTimings()
+        self._timings_local.current = timings
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, url, **kwargs)
+        finally:
+            self._timings_local.current = None
+        timings.ttfb = max(time.perf_counter() - started - timings.dns - timings.connect - timings.tls, 0.0)
+        response.timings = timings
+        return response
+
+    def get(self, url, **kwargs):
+        """
+        Send a GET request over the shared session
+
+        Args:
+            url (str): URL to request
+            **kwargs: Extra arguments for requests.Session.request
+
+        Returns:
+            requests.Response: The response
+        """
+        return self.request('GET', url, **kwargs)
+
+    def evict_idle(self):
+        """
+        Close connection pools for hosts that have not been probed within idle_timeout
+
+        Cheap to call often; the pools are only scanned once per idle_timeout/4.
+        """
+        now = time.monotonic()
+        if now - self._last_eviction < self.idle_timeout / 4:
+            return
+        self._last_eviction = now
+
+        with self._lock:
+            idle = {key for key, last_used in self._last_used.items() if now - last_used > self.idle_timeout}
+            for key in idle:
+                del self._last_used[key]
+        if not idle:
+            return
+
+        pools = self.adapter.poolmanager.pools
+        for pool_key in list(pools.keys()):
+            if (pool_key.key_scheme, pool_key.key_host, pool_key.key_port) in idle:
+                try:
+                    del pools[pool_key]
+                except KeyError:
+                    pass
+        logging.info(f"Closed idle connections for {len(idle)} host(s)")
+
+    def close(self):
+        """
+        Close every pooled connection
+        """
+        self.session.close()
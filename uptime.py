@@ -0,0 +1,235 @@
+import threading
+import time
+from collections import deque
+
+from stats import LatencyHistogram, is_error
+
+# Uptime windows: name -> (span in seconds, bucket width in seconds, rollup resolution used to warm it)
+UPTIME_WINDOWS = {
+    '1h': (3600, 300, 60),
+    '24h': (86400, 3600, 3600),
+    '7d': (7 * 86400, 86400, 86400),
+    '30d': (30 * 86400, 86400, 86400),
+}
+
+# Availability target used for error budgets unless a request asks for another
+DEFAULT_SLO = 99.9
+
+
+class WindowCounts:
+    def __init__(self):
+        """
+        Checks, errors, incidents and latency distribution of a stretch of time
+        """
+        self.checks = 0
+        self.errors = 0
+        self.incidents = 0
+        self.histogram = LatencyHistogram()
+
+    def merge(self, other):
+        self.checks += other.checks
+        self.errors += other.errors
+        self.incidents += other.incidents
+        self.histogram.merge(other.histogram)
+
+    def subtract(self, other):
+        self.checks -= other.checks
+        self.errors -= other.errors
+        self.incidents -= other.incidents
+        self.histogram.subtract(other.histogram)
+
+
+class SlidingWindow:
+    def __init__(self, span, bucket_seconds):
+        """
+        Counts over the last span seconds, kept as fixed-width buckets plus a running total
+
+        Adding a sample touches one bucket and the total; buckets that fall
+        out of the window are subtracted from the total as they expire, so
+        reading the window never walks its buckets.
+
+        Args:
+            span (int): Window length in seconds
+            bucket_seconds (int): Bucket width in seconds (the window's edge precision)
+        """
+        self.span = span
+        self.bucket_seconds = bucket_seconds
+        self.buckets = deque()
+        self.total = WindowCounts()
+
+    def _bucket(self, timestamp):
+        """
+        Get the bucket a timestamp falls into, creating it if needed
+
+        Returns:
+            WindowCounts: The bucket, or None if the timestamp is already outside the window
+        """
+        start = timestamp - timestamp % self.bucket_seconds
+        if self.buckets and self.buckets[-1][0] == start:
+            return self.buckets[-1][1]
+        if self.buckets and start < self.buckets[-1][0]:
+            # Late sample: find its bucket (rare, only when warming out of order)
+            for bucket_start, counts in reversed(self.buckets):
+                if bucket_start == start:
+                    return counts
+            return None
+        counts = WindowCounts()
+        self.buckets.append((start, counts))
+        return counts
+
+    def expire(self, now):
+        """
+        Drop buckets that ended before the window's start
+
+        Args:
+            now (float): Current epoch timestamp
+        """
+        cutoff = now - self.span
+        while self.buckets and self.buckets[0][0] + self.bucket_seconds <= cutoff:
+            self.total.subtract(self.buckets.popleft()[1])
+
+    def add(self, timestamp, counts):
+        """
+        Fold counts for a moment in time into the window
+
+        Args:
+            timestamp (float): Epoch timestamp
+            counts (WindowCounts): Counts to add
+        """
+        bucket = self._bucket(timestamp)
+        if bucket is None:
+            return
+        bucket.merge(counts)
+        self.total.merge(counts)
+        self.expire(timestamp)
+
+
+class UptimeTracker:
+    def __init__(self):
+        """
+        Availability, incident and latency counters per URL over UPTIME_WINDOWS
+
+        Updated as each sweep is saved and read in constant time, so a
+        30-day figure costs the same as a 1-hour one.
+        """
+        self._windows = {}
+        self._down = {}
+        self._lock = threading.Lock()
+
+    def _url_windows(self, url):
+        windows = self._windows.get(url)
+        if windows is None:
+            windows = self._windows[url] = {
+                name: SlidingWindow(span, bucket_seconds)
+                for name, (span, bucket_seconds, _) in UPTIME_WINDOWS.items()
+            }
+        return windows
+
+    def add(self, results, timestamp):
+        """
+        Record the results of one sweep
+
+        Args:
+            results (dict): Mapping of URL to check_status() result, or None if the probe failed
+            timestamp (float): Epoch timestamp of the sweep
+        """
+        with self._lock:
+            for url, result in results.items():
+                status_code = result['status_code'] if result else None
+                down = is_error(status_code)
+                counts = WindowCounts()
+                counts.checks = 1
+                counts.errors = int(down)
+                # An incident starts whenever a URL goes from up (or unknown) to down
+                counts.incidents = int(down and not self._down.get(url, False))
+                self._down[url] = down
+                if result and result.get('response_time') is not None:
+                    counts.histogram.add(result['response_time'])
+                for window in self._url_windows(url).values():
+                    window.add(timestamp, counts)
+
+    def warm(self, window_name, rollups):
+        """
+        Load one window from rollup buckets read from the results store
+
+        Incidents are estimated as rollup buckets with errors that follow a
+        bucket without any.
+
+        Args:
+            window_name (str): Key of UPTIME_WINDOWS
+            rollups (list): (url, bucket start, RollupBucket) tuples ordered by bucket start
+        """
+        with self._lock:
+            previous_errors = {}
+            for url, bucket_start, rollup in rollups:
+                counts = WindowCounts()
+                counts.checks = rollup.count
+                counts.errors = rollup.errors
+                counts.incidents = int(rollup.errors > 0 and not previous_errors.get(url, False))
+                counts.histogram.merge(rollup.histogram)
+                previous_errors[url] = rollup.errors > 0
+                self._url_windows(url)[window_name].add(bucket_start, counts)
+                if window_name == '1h':
+                    self._down[url] = rollup.errors > 0
+
+    def forget(self, url):
+        """
+        Drop a URL's counters
+
+        Args:
+            url (str): URL no longer monitored
+        """
+        with self._lock:
+            self._windows.pop(url, None)
+            self._down.pop(url, None)
+
+    def summary(self, url, window_name, slo=DEFAULT_SLO, now=None):
+        """
+        Summarise one URL over one window
+
+        Args:
+            url (str): Monitored URL
+            window_name (str): Key of UPTIME_WINDOWS
+            slo (float): Availability target in percent, for the error budget
+            now (float): Epoch timestamp to evaluate at (default: now)
+
+        Returns:
+            dict: Availability, error budget, incidents and latency percentiles, or None if
+                  the URL has no data
+        """
+        with self._lock:
+            windows = self._windows.get(url)
+            if windows is None:
+                return None
+            window = windows[window_name]
+            window.expire(now if now is not None else time.time())
+            total = window.total
+            checks, errors = total.checks, total.errors
+            percentiles = {f'p{percent}': total.histogram.percentile(percent) for percent in (50, 95, 99)}
+            incidents = total.incidents
+
+        allowed = checks * (100 - slo) / 100
+        return {
+            'window': window_name,
+            'resolution': window.bucket_seconds,
+            'checks': checks,
+            'errors': errors,
+            'availability': round(100 * (checks - errors) / checks, 4) if checks else None,
+            'incidents': incidents,
+            'error_budget': {
+                'slo': slo,
+                'allowed_errors': round(allowed, 2),
+                # 1.0 means errors are arriving exactly as fast as the budget allows
+                'burn_rate': round(errors / allowed, 2) if allowed else None,
+                'remaining': round(1 - errors / allowed, 4) if allowed else None
+            },
+            'latency': percentiles
+        }
+
+    @property
+    def urls(self):
+        """
+        URLs with counters
+        """
+        with self._lock:
+            return list(self._windows)
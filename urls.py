@@ -0,0 +1,240 @@
+import csv
+import io
+import json
+
+from checks import Check
+from ping_bot import PROBE_MODES
+
+# Columns of a URL record, in the order CSV exports write them
+# (a CSV 'check' cell holds the check definition as JSON)
+URL_FIELDS = ('url', 'interval', 'enabled', 'probe_mode', 'max_bytes', 'adaptive', 'max_interval', 'check')
+BATCH_FORMATS = ('ndjson', 'csv')
+# Operations a patch record can carry in its 'op' field
+PATCH_OPS = ('upsert', 'add', 'update', 'remove')
+
+TRUE_VALUES = (True, 'true', 'on', '1', 1, 'yes')
+FALSE_VALUES = (False, 'false', 'off', '0', 0, 'no')
+
+
+def parse_probe_settings(data):
+    """
+    Read the optional probe_mode, max_bytes, adaptive, max_interval and check fields of a URL request
+
+    Args:
+        data (dict): Request fields
+
+    Returns:
+        tuple: (settings, error); settings only holds the fields that were sent
+    """
+    settings = {}
+    if 'probe_mode' in data:
+        probe_mode = str(data['probe_mode']).lower()
+        if probe_mode not in PROBE_MODES:
+            return {}, f"probe_mode must be one of: {', '.join(PROBE_MODES)}"
+        settings['probe_mode'] = probe_mode
+    if 'max_bytes' in data:
+        try:
+            settings['max_bytes'] = max(int(data['max_bytes']), 0)
+        except (TypeError, ValueError):
+            return {}, 'max_bytes must be a number'
+    if 'adaptive' in data:
+        settings['adaptive'] = _lower(data['adaptive']) in TRUE_VALUES
+    if 'max_interval' in data:
+        if data['max_interval'] in (None, ''):
+            settings['max_interval'] = None
+        else:
+            try:
+                settings['max_interval'] = max(int(data['max_interval']), 1)
+            except (TypeError, ValueError):
+                return {}, 'max_interval must be a number'
+    if 'check' in data:
+        check = data['check']
+        if isinstance(check, str):
+            try:
+                check = json.loads(check) if check.strip() else None
+            except ValueError as e:
+                return {}, f'check is not valid JSON: {e}'
+        if check:
+            try:
+                Check(check)
+            except ValueError as e:
+                return {}, f'Invalid check: {e}'
+        settings['check'] = check or None
+    return settings, None
+
+
+def _lower(value):
+    return value.strip().lower() if isinstance(value, str) else value
+
+
+def parse_url_record(data):
+    """
+    Validate one URL record from a bulk request
+
+    Args:
+        data (dict): Record fields; only 'url' is required
+
+    Returns:
+        tuple: (fields, error); fields holds 'url' plus only the settings that were sent
+    """
+    url = str(data.get('url') or '').strip()
+    if not url:
+        return {}, 'URL cannot be empty'
+    fields = {'url': url}
+    if 'interval' in data:
+        try:
+            fields['interval'] = int(data['interval'])
+        except (TypeError, ValueError):
+            return {}, 'interval must be a number'
+        if fields['interval'] < 1:
+            return {}, 'interval must be at least 1 second'
+    if 'enabled' in data:
+        enabled = _lower(data['enabled'])
+        if enabled not in TRUE_VALUES and enabled not in FALSE_VALUES:
+            return {}, 'enabled must be true or false'
+        fields['enabled'] = enabled in TRUE_VALUES
+    settings, error = parse_probe_settings(data)
+    if error:
+        return {}, error
+    fields.update(settings)
+    return fields, None
+
+
+def read_records(text, batch_format):
+    """
+    Parse a bulk request body
+
+    NDJSON bodies hold one JSON object per line. CSV bodies start with a
+    header row naming URL_FIELDS columns (and 'op' for patches); empty
+    cells count as not sent.
+
+    Args:
+        text (str): Request body
+        batch_format (str): 'ndjson' or 'csv'
+
+    Returns:
+        tuple: (list of (line number, record dict), list of {'line', 'error'} dicts)
+    """
+    records = []
+    errors = []
+    if batch_format == 'csv':
+        reader = csv.DictReader(io.StringIO(text))
+        if not reader.fieldnames or 'url' not in [name.strip() for name in reader.fieldnames]:
+            return [], [{'line': 1, 'error': "CSV header must include a 'url' column"}]
+        for row in reader:
+            record = {name.strip(): value.strip() for name, value in row.items()
+                      if name and value is not None and value.strip() != ''}
+            if record:
+                records.append((reader.line_num, record))
+        return records, errors
+
+    for line_number, line in enumerate(text.splitlines(), 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            errors.append({'line': line_number, 'error': f'Invalid JSON: {e}'})
+            continue
+        if not isinstance(record, dict):
+            errors.append({'line': line_number, 'error': 'Each line must be a JSON object'})
+            continue
+        records.append((line_number, record))
+    return records, errors
+
+
+def write_records(url_configs, batch_format):
+    """
+    Encode URL configurations for export
+
+    Args:
+        url_configs (list): URL configuration dicts as stored in bot_config.json
+        batch_format (str): 'ndjson' or 'csv'
+
+    Returns:
+        str: The encoded records, in a form read_records() accepts back
+    """
+    if batch_format == 'csv':
+        output = io.StringIO()
+        writer = csv.writer(output, lineterminator='\n')
+        writer.writerow(URL_FIELDS)
+        for url_config in url_configs:
+            row = []
+            for field in URL_FIELDS:
+                value = url_config.get(field)
+                if isinstance(value, dict):
+                    value = json.dumps(value)
+                row.append('' if value is None else str(value).lower() if isinstance(value, bool) else value)
+            writer.writerow(row)
+        return output.getvalue()
+    return ''.join(json.dumps(url_config) + '\n' for url_config in url_configs)
+
+
+def apply_batch(url_configs, records, mode='merge'):
+    """
+    Apply a batch of URL records to a URL list in one pass
+
+    The whole batch is validated before anything is changed, so a batch
+    with any error leaves the list untouched. Lookups go through a
+    URL-keyed index, so a batch of n records costs O(n) however many URLs
+    are already configured.
+
+    Args:
+        url_configs (list): Current URL configuration dicts
+        records (list): (line number, record dict) pairs from read_records()
+        mode (str): 'merge' adds new URLs and updates the sent fields of existing ones;
+            'replace' makes the batch the complete URL list; 'patch' applies each
+            record's 'op' (upsert, add, update or remove; default upsert)
+
+    Returns:
+        tuple: (new URL list, dict of added/updated/removed/unchanged counts, list of
+            {'line', 'error'} dicts); the list and counts are None when there are errors
+    """
+    index = {url_config.get('url'): position for position, url_config in enumerate(url_configs)}
+    changes = {}
+    errors = []
+    for line_number, record in records:
+        op = str(record.get('op') or 'upsert').lower() if mode == 'patch' else 'upsert'
+        if op not in PATCH_OPS:
+            errors.append({'line': line_number, 'error': f"op must be one of: {', '.join(PATCH_OPS)}"})
+            continue
+        fields, error = parse_url_record(record)
+        if error:
+            errors.append({'line': line_number, 'error': error})
+            continue
+        url = fields['url']
+        if url in changes:
+            errors.append({'line': line_number, 'error': f'{url} appears more than once in the batch'})
+        elif op == 'add' and url in index:
+            errors.append({'line': line_number, 'error': f'{url} already exists'})
+        elif op in ('update', 'remove') and url not in index:
+            errors.append({'line': line_number, 'error': f'{url} not found'})
+        else:
+            changes[url] = (op, fields)
+    if errors:
+        return None, None, errors
+
+    summary = {'added': 0, 'updated': 0, 'removed': 0, 'unchanged': 0}
+    new_configs = []
+    for url_config in url_configs:
+        url = url_config.get('url')
+        op, fields = changes.get(url, (None, None))
+        if op == 'remove' or (op is None and mode == 'replace'):
+            summary['removed'] += 1
+            continue
+        if op is None:
+            summary['unchanged'] += 1
+            new_configs.append(url_config)
+            continue
+        # Replacing starts from the record alone; merging and patching keep fields it did not send
+        updated = {'url': url, 'interval': 120, 'enabled': True} if mode == 'replace' else dict(url_config)
+        updated.update(fields)
+        summary['updated' if updated != url_config else 'unchanged'] += 1
+        new_configs.append(updated)
+    for url, (op, fields) in changes.items():
+        if url not in index:
+            new_config = {'url': url, 'interval': 120, 'enabled': True}
+            new_config.update(fields)
+            new_configs.append(new_config)
+            summary['added'] += 1
+    return new_configs, summary, []
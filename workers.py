@@ -0,0 +1,297 @@
+import bisect
+import hashlib
+import logging
+import logging.handlers
+import multiprocessing
+import queue
+import threading
+import time
+
+from ping_bot import MultiURLPingBot, ProbeScheduler
+from results_store import ResultsStore
+from transport import ProbeTransport
+
+# Seconds between checks for worker processes that exited and need restarting
+WORKER_CHECK_INTERVAL = 1
+
+
+class HashRing:
+    def __init__(self, nodes, replicas=64):
+        """
+        Consistent-hash ring mapping URLs to worker indexes
+
+        Each worker owns many small arcs of the ring, so URLs spread evenly
+        and changing the worker count only moves the URLs on the arcs that
+        change hands.
+
+        Args:
+            nodes (int): Number of workers
+            replicas (int): Points on the ring per worker
+        """
+        points = []
+        for node in range(nodes):
+            for replica in range(replicas):
+                points.append((self._hash(f'{node}:{replica}'), node))
+        points.sort()
+        self._hashes = [point[0] for point in points]
+        self._nodes = [point[1] for point in points]
+
+    @staticmethod
+    def _hash(key):
+        return int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
+
+    def node_for(self, key):
+        """
+        Get the worker that owns a key
+
+        Args:
+            key (str): URL
+
+        Returns:
+            int: Worker index
+        """
+        index = bisect.bisect(self._hashes, self._hash(key)) % len(self._hashes)
+        return self._nodes[index]
+
+
+class QueueResultsStore(ResultsStore):
+    def __init__(self, result_queue):
+        """
+        Results backend used inside workers: forwards each sweep to the parent process
+
+        Args:
+            result_queue (multiprocessing.Queue): Queue drained by ShardedMonitor
+        """
+        self.result_queue = result_queue
+
+    def append(self, results, timestamp=None):
+        self.result_queue.put((results, timestamp))
+
+    def query(self, since=None, until=None, url=None):
+        # History lives in the parent's store
+        return []
+
+
+class WorkerPingBot(MultiURLPingBot):
+    def save_results(self, results, timestamp=None):
+        """
+        Send a sweep to the parent process without recording it here
+
+        The parent records every sweep in its own cache, uptime counters and
+        metrics and runs the latency detectors on it, so doing the same here
+        would only log each regression twice.
+
+        Args:
+            results (dict): Monitoring results
+            timestamp (float): Epoch timestamp of the sweep (default: now)
+        """
+        try:
+            self.results_store.append(results, timestamp)
+        except Exception as e:
+            logging.error(f"Error sending results to the parent process: {e}")
+
+
+def _worker_main(index, url_configs, command_queue, result_queue, log_queue, bot_options, transport_options):
+    """
+    Entry point of a worker process: probe one shard of URLs until told to stop
+
+    Args:
+        index (int): Worker index, used in log messages
+        url_configs (list): URL configuration dicts for this worker's shard
+        command_queue (multiprocessing.Queue): ('apply', url_configs) and ('stop', None) commands
+        result_queue (multiprocessing.Queue): Where sweep results are sent
+        log_queue (multiprocessing.Queue): Where log records are sent for the parent to write
+        bot_options (dict): Extra MultiURLPingBot arguments
+        transport_options (dict): ProbeTransport arguments
+    """
+    # Importing ping_bot set up the log file handler again; only the parent may write
+    # (and rotate) the log, so hand every record to it instead
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+
+    multi_bot = WorkerPingBot(
+        results_store=QueueResultsStore(result_queue),
+        transport=ProbeTransport(**transport_options),
+        cache_capacity=1,
+        **bot_options
+    )
+    scheduler = ProbeScheduler(multi_bot)
+    scheduler.apply(url_configs)
+    scheduler.schedule_all()
+
+    def read_commands():
+        while True:
+            command, payload = command_queue.get()
+            if command == 'apply':
+                scheduler.apply(payload)
+            elif command == 'stop':
+                scheduler.stop()
+                return
+
+    threading.Thread(target=read_commands, daemon=True).start()
+    logging.info(f"Probe worker {index} started with {len(multi_bot.bots)} URL(s)")
+    try:
+        scheduler.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        multi_bot.shutdown()
+
+
+class ShardedMonitor:
+    def __init__(self, multi_bot, workers, bot_options=None, transport_options=None):
+        """
+        Probe URLs in several worker processes, each owning a consistent-hash shard
+
+        Workers probe and schedule their own URLs and send every sweep back
+        over a queue; this process only records the results in multi_bot's
+        store and cache, so probing never competes with the dashboard for the GIL.
+        Offers the same apply/schedule_all/run/stop/reset interface as ProbeScheduler.
+
+        Args:
+            multi_bot (MultiURLPingBot): Receives results from the workers
+            workers (int): Number of worker processes
+            bot_options (dict): Extra MultiURLPingBot arguments for the workers (e.g. max_workers)
+            transport_options (dict): ProbeTransport arguments for the workers
+        """
+        self.multi_bot = multi_bot
+        self.workers = workers
+        self.bot_options = bot_options or {}
+        self.transport_options = transport_options or {}
+        self.ring = HashRing(workers)
+        # Spawn rather than fork: this process runs threads (and the dashboard), and a forked
+        # child would inherit their locks in whatever state they were in
+        self._context = multiprocessing.get_context('spawn')
+        self._result_queue = None
+        self._log_queue = None
+        self._processes = {}
+        self._command_queues = {}
+        self._shards = {index: [] for index in range(workers)}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def _split(self, url_configs):
+        """
+        Split URL configurations into per-worker shards
+
+        Args:
+            url_configs (list): URL configuration dicts
+
+        Returns:
+            dict: Lists of URL configuration dicts keyed by worker index
+        """
+        shards = {index: [] for index in range(self.workers)}
+        for url_config in url_configs:
+            if url_config.get('url'):
+                shards[self.ring.node_for(url_config['url'])].append(url_config)
+        return shards
+
+    def _start_worker(self, index):
+        """
+        Start (or restart) one worker process with its current shard
+
+        Args:
+            index (int): Worker index
+        """
+        command_queue = self._context.Queue()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(index, self._shards[index], command_queue, self._result_queue, self._log_queue,
+                  self.bot_options, self.transport_options),
+            name=f'probe-worker-{index}',
+            daemon=True
+        )
+        process.start()
+        self._processes[index] = process
+        self._command_queues[index] = command_queue
+
+    def apply(self, url_configs):
+        """
+        Send each worker its new shard; workers apply only what changed
+
+        Args:
+            url_configs (list): URL configuration dicts as stored in bot_config.json
+        """
+        shards = self._split(url_configs)
+        with self._lock:
+            for index, shard in shards.items():
+                changed = shard != self._shards[index]
+                self._shards[index] = shard
+                if changed and index in self._command_queues:
+                    self._command_queues[index].put(('apply', shard))
+
+    def schedule_all(self):
+        """
+        Workers schedule their own URLs; kept for interface parity with ProbeScheduler
+        """
+
+    def reset(self):
+        """
+        Clear a previous stop request
+        """
+        self._stopped.clear()
+
+    def run(self):
+        """
+        Start the workers and record their results until stop() is called
+        """
+        with self._lock:
+            self._result_queue = self._context.Queue()
+            self._log_queue = self._context.Queue()
+            for index in range(self.workers):
+                self._start_worker(index)
+        # Workers' log records are written by this process's handlers
+        log_listener = logging.handlers.QueueListener(
+            self._log_queue, *logging.getLogger().handlers, respect_handler_level=True
+        )
+        log_listener.start()
+
+        next_health_check = time.monotonic() + WORKER_CHECK_INTERVAL
+        try:
+            while not self._stopped.is_set():
+                # On a timer rather than when the queue is idle: the other workers' results
+                # would otherwise keep a dead worker from ever being noticed
+                if time.monotonic() >= next_health_check:
+                    self._restart_dead_workers()
+                    next_health_check = time.monotonic() + WORKER_CHECK_INTERVAL
+                try:
+                    results, timestamp = self._result_queue.get(timeout=WORKER_CHECK_INTERVAL)
+                except queue.Empty:
+                    continue
+                self.multi_bot.save_results(results, timestamp)
+        finally:
+            self._stop_workers()
+            log_listener.stop()
+
+    def _restart_dead_workers(self):
+        """
+        Restart any worker process that exited unexpectedly
+        """
+        with self._lock:
+            for index, process in list(self._processes.items()):
+                if not process.is_alive() and not self._stopped.is_set():
+                    logging.error(f"Probe worker {index} exited with code {process.exitcode}, restarting")
+                    self._start_worker(index)
+
+    def _stop_workers(self):
+        """
+        Ask every worker to stop, terminating any that do not exit promptly
+        """
+        with self._lock:
+            for command_queue in self._command_queues.values():
+                command_queue.put(('stop', None))
+            for process in self._processes.values():
+                process.join(timeout=5)
+                if process.is_alive():
+                    process.terminate()
+            self._processes = {}
+            self._command_queues = {}
+
+    def stop(self):
+        """
+        Stop the workers and the result loop
+        """
+        self._stopped.set()